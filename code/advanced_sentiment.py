@@ -10,28 +10,34 @@ Dependencies:
 - torch
 - transformers
 - scikit-learn
-- textblob
 - tqdm
 """
 
 import pandas as pd
 import numpy as np
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from torch.utils.data import Dataset, DataLoader
-import torch
-from sklearn.model_selection import train_test_split
-from textblob import TextBlob
 import os
 from datetime import datetime
-import glob
-import matplotlib.pyplot as plt
-import seaborn as sns
-from tqdm import tqdm
+from review_store import artifact_name, load_processed_reviews
+from artifact_registry import get_registry
+from profiling import profile_stage, profile_step
+from rollup_cube import load_rollup_cube
+from group_stats import stream_group_stats
+from pretokenized_dataset import PaddingStats, PretokenizedReviewDataset, batch_loader, pretokenize
+from sentiment_inference import predict_tokenized
+from streaming_classifier import SENTIMENT_CLASSES
 import warnings
 warnings.filterwarnings('ignore')
 
-class ReviewDataset(Dataset):
-    """Custom dataset for review data."""
+# torch, transformers, scikit-learn and the plotting libraries are imported where they
+# are used, so importing this module (e.g. for the CLI) stays fast.
+
+class ReviewDataset:
+    """
+    Custom map-style dataset for review data (usable with torch's DataLoader).
+    
+    Tokenizes one review per item; training uses the pre-tokenized arrays of
+    PretokenizedReviewDataset instead.
+    """
     def __init__(self, texts, labels, tokenizer, max_length=128):  # Reduced max_length
         self.texts = texts
         self.labels = labels
@@ -42,6 +48,7 @@ class ReviewDataset(Dataset):
         return len(self.texts)
 
     def __getitem__(self, idx):
+        import torch
         text = str(self.texts[idx])
         encoding = self.tokenizer(
             text,
@@ -58,31 +65,88 @@ class ReviewDataset(Dataset):
             'labels': torch.tensor(self.labels[idx], dtype=torch.long)
         }
 
+def _save_checkpoint(path, config, progress, model, optimizer, scheduler, sampler):
+    """Write a training checkpoint atomically (a crash mid-write keeps the previous one)."""
+    import torch
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    torch.save({
+        'config': config,
+        'progress': dict(progress),
+        'model': model.state_dict(),
+        'optimizer': optimizer.state_dict(),
+        'scheduler': scheduler.state_dict(),
+        'sampler': sampler.state_dict(),
+        'rng': torch.get_rng_state()
+    }, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+def _load_checkpoint(path, config, model, optimizer, scheduler, sampler):
+    """Restore a checkpoint saved with the same config; returns its progress, or None."""
+    import torch
+    checkpoint = torch.load(path, map_location='cpu', weights_only=False)
+    if checkpoint['config'] != config:
+        print(f"Ignoring checkpoint {path}: it was saved with different training settings")
+        return None
+    model.load_state_dict(checkpoint['model'])
+    optimizer.load_state_dict(checkpoint['optimizer'])
+    scheduler.load_state_dict(checkpoint['scheduler'])
+    sampler.load_state_dict(checkpoint['sampler'])
+    torch.set_rng_state(checkpoint['rng'])
+    progress = checkpoint['progress']
+    print(f"Resuming from {path}: epoch {progress['epoch'] + 1}, batch {sampler.position}, "
+          f"optimizer step {progress['step']}")
+    return progress
+
 class AdvancedSentimentAnalyzer:
     def __init__(self, model_name='distilbert-base-uncased', sample_size=50000):
-        """Initialize the advanced sentiment analyzer."""
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        print(f"Using device: {self.device}")
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(
-            model_name,
-            num_labels=3  # negative, neutral, positive
-        ).to(self.device)
+        """
+        Initialize the advanced sentiment analyzer.
+        
+        The tokenizer and model weights are loaded on first use, not here.
+        """
+        self.model_name = model_name
         self.sample_size = sample_size
+        self._device = None
+        self._tokenizer = None
+        self._model = None
+
+    @property
+    def device(self):
+        if self._device is None:
+            import torch
+            self._device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            print(f"Using device: {self._device}")
+        return self._device
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return self._tokenizer
+
+    @property
+    def model(self):
+        if self._model is None:
+            from transformers import AutoModelForSequenceClassification
+            self._model = AutoModelForSequenceClassification.from_pretrained(
+                self.model_name,
+                num_labels=3  # negative, neutral, positive
+            ).to(self.device)
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
         
-    def load_processed_data(self):
+    def load_processed_data(self, columns=('Text', 'Score', 'Time', 'sentiment_score', 'ProductId')):
         """Load the most recent processed data."""
-        processed_files = glob.glob('processed_data/processed_reviews_*.csv')
-        
-        if not processed_files:
-            raise FileNotFoundError("Processed data files not found.")
-            
-        latest_file = max(processed_files)
-        df = pd.read_csv(latest_file)
-        print(f"Loaded processed data from: {latest_file}")
+        df = load_processed_reviews(columns=list(columns) if columns else None)
         
-        # Sample the data
-        if len(df) > self.sample_size:
+        # Sample the data (no sample_size: the full corpus)
+        if self.sample_size and len(df) > self.sample_size:
             df = df.sample(n=self.sample_size, random_state=42)
             print(f"Sampled {self.sample_size} reviews from dataset")
         
@@ -90,6 +154,8 @@ class AdvancedSentimentAnalyzer:
         
     def prepare_data(self, df):
         """Prepare data for deep learning model."""
+        from sklearn.model_selection import train_test_split
+        
         # Convert ratings to sentiment labels (1-2: negative, 3: neutral, 4-5: positive)
         df['sentiment_label'] = pd.cut(
             df['Score'],
@@ -108,54 +174,144 @@ class AdvancedSentimentAnalyzer:
         print(f"Training samples: {len(train_texts)}, Test samples: {len(test_texts)}")
         return train_texts, test_texts, train_labels, test_labels
 
-    def train_model(self, train_texts, train_labels, batch_size=32, epochs=2):
-        """Train the deep learning model with progress bars."""
-        # Create dataset and dataloader
-        train_dataset = ReviewDataset(train_texts, train_labels, self.tokenizer)
-        train_loader = DataLoader(
-            train_dataset, 
-            batch_size=batch_size, 
-            shuffle=True,
-            num_workers=4  # Parallel data loading
-        )
+    def pretokenize(self, texts, max_length=128):
+        """Tokenize texts once into the on-disk cache (reused across epochs and runs)."""
+        return pretokenize(texts, self.tokenizer, max_length, tokenizer_name=self.model_name)
+
+    def train_model(self, train_texts, train_labels, batch_size=32, epochs=2, max_length=128,
+                    accumulation_steps=1, bf16=False, learning_rate=2e-5, warmup_ratio=0.1,
+                    checkpoint_dir='advanced_sentiment/checkpoints', checkpoint_every=200, resume=True):
+        """
+        Train the deep learning model with progress bars.
+        
+        Batches group reviews of similar length and are padded only to their longest
+        review; padding waste and tokens/s are printed after every epoch.
+        
+        Gradients of `accumulation_steps` batches are summed before each optimizer step,
+        so the effective batch is batch_size * accumulation_steps while memory follows
+        batch_size. `bf16` runs the forward pass under bfloat16 autocast.
+        
+        Every `checkpoint_every` optimizer steps and at the end of every epoch, model,
+        optimizer, scheduler, sampler and RNG state are saved to `checkpoint_dir`. With
+        `resume`, a checkpoint of the same training set and settings is loaded and
+        training continues from the exact batch where it stopped; the checkpoint is
+        removed once training completes.
+        """
+        import time
+        import torch
+        from tqdm import tqdm
+        from transformers import get_linear_schedule_with_warmup
+        
+        # Batches are gathered from the pre-tokenized arrays, so no loader workers are needed
+        tokenized = self.pretokenize(train_texts, max_length)
+        train_dataset = PretokenizedReviewDataset(tokenized, train_labels)
+        train_loader = batch_loader(train_dataset, batch_size=batch_size, shuffle=True, seed=42)
+        sampler = train_loader.sampler
+        padding_stats = train_loader.collate_fn.stats
         
         # Training settings
-        optimizer = torch.optim.AdamW(self.model.parameters(), lr=2e-5)
+        steps_per_epoch = -(-len(train_loader) // accumulation_steps)
+        optimizer = torch.optim.AdamW(self.model.parameters(), lr=learning_rate)
+        scheduler = get_linear_schedule_with_warmup(optimizer, int(warmup_ratio * steps_per_epoch * epochs),
+                                                    steps_per_epoch * epochs)
+        
+        config = {'model_name': self.model_name, 'data': os.path.basename(tokenized.path), 'rows': len(train_dataset),
+                  'batch_size': batch_size, 'accumulation_steps': accumulation_steps, 'epochs': epochs,
+                  'learning_rate': learning_rate, 'warmup_ratio': warmup_ratio}
+        checkpoint_path = f"{checkpoint_dir}/{os.path.splitext(config['data'])[0]}_bs{batch_size}x{accumulation_steps}.pt"
+        progress = {'epoch': 0, 'step': 0, 'epoch_loss': 0.0}
+        if resume and os.path.exists(checkpoint_path):
+            progress = _load_checkpoint(checkpoint_path, config, self.model, optimizer, scheduler, sampler) or progress
         
         # Training loop with progress bar
         self.model.train()
-        for epoch in range(epochs):
-            progress_bar = tqdm(train_loader, desc=f'Epoch {epoch+1}/{epochs}')
-            total_loss = 0
+        for epoch in range(progress['epoch'], epochs):
+            if sampler.epoch != epoch:
+                sampler.set_epoch(epoch)
+            padding_stats.reset()
+            epoch_start = time.perf_counter()
+            first_batch = sampler.position
+            progress_bar = tqdm(train_loader, desc=f'Epoch {epoch+1}/{epochs}',
+                                initial=first_batch, total=len(train_loader))
+            total_loss = progress['epoch_loss']
             
-            for batch in progress_bar:
-                optimizer.zero_grad()
-                
+            for i, batch in enumerate(progress_bar, start=first_batch):
                 input_ids = batch['input_ids'].to(self.device)
                 attention_mask = batch['attention_mask'].to(self.device)
                 labels = batch['labels'].to(self.device)
                 
-                outputs = self.model(
-                    input_ids=input_ids,
-                    attention_mask=attention_mask,
-                    labels=labels
-                )
+                with torch.autocast(self.device.type, dtype=torch.bfloat16, enabled=bf16):
+                    outputs = self.model(
+                        input_ids=input_ids,
+                        attention_mask=attention_mask,
+                        labels=labels
+                    )
                 
                 loss = outputs.loss
                 total_loss += loss.item()
+                (loss / accumulation_steps).backward()
                 
-                loss.backward()
-                optimizer.step()
+                # Step once per accumulation group (the last group of an epoch may be shorter)
+                if (i + 1) % accumulation_steps == 0 or i + 1 == len(train_loader):
+                    optimizer.step()
+                    scheduler.step()
+                    optimizer.zero_grad()
+                    progress['step'] += 1
+                    if checkpoint_every and progress['step'] % checkpoint_every == 0:
+                        progress.update(epoch=epoch, epoch_loss=total_loss)
+                        _save_checkpoint(checkpoint_path, config, progress, self.model, optimizer, scheduler, sampler)
                 
                 # Update progress bar
                 progress_bar.set_postfix({'loss': f'{loss.item():.4f}'})
             
             avg_loss = total_loss / len(train_loader)
             print(f"Epoch {epoch+1}/{epochs}, Average Loss: {avg_loss:.4f}")
+            padding_stats.report(time.perf_counter() - epoch_start, label=f"Epoch {epoch+1}/{epochs}: ")
+            if epoch + 1 < epochs:
+                sampler.set_epoch(epoch + 1)
+                progress.update(epoch=epoch + 1, epoch_loss=0.0)
+                _save_checkpoint(checkpoint_path, config, progress, self.model, optimizer, scheduler, sampler)
+        
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def predict_proba(self, texts, batch_size=64, max_length=128):
+        """
+        Class probabilities (negative, neutral, positive) for texts, in input order.
+        
+        Reviews are batched by length (longest first) with dynamic padding.
+        """
+        import time
+        
+        tokenized = self.pretokenize(texts, max_length)
+        stats = PaddingStats(max_length)
+        start = time.perf_counter()
+        probabilities = predict_tokenized(self.model, tokenized, batch_size, self.device, stats)
+        stats.report(time.perf_counter() - start, label="Inference: ")
+        return probabilities
 
-    def analyze_temporal_trends(self, df):
-        """Analyze sentiment trends over time."""
+    def evaluate(self, test_texts, test_labels):
+        """Accuracy and per-class recall of the model on held-out reviews."""
+        labels = np.asarray(test_labels, dtype=np.int64)
+        predicted = self.predict_proba(test_texts).argmax(axis=1)
+        metrics = {'accuracy': float((predicted == labels).mean()) if len(labels) else float('nan')}
+        for i, label in enumerate(SENTIMENT_CLASSES):
+            support = labels == i
+            metrics[f'recall_{label}'] = float((predicted[support] == i).mean()) if support.any() else float('nan')
+        print(f"Test accuracy: {metrics['accuracy']:.4f}")
+        return metrics
+
+    def analyze_temporal_trends(self, df, cube=None):
+        """
+        Analyze sentiment trends over time.
+        
+        `cube` (a RollupCube, or GroupStats grouped by month) replaces grouping `df`.
+        """
         print("Analyzing temporal trends...")
+        if cube is not None:
+            return (cube.aggregate('month', {'sentiment_score': ['mean', 'std'], 'Score': ['mean', 'count']})
+                    .rename_axis('Time')
+                    .reset_index())
         df['Time'] = pd.to_datetime(df['Time'])
     
         # Group by month and calculate statistics
@@ -168,22 +324,31 @@ class AdvancedSentimentAnalyzer:
     
         return monthly_trends
 
-    def analyze_category_patterns(self, df):
-        """Analyze sentiment patterns by product category."""
+    def analyze_category_patterns(self, df, stats=None):
+        """
+        Analyze sentiment patterns by product category.
+        
+        `stats` (GroupStats grouped by ProductId, e.g. over the full corpus) replaces
+        grouping `df`.
+        """
         print("Analyzing category patterns...")
+        spec = {
+            'sentiment_score': ['mean', 'std'],
+            'Score': ['mean', 'count']
+        }
         # Group by product and calculate statistics
-        patterns = (df.groupby('ProductId')
-                .agg({
-                    'sentiment_score': ['mean', 'std'],
-                    'Score': ['mean', 'count']
-                })
-                .reset_index())
+        if stats is not None:
+            patterns = stats.aggregate('ProductId', spec).reset_index()
+        else:
+            patterns = df.groupby('ProductId', observed=True).agg(spec).reset_index()
     
         # Filter to include only categories with sufficient data
         return patterns[patterns[('Score', 'count')] >= 10]
 
     def save_results(self, results_dict, directory='advanced_sentiment'):
         """Save analysis results."""
+        import torch
+        
         if not os.path.exists(directory):
             os.makedirs(directory)
             
@@ -192,16 +357,24 @@ class AdvancedSentimentAnalyzer:
         # Save model
         torch.save(self.model.state_dict(), 
                   f'{directory}/sentiment_model_{timestamp}.pth')
+        registry = get_registry()
+        registry.register(f'{directory}/sentiment_model', f'{directory}/sentiment_model_{timestamp}.pth',
+                          'advanced_sentiment', inputs=[artifact_name()])
         
         # Save results
         for name, data in results_dict.items():
             if isinstance(data, pd.DataFrame):
                 data.to_csv(f'{directory}/{name}_{timestamp}.csv')
+                registry.register(f'{directory}/{name}', f'{directory}/{name}_{timestamp}.csv',
+                                  'advanced_sentiment', data=data, inputs=[artifact_name()])
         
         print(f"Results saved in {directory} directory with timestamp {timestamp}")
 
     def create_visualizations(self, results_dict, directory='advanced_sentiment'):
         """Create visualizations of the analysis results."""
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        
         print("Creating visualizations...")
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     
@@ -237,33 +410,56 @@ class AdvancedSentimentAnalyzer:
             plt.savefig(f'{directory}/category_patterns_{timestamp}.png')
             plt.close()
 
-def main():
-    """Main function to run advanced sentiment analysis."""
+def main(sample_size=50000, batch_size=32, accumulation_steps=1, bf16=False, resume=True, n_jobs=-1):
+    """
+    Main function to run advanced sentiment analysis.
+    
+    `sample_size` of None or 0 trains on the full corpus; `accumulation_steps`,
+    `bf16` and `resume` are passed to train_model (checkpointed training).
+    Temporal and product patterns cover the full corpus: they come from the rollup
+    cube and from group statistics streamed with `n_jobs` processes (-1 for all cores),
+    not from the training sample.
+    """
     try:
         print("Starting advanced sentiment analysis...")
         
         # Initialize analyzer with sample size
-        analyzer = AdvancedSentimentAnalyzer(sample_size=50000)
+        analyzer = AdvancedSentimentAnalyzer(sample_size=sample_size)
         
         # Load and prepare data
-        df = analyzer.load_processed_data()
-        train_texts, test_texts, train_labels, test_labels = analyzer.prepare_data(df)
+        with profile_step('load') as step:
+            df = analyzer.load_processed_data(columns=('Text', 'Score'))
+            step['rows'] = len(df)
+        with profile_step('tokenize', rows=len(df)):
+            train_texts, test_texts, train_labels, test_labels = analyzer.prepare_data(df)
+            analyzer.pretokenize(train_texts)
         
         # Train model
         print("\nTraining sentiment model...")
-        analyzer.train_model(train_texts, train_labels)
+        with profile_step('train', rows=len(train_labels)):
+            analyzer.train_model(train_texts, train_labels, batch_size=batch_size,
+                                 accumulation_steps=accumulation_steps, bf16=bf16, resume=resume)
+        with profile_step('evaluate', rows=len(test_labels)):
+            test_metrics = analyzer.evaluate(test_texts, test_labels)
         
         # Analyze patterns
-        temporal_trends = analyzer.analyze_temporal_trends(df)
-        category_patterns = analyzer.analyze_category_patterns(df)
+        with profile_step('patterns'):
+            cube = load_rollup_cube()
+            group_stats = stream_group_stats(['ProductId'] if cube is not None else ['ProductId', 'month'],
+                                             n_jobs=n_jobs)
+            temporal_trends = analyzer.analyze_temporal_trends(df, cube if cube is not None else group_stats['month'])
+            category_patterns = analyzer.analyze_category_patterns(df, group_stats['ProductId'])
         
         # Save results and create visualizations
         results = {
             'temporal_trends': temporal_trends,
-            'category_patterns': category_patterns
+            'category_patterns': category_patterns,
+            'test_metrics': pd.DataFrame([test_metrics])
         }
-        analyzer.save_results(results)
-        analyzer.create_visualizations(results)
+        with profile_step('save'):
+            analyzer.save_results(results)
+        with profile_step('plotting'):
+            analyzer.create_visualizations(results)
         
         print("\nAdvanced sentiment analysis completed successfully!")
         
@@ -272,4 +468,5 @@ def main():
         raise e
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile_stage('advanced_sentiment'):
+        main()
\ No newline at end of file
@@ -1,12 +1,20 @@
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
-from textblob import TextBlob
-import re
+from sentiment_scoring import score_texts, sentiment_pool
+from sentiment_cache import SentimentCache
+from text_normalization import TextNormalizer
+from review_store import (ParquetReviewWriter, artifact_name, iter_reviews, review_parts, reviews_path,
+                          save_reviews)
+from artifact_registry import get_registry
+from feature_store import FeatureStoreWriter, build_feature_store, register_feature_store
+from profiling import get_profiler, profile_iter, profile_stage, profile_step
+from rollup_cube import RollupCube, save_rollup_cube
 from datetime import datetime
 import os
 
+# scikit-learn and the feature builders that need it are imported where they are
+# used, so the CLI can start the stage without paying for them up front.
+
 def load_and_clean_data(filename='Reviews.csv'):
     """
     Load and perform initial cleaning of the Amazon reviews dataset
@@ -14,6 +22,15 @@ def load_and_clean_data(filename='Reviews.csv'):
     # Read the data from the same directory
     df = pd.read_csv(filename)
     
+    return clean_reviews(df)
+
+def clean_reviews(df, normalizer=None):
+    """
+    Perform initial cleaning on a frame (or chunk) of raw reviews
+    
+    `normalizer` is the TextNormalizer used for clean_text and clean_summary;
+    the default lowercases and strips punctuation.
+    """
     # Convert timestamps to datetime
     df['Time'] = pd.to_datetime(df['Time'], unit='s')
     
@@ -29,18 +46,25 @@ def load_and_clean_data(filename='Reviews.csv'):
     df['Summary'] = df['Summary'].fillna('').astype(str)
     
     # Basic text cleaning
-    df['clean_text'] = df['Text'].apply(lambda x: re.sub(r'[^\w\s]', '', x.lower()))
-    df['clean_summary'] = df['Summary'].apply(lambda x: re.sub(r'[^\w\s]', '', x.lower()))
+    normalizer = normalizer or TextNormalizer()
+    df['clean_text'] = normalizer.normalize(df['Text'])
+    df['clean_summary'] = normalizer.normalize(df['Summary'])
     
     return df
 
-def perform_sentiment_analysis(df):
+def perform_sentiment_analysis(df, n_jobs=1, executor=None, cache=None, backend='textblob'):
     """
     Add sentiment analysis scores to the dataset
+    
+    Each review is parsed once for both scores; `n_jobs` worker processes
+    (-1 for all cores) or an existing `executor` spread the work across cores.
+    Texts already present in `cache` (a SentimentCache) are not re-scored.
+    `backend` is 'textblob' or the vectorized, TextBlob-compatible 'lexicon' engine.
     """
     # Calculate sentiment scores
-    df['sentiment_score'] = df['Text'].apply(lambda x: TextBlob(x).sentiment.polarity)
-    df['subjectivity_score'] = df['Text'].apply(lambda x: TextBlob(x).sentiment.subjectivity)
+    scores = score_texts(df['Text'], n_jobs=n_jobs, executor=executor, cache=cache, backend=backend)
+    df['sentiment_score'] = scores[:, 0]
+    df['subjectivity_score'] = scores[:, 1]
     
     return df
 
@@ -55,32 +79,76 @@ def create_text_features(df):
     
     return df
 
+def make_tfidf_vectorizer():
+    """
+    Create the TF-IDF vectorizer used for topic modeling features
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(max_features=1000,
+                           stop_words='english')
+
 def prepare_for_topic_modeling(df):
     """
     Prepare text data for LDA topic modeling
     """
     # Create TF-IDF features
-    tfidf = TfidfVectorizer(max_features=1000,
-                           stop_words='english')
+    tfidf = make_tfidf_vectorizer()
     
     text_features = tfidf.fit_transform(df['clean_text'])
     feature_names = tfidf.get_feature_names_out()
     
     return text_features, feature_names
 
-def save_processed_data(df, text_features, feature_names):
+def prepare_token_corpus(make_chunks, timestamp, directory='processed_data'):
+    """
+    Tokenize clean_text once into the shared token corpus and derive the
+    TF-IDF features from it
+    
+    The corpus is what TopicModeler feeds to gensim, so the text is not split
+    again downstream. Returns the corpus descriptor path, the corpus, the
+    feature matrix and the feature names (identical to make_tfidf_vectorizer).
+    """
+    from token_corpus import TokenCorpus, build_token_corpus
+    path = build_token_corpus(make_chunks(), timestamp, directory)
+    corpus = TokenCorpus.load(path)
+    text_features, feature_names = corpus.to_tfidf()
+    return path, corpus, text_features, feature_names
+
+def prepare_hashed_features(make_chunks, n_jobs=1):
+    """
+    Prepare out-of-core hashed TF-IDF features for LDA topic modeling
+    
+    `make_chunks` returns a fresh iterator of clean_text chunks for each pass.
+    Returns the feature matrix, feature names and the hashed term lookup table.
+    """
+    from hashed_features import hashed_topic_features
+    return hashed_topic_features(make_chunks, max_features=1000, n_jobs=n_jobs)
+
+def save_term_lookup(term_lookup, timestamp, directory='processed_data'):
+    """
+    Save the reverse lookup from hashed feature columns to terms
+    """
+    path = f'{directory}/hashed_terms_{timestamp}.csv'
+    term_lookup.to_csv(path, index=False)
+    get_registry().register(f'{directory}/hashed_terms', path, 'process', data=term_lookup,
+                            inputs=[f'{directory}/text_features'])
+
+def save_processed_data(df, text_features, feature_names, output_format='csv', timestamp=None):
     """
     Save all processed data to files
+    
+    `output_format` is 'csv' or 'parquet' for the processed reviews file.
+    `timestamp` defaults to the current time.
     """
     # Create 'processed_data' directory if it doesn't exist
     if not os.path.exists('processed_data'):
         os.makedirs('processed_data')
     
     # Generate timestamp for unique filenames
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
     
     # Save main processed dataframe
-    df.to_csv(f'processed_data/processed_reviews_{timestamp}.csv', index=False)
+    save_reviews(df, reviews_path(timestamp, output_format))
     
     # Save text features as sparse matrix
     import scipy.sparse as sparse
@@ -89,38 +157,234 @@ def save_processed_data(df, text_features, feature_names):
     # Save feature names
     pd.Series(feature_names).to_csv(f'processed_data/feature_names_{timestamp}.csv', index=False)
     
+    register_processed_data(timestamp, output_format, df, text_features, feature_names)
+    
     print(f"Data saved in 'processed_data' directory with timestamp {timestamp}")
     return timestamp
 
-def main_processing_pipeline(input_filename='Reviews.csv'):
+def register_processed_data(timestamp, output_format, df=None, text_features=None,
+                            feature_names=None, rows=None, directory='processed_data', path=None):
+    """
+    Register the processed data files of a run with the artifact registry,
+    keeping in-memory objects (where given) for later stages in this process.
+    `path` overrides the processed reviews path (e.g. a part list).
+    """
+    registry = get_registry()
+    reviews = artifact_name(directory)
+    registry.register(reviews, path or reviews_path(timestamp, output_format, directory), 'process',
+                      data=df, handle=df, rows=rows)
+    registry.register(f'{directory}/text_features', f'{directory}/text_features_{timestamp}.npz',
+                      'process', data=text_features, inputs=[reviews], handle=text_features)
+    registry.register(f'{directory}/feature_names', f'{directory}/feature_names_{timestamp}.csv',
+                      'process', inputs=[reviews],
+                      handle=None if feature_names is None else list(feature_names))
+
+def _time_format(filename, chunksize):
+    """
+    Pick the datetime format the one-shot path would write for 'Time'.
+    
+    pandas writes dates without a time component when every timestamp in the
+    frame falls on midnight, so scan the raw column up front to make every
+    chunk agree with the full-frame output.
+    """
+    for chunk in pd.read_csv(filename, usecols=['Time'], chunksize=chunksize):
+        if (chunk['Time'] % 86400 != 0).any():
+            return '%Y-%m-%d %H:%M:%S'
+    return '%Y-%m-%d'
+
+def iter_processed_chunks(path, column, chunksize=50000):
+    """
+    Yield one text column of a processed reviews snapshot as lists of strings, chunk by chunk
+    """
+    for part in review_parts(path):
+        if part.endswith('.parquet'):
+            for chunk in iter_reviews(part, [column], chunksize):
+                yield chunk[column].fillna('').tolist()
+            continue
+        for chunk in pd.read_csv(part, usecols=[column], chunksize=chunksize,
+                                 dtype={column: str}, keep_default_na=False):
+            yield chunk[column].tolist()
+
+def iter_processed_column(path, column, chunksize=50000):
+    """
+    Yield the values of one column of a processed reviews file chunk by chunk
+    """
+    for chunk in iter_processed_chunks(path, column, chunksize):
+        yield from chunk
+
+def streaming_processing_pipeline(input_filename='Reviews.csv', chunksize=50000, n_jobs=1,
+                                  cache_path=None, output_format='csv', feature_mode='tfidf',
+                                  sentiment_backend='textblob'):
+    """
+    Bounded-memory variant of main_processing_pipeline.
+    
+    Reads the input in chunks of `chunksize` rows, runs cleaning, sentiment and
+    text features on each chunk and appends it to the processed reviews file, so
+    only one chunk is held in memory at a time. TF-IDF features are then fitted
+    from a stream over the written clean_text column. Outputs are identical to
+    the one-shot pipeline.
+    
+    With output_format='parquet' each chunk is appended as row groups of a
+    single Parquet file instead. With feature_mode='hashed' the topic modeling
+    features are built out of core with prepare_hashed_features.
+    `sentiment_backend` is passed to perform_sentiment_analysis.
+    """
+    print(f"Starting streaming data processing pipeline (chunksize={chunksize})...")
+    
+    if not os.path.exists('processed_data'):
+        os.makedirs('processed_data')
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_path = reviews_path(timestamp, output_format)
+    if output_format == 'parquet':
+        parquet_writer = ParquetReviewWriter(output_path, row_group_size=chunksize)
+    else:
+        parquet_writer = None
+        date_format = _time_format(input_filename, chunksize)
+    
+    n_rows = 0
+    store_writer = FeatureStoreWriter(timestamp)
+    cube = RollupCube()
+    executor = sentiment_pool(n_jobs)
+    cache = SentimentCache(cache_path) if cache_path else None
+    try:
+        chunks = profile_iter(pd.read_csv(input_filename, chunksize=chunksize), 'load')
+        for i, chunk in enumerate(chunks):
+            with profile_step('clean', rows=len(chunk)):
+                chunk = clean_reviews(chunk)
+            with profile_step('sentiment', rows=len(chunk)):
+                chunk = perform_sentiment_analysis(chunk, n_jobs, executor, cache, sentiment_backend)
+            with profile_step('text_features', rows=len(chunk)):
+                chunk = create_text_features(chunk)
+            with profile_step('save', rows=len(chunk)):
+                if parquet_writer is not None:
+                    parquet_writer.write(chunk)
+                else:
+                    chunk.to_csv(output_path, mode='w' if i == 0 else 'a', header=(i == 0),
+                                 index=False, date_format=date_format)
+                store_writer.write(chunk)
+                cube.add(chunk)
+            n_rows += len(chunk)
+            print(f"Processed {n_rows} reviews...")
+    finally:
+        store_path = store_writer.close()
+        if parquet_writer is not None:
+            parquet_writer.close()
+        if executor is not None:
+            executor.shutdown()
+        if cache is not None:
+            print(f"Sentiment cache: {cache.stats()}")
+            get_profiler().record_cache('sentiment_cache', cache.stats())
+            cache.close()
+    
+    print("Preparing text for topic modeling...")
+    term_lookup = corpus_path = None
+    with profile_step('tfidf', rows=n_rows):
+        if feature_mode == 'hashed':
+            text_features, feature_names, term_lookup = prepare_hashed_features(
+                lambda: iter_processed_chunks(output_path, 'clean_text', chunksize), n_jobs
+            )
+        else:
+            # Tokenize a stream over the written column instead of a full frame
+            corpus_path, corpus, text_features, feature_names = prepare_token_corpus(
+                lambda: iter_processed_chunks(output_path, 'clean_text', chunksize), timestamp
+            )
+    
+    with profile_step('save'):
+        import scipy.sparse as sparse
+        sparse.save_npz(f'processed_data/text_features_{timestamp}.npz', text_features)
+        pd.Series(feature_names).to_csv(f'processed_data/feature_names_{timestamp}.csv', index=False)
+        register_processed_data(timestamp, output_format, text_features=text_features,
+                                feature_names=feature_names, rows=n_rows)
+        register_feature_store(store_path)
+        save_rollup_cube(cube, timestamp)
+        if term_lookup is not None:
+            save_term_lookup(term_lookup, timestamp)
+        if corpus_path is not None:
+            from token_corpus import register_token_corpus
+            register_token_corpus(corpus_path, corpus)
+    
+    print(f"Data saved in 'processed_data' directory with timestamp {timestamp}")
+    print("Processing complete!")
+    return text_features, feature_names, timestamp
+
+def main_processing_pipeline(input_filename='Reviews.csv', chunksize=None, n_jobs=1,
+                             cache_path=None, output_format='csv', feature_mode='tfidf',
+                             sentiment_backend='textblob'):
     """
     Main processing pipeline that combines all steps
+    
+    If `chunksize` is given, the input is streamed in chunks of that many rows
+    via streaming_processing_pipeline and no in-memory frame is returned.
+    `n_jobs` sets the number of sentiment scoring processes (-1 for all cores).
+    If `cache_path` is given, sentiment scores are read from and written to a
+    SentimentCache at that path. `output_format` selects 'csv' or 'parquet'
+    for the processed reviews file. `feature_mode` selects 'tfidf' features
+    derived from the shared token corpus or out-of-core 'hashed' features.
+    `sentiment_backend` selects 'textblob' or the vectorized 'lexicon' engine
+    (TextBlob-compatible, see polarity_engine) for sentiment scores.
     """
+    if chunksize is not None:
+        text_features, feature_names, timestamp = streaming_processing_pipeline(
+            input_filename, chunksize, n_jobs, cache_path, output_format, feature_mode, sentiment_backend
+        )
+        return None, text_features, feature_names, timestamp
+    
     print("Starting data processing pipeline...")
     
     # Load and clean data
     print("Loading and cleaning data...")
-    df = load_and_clean_data(input_filename)
+    with profile_step('load') as step:
+        df = pd.read_csv(input_filename)
+        step['rows'] = len(df)
+    with profile_step('clean', rows=len(df)):
+        df = clean_reviews(df)
     
     # Add sentiment analysis
     print("Performing sentiment analysis...")
-    df = perform_sentiment_analysis(df)
+    with profile_step('sentiment', rows=len(df)):
+        if cache_path:
+            with SentimentCache(cache_path) as cache:
+                df = perform_sentiment_analysis(df, n_jobs, cache=cache, backend=sentiment_backend)
+                print(f"Sentiment cache: {cache.stats()}")
+                get_profiler().record_cache('sentiment_cache', cache.stats())
+        else:
+            df = perform_sentiment_analysis(df, n_jobs, backend=sentiment_backend)
     
     # Create text features
     print("Creating text features...")
-    df = create_text_features(df)
+    with profile_step('text_features', rows=len(df)):
+        df = create_text_features(df)
     
     # Prepare for topic modeling
     print("Preparing text for topic modeling...")
-    text_features, feature_names = prepare_for_topic_modeling(df)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    make_chunks = lambda: (df['clean_text'].iloc[i:i + 50000].tolist() for i in range(0, len(df), 50000))
+    term_lookup = corpus_path = None
+    with profile_step('tfidf', rows=len(df)):
+        if feature_mode == 'hashed':
+            text_features, feature_names, term_lookup = prepare_hashed_features(make_chunks, n_jobs)
+        else:
+            if not os.path.exists('processed_data'):
+                os.makedirs('processed_data')
+            corpus_path, corpus, text_features, feature_names = prepare_token_corpus(make_chunks, timestamp)
     
     # Save all processed data
     print("Saving processed data...")
-    timestamp = save_processed_data(df, text_features, feature_names)
+    with profile_step('save', rows=len(df)):
+        save_processed_data(df, text_features, feature_names, output_format, timestamp)
+        register_feature_store(build_feature_store([df], timestamp))
+        save_rollup_cube(RollupCube.from_frame(df), timestamp)
+        if term_lookup is not None:
+            save_term_lookup(term_lookup, timestamp)
+        if corpus_path is not None:
+            from token_corpus import register_token_corpus
+            register_token_corpus(corpus_path, corpus)
     
     print("Processing complete!")
     return df, text_features, feature_names, timestamp
 
 if __name__ == "__main__":
     # Run the pipeline
-    df, text_features, feature_names, timestamp = main_processing_pipeline()
\ No newline at end of file
+    with profile_stage('process'):
+        df, text_features, feature_names, timestamp = main_processing_pipeline()
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""
+artifact_registry.py
+
+This module implements a registry of pipeline artifacts. Each stage registers the files it
+writes under a stable artifact name (the path prefix, e.g. 'topic_models/topic_distributions'),
+together with its schema, row count and the fingerprints of the inputs it was built from.
+Stages resolve their inputs by name in O(1) instead of scanning directories, and can reuse
+the in-memory object when the producing stage ran in the same process. Lookups re-read
+the index whenever another process has replaced it, so long-lived processes (the server,
+the orchestrator, notebooks) see current artifacts.
+
+Every registration is also appended to a per-run manifest under artifacts/runs/.
+
+Dependencies:
+- pandas (optional, for schema capture)
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+REGISTRY_DIR = 'artifacts'
+
+# Files up to this size are fingerprinted by their full content
+FINGERPRINT_FULL_BYTES = 1 << 20
+# Bytes hashed from each end of larger files
+FINGERPRINT_SAMPLE_BYTES = 1 << 16
+
+def fingerprint(path):
+    """
+    Content fingerprint of a file.
+
+    Files up to FINGERPRINT_FULL_BYTES (source modules, small outputs) are hashed in
+    full, so any edit changes the fingerprint. Larger files are fingerprinted from
+    their path, size, inode, modification and change times and the first and last
+    FINGERPRINT_SAMPLE_BYTES, which keeps it cheap for multi-GB artifacts; an in-place
+    rewrite of the middle of such a file that keeps its size, inode and timestamps
+    (within the file system's timestamp resolution) is not detected. The pipeline
+    writes new files or replaces them atomically, which always changes the inode;
+    use --force after editing large inputs by hand.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha1(f'{os.path.abspath(path)}:{stat.st_size}'.encode())
+    with open(path, 'rb') as f:
+        if stat.st_size <= FINGERPRINT_FULL_BYTES:
+            digest.update(f.read())
+        else:
+            digest.update(f'{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_ctime_ns}'.encode())
+            digest.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+            f.seek(-FINGERPRINT_SAMPLE_BYTES, os.SEEK_END)
+            digest.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+    return digest.hexdigest()
+
+def describe(data):
+    """Schema and row count of a DataFrame-like object, or empty values for anything else."""
+    if hasattr(data, 'dtypes') and hasattr(data, 'columns'):
+        return {str(column): str(dtype) for column, dtype in data.dtypes.items()}, len(data)
+    if hasattr(data, 'shape'):
+        return {'shape': list(data.shape), 'dtype': str(getattr(data, 'dtype', ''))}, data.shape[0]
+    return {}, None
+
+class ArtifactRegistry:
+    """Name -> latest artifact record, persisted as JSON, with per-run manifests."""
+
+    def __init__(self, directory=REGISTRY_DIR, run_id=None):
+        self.directory = directory
+        self.index_path = f'{directory}/registry.json'
+        # Microseconds keep runs started within the same second apart
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        self._lock = threading.Lock()
+        self._handles = {}
+        self._stamp = None
+        self._index = self._read_index()
+
+    def _index_stamp(self):
+        """Identity of the index file on disk; it changes whenever another process writes it."""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        # The index is always replaced atomically, so the inode changes with every write
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _read_index(self):
+        self._stamp = self._index_stamp()
+        if self._stamp is None:
+            return {}
+        with open(self.index_path) as f:
+            return json.load(f)
+
+    def _current(self):
+        """The index, re-read first if another process has written it since it was read."""
+        if self._index_stamp() != self._stamp:
+            self.refresh()
+        return self._index
+
+    def _locked_update(self, update):
+        """Re-read the index, apply `update` and write it back atomically under a file lock."""
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(f'{self.directory}/.lock', 'w') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._index = self._read_index()
+            update(self._index)
+            tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._index, f, indent=2)
+            os.replace(tmp_path, self.index_path)
+            self._stamp = self._index_stamp()
+
+    def register(self, name, path, stage, data=None, inputs=(), handle=None, rows=None):
+        """
+        Record that `stage` wrote artifact `name` to `path`.
+
+        Args:
+            name: Artifact name, e.g. 'processed_data/processed_reviews'
+            path: File written
+            stage: Name of the producing stage
+            data: Optional object written (DataFrame, array) to record schema and rows
+            inputs: Names of the artifacts the stage consumed
+            handle: Optional in-memory object to hand to later stages in this process
+            rows: Row count, for artifacts written without an in-memory `data`
+        """
+        schema, data_rows = describe(data) if data is not None else ({}, None)
+        record = {
+            'path': path,
+            'stage': stage,
+            'run_id': self.run_id,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'fingerprint': fingerprint(path),
+            'schema': schema,
+            'rows': data_rows if data_rows is not None else rows,
+            'inputs': {
+                input_name: self._index[input_name]['fingerprint']
+                for input_name in inputs if input_name in self._index
+            }
+        }
+
+        def update(index):
+            index[name] = record
+        self._locked_update(update)
+        self._append_to_run_manifest(name, record)
+
+        if handle is not None:
+            self._handles[name] = (path, handle)
+        return record
+
+    def _append_to_run_manifest(self, name, record):
+        runs_dir = f'{self.directory}/runs'
+        if not os.path.exists(runs_dir):
+            os.makedirs(runs_dir, exist_ok=True)
+        with self._lock, open(f'{runs_dir}/{self.run_id}.jsonl', 'a') as f:
+            f.write(json.dumps({'artifact': name, **record}) + '\n')
+
+    def refresh(self):
+        """Re-read the index, e.g. after stages in other processes registered artifacts."""
+        with self._lock:
+            self._index = self._read_index()
+
+    def record(self, name):
+        """Return the latest record for an artifact, or None."""
+        return self._current().get(name)
+
+    def resolve(self, name, extensions=('csv',)):
+        """
+        Return the path of the latest artifact `name`.
+
+        Registered artifacts resolve by lookup; names never registered (e.g. outputs
+        of runs that predate the registry) fall back to the newest matching file.
+
+        Raises:
+            FileNotFoundError: If the artifact is neither registered nor on disk
+        """
+        record = self._current().get(name)
+        if record is not None and os.path.exists(record['path']):
+            return record['path']
+
+        files = [path for ext in extensions for path in glob.glob(f'{name}_*.{ext}')]
+        if not files:
+            raise FileNotFoundError(f"No artifact found for '{name}'.")
+        return max(files, key=lambda f: (os.path.splitext(f)[0], extensions.index(f.rsplit('.', 1)[1])))
+
+    def find(self, name, extensions=('csv',)):
+        """Like resolve, but return None when the artifact does not exist."""
+        try:
+            return self.resolve(name, extensions)
+        except FileNotFoundError:
+            return None
+
+    def handle(self, name):
+        """Return the in-memory object registered for `name` in this process, if still current."""
+        entry = self._handles.get(name)
+        record = self._current().get(name)
+        if entry is None or record is None or record['path'] != entry[0]:
+            return None
+        return entry[1]
+
+    def load(self, name, loader, extensions=('csv',)):
+        """Return the in-memory handle for `name`, or load the resolved path with `loader`."""
+        handle = self.handle(name)
+        if handle is not None:
+            return handle
+        return loader(self.resolve(name, extensions))
+
+_default_registry = None
+
+def get_registry():
+    """Process-wide registry shared by all stages; PIPELINE_RUN_ID groups worker processes into one run."""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ArtifactRegistry(run_id=os.environ.get('PIPELINE_RUN_ID'))
+    return _default_registry
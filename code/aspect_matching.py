@@ -0,0 +1,233 @@
+"""
+aspect_matching.py
+
+This module implements batch aspect-based sentiment extraction. All terms of an aspect
+lexicon are compiled into a single regular expression shaped as a prefix tree (a trie of
+the terms, so the engine walks one automaton instead of trying every term in turn), with
+word boundaries on both sides and flexible whitespace inside multi-word terms such as
+'customer service'. Each review is scanned once; only sentences that contain an aspect
+term are scored for polarity (with TextBlob or the vectorized lexicon engine), and
+identical sentences within a chunk are scored once, in one batch.
+Chunks of reviews can be spread across a process pool.
+
+Lexicons are plain {aspect: [terms]} mappings and can be extended at run time or loaded
+from a JSON file.
+
+Dependencies:
+- numpy
+- pandas
+- textblob
+"""
+
+import json
+import re
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sentiment_scoring import resolve_n_jobs, score_batch
+
+DEFAULT_ASPECT_LEXICON = {
+    'quality': ['quality', 'durability', 'durable', 'sturdy', 'solid'],
+    'price': ['price', 'cost', 'expensive', 'cheap', 'value'],
+    'usability': ['easy', 'simple', 'difficult', 'complicated', 'user-friendly'],
+    'service': ['delivery', 'shipping', 'customer service', 'support', 'warranty']
+}
+
+def normalize_term(term):
+    """Lowercase a term and collapse internal whitespace to single spaces."""
+    return ' '.join(str(term).lower().split())
+
+def load_lexicon(path):
+    """Read a {aspect: [terms]} lexicon from a JSON file."""
+    with open(path) as f:
+        lexicon = json.load(f)
+    if not isinstance(lexicon, dict) or not all(isinstance(t, list) for t in lexicon.values()):
+        raise ValueError(f"{path} must hold a JSON object mapping aspects to lists of terms")
+    return lexicon
+
+def merge_lexicons(*lexicons):
+    """Union of lexicons; terms of the same aspect are combined, in first-seen order."""
+    merged = {}
+    for lexicon in lexicons:
+        for aspect, terms in (lexicon or {}).items():
+            known = merged.setdefault(aspect, [])
+            known.extend(term for term in terms if term not in known)
+    return merged
+
+def _trie_pattern(terms):
+    """Regex source matching exactly `terms`, factored as a prefix tree."""
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node):
+        end = '' in node
+        branches = []
+        for char in sorted(c for c in node if c):
+            # A space inside a multi-word term matches any run of whitespace
+            atom = r'\s+' if char == ' ' else re.escape(char)
+            branches.append(atom + emit(node[char]))
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if end:
+            # Greedy, so the longest term wins; the boundary check backtracks if needed
+            body = body + '?' if len(branches) == 1 and len(branches[0]) == 1 else f'(?:{body})?'
+        return body
+
+    return emit(trie)
+
+class AspectMatcher:
+    """Compiled multi-term matcher from lexicon terms to aspects."""
+
+    def __init__(self, lexicon=None):
+        """
+        Args:
+            lexicon: {aspect: [terms]}; defaults to DEFAULT_ASPECT_LEXICON. Matching is
+                case-insensitive and terms only match as whole words.
+        """
+        self.lexicon = {}
+        self.term_aspects = {}
+        self.extend(DEFAULT_ASPECT_LEXICON if lexicon is None else lexicon)
+
+    @property
+    def aspects(self):
+        return list(self.lexicon)
+
+    def extend(self, lexicon):
+        """Add aspects or terms and recompile the matcher; returns self."""
+        self.lexicon = merge_lexicons(self.lexicon, lexicon)
+        self.term_aspects = {}
+        for aspect, terms in self.lexicon.items():
+            for term in terms:
+                term = normalize_term(term)
+                if term:
+                    self.term_aspects.setdefault(term, [])
+                    if aspect not in self.term_aspects[term]:
+                        self.term_aspects[term].append(aspect)
+        if self.term_aspects:
+            self.pattern = re.compile(r'(?<!\w)' + _trie_pattern(self.term_aspects) + r'(?!\w)')
+        else:
+            self.pattern = re.compile(r'(?!)')
+        return self
+
+    def find(self, text):
+        """(start offset, aspects) for every term occurrence in lowercased `text`."""
+        return [(m.start(), self.term_aspects[' '.join(m.group().split())])
+                for m in self.pattern.finditer(text)]
+
+    def match(self, sentence):
+        """Set of aspects mentioned in a sentence."""
+        return {aspect for _, aspects in self.find(sentence.lower()) for aspect in aspects}
+
+    def sentence_aspects(self, text):
+        """
+        Aspects per sentence for a review, splitting on '.'.
+
+        The review is scanned once; sentences without an aspect term are left out.
+
+        Returns:
+            List of (sentence, set of aspects)
+        """
+        text = str(text).lower()
+        hits = self.find(text)
+        if not hits:
+            return []
+        starts = [0] + [i + 1 for i, char in enumerate(text) if char == '.']
+        by_sentence = {}
+        for offset, aspects in hits:
+            by_sentence.setdefault(bisect_right(starts, offset) - 1, set()).update(aspects)
+        sentences = text.split('.')
+        return [(sentences[index], aspects) for index, aspects in sorted(by_sentence.items())]
+
+def _aspect_hits(matcher, text):
+    return [(sentence, aspects) for sentence, aspects in matcher.sentence_aspects(text) if sentence.strip()]
+
+def _fill_polarity(cache, sentences, backend):
+    """Score the sentences missing from `cache` in one batch."""
+    missing = [sentence for sentence in dict.fromkeys(sentences) if sentence not in cache]
+    if missing:
+        cache.update(zip(missing, score_batch(missing, backend)[:, 0]))
+
+def _aggregate(matcher, hits, polarity):
+    sums = dict.fromkeys(matcher.lexicon, 0.0)
+    counts = dict.fromkeys(matcher.lexicon, 0)
+    for sentence, aspects in hits:
+        for aspect in aspects:
+            sums[aspect] += polarity[sentence]
+            counts[aspect] += 1
+    return {aspect: sums[aspect] / counts[aspect] if counts[aspect] else np.nan for aspect in matcher.lexicon}
+
+def score_review(matcher, text, polarity_cache=None, backend='textblob'):
+    """
+    Mean sentence polarity per aspect for one review (NaN for aspects not mentioned).
+
+    Only sentences with an aspect term are scored, with the given sentiment backend
+    (see sentiment_scoring); `polarity_cache` is an optional dict reused across
+    reviews so repeated sentences are scored once.
+    """
+    cache = {} if polarity_cache is None else polarity_cache
+    hits = _aspect_hits(matcher, text)
+    _fill_polarity(cache, [sentence for sentence, _ in hits], backend)
+    return _aggregate(matcher, hits, cache)
+
+_matchers = {}
+
+def _matcher_for(lexicon):
+    """Per-process cache of compiled matchers, keyed by lexicon contents."""
+    key = json.dumps(lexicon, sort_keys=True)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = _matchers[key] = AspectMatcher(lexicon)
+    return matcher
+
+def _score_chunk(lexicon, texts, backend='textblob'):
+    """Score a chunk of reviews; top-level so it can be sent to worker processes."""
+    matcher = _matcher_for(lexicon)
+    hits = [_aspect_hits(matcher, text) for text in texts]
+    # All sentences of the chunk that need a polarity are scored in one batch
+    cache = {}
+    _fill_polarity(cache, [sentence for review in hits for sentence, _ in review], backend)
+    scores = np.empty((len(texts), len(matcher.lexicon)), dtype=np.float64)
+    for i, review in enumerate(hits):
+        scores[i] = list(_aggregate(matcher, review, cache).values())
+    return scores, len(cache)
+
+def score_aspects(texts, lexicon=None, n_jobs=1, chunk_size=20000, executor=None, backend='textblob'):
+    """
+    Aspect sentiments for many reviews.
+
+    Args:
+        texts: Iterable of review texts
+        lexicon: {aspect: [terms]} (default DEFAULT_ASPECT_LEXICON)
+        n_jobs: Worker processes (-1 for all cores); ignored if executor is given
+        chunk_size: Reviews per task sent to a worker
+        executor: Optional existing process pool
+        backend: Sentence polarity backend, 'textblob' or 'lexicon'
+
+    Returns:
+        DataFrame with one column per aspect and one row per review, in input order
+    """
+    lexicon = merge_lexicons(DEFAULT_ASPECT_LEXICON if lexicon is None else lexicon)
+    texts = ['' if text is None or (isinstance(text, float) and np.isnan(text)) else str(text) for text in texts]
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+    n_workers = resolve_n_jobs(n_jobs)
+    if executor is None and n_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(chunks))) as pool:
+            results = list(pool.map(_score_chunk, [lexicon] * len(chunks), chunks, [backend] * len(chunks)))
+    elif executor is not None:
+        results = list(executor.map(_score_chunk, [lexicon] * len(chunks), chunks, [backend] * len(chunks)))
+    else:
+        results = [_score_chunk(lexicon, chunk, backend) for chunk in chunks]
+
+    scored = sum(n for _, n in results)
+    print(f"Aspect sentiments for {len(texts)} reviews ({scored} distinct sentences with aspect terms scored)")
+    values = np.vstack([scores for scores, _ in results]) if results else np.empty((0, len(lexicon)))
+    return pd.DataFrame(values, columns=list(lexicon))
@@ -0,0 +1,454 @@
+"""
+benchmark.py
+
+This module implements a benchmark suite for the analysis pipeline. It generates synthetic
+Reviews.csv files with the schema and the main distributions of the Amazon Fine Food
+reviews dataset at configurable scales, times the stage entry points on them and saves the
+results as JSON baselines that can be compared across versions.
+
+The generator reproduces:
+- score skew (about 64% five-star reviews)
+- Zipf-distributed product and user activity
+- lognormal review lengths (median around 55 words)
+- roughly 47% of reviews without helpfulness votes
+- a share of verbatim duplicate reviews posted under other products, as in the real data
+
+Review text is assembled from a pool of sentences whose polarity follows the score, so
+sentiment, aspect and topic stages see realistic work.
+
+Usage:
+    python benchmark.py generate --rows 100000 --output Reviews_100k.csv
+    python benchmark.py run --scales 10k 100k --repeat 3
+    python benchmark.py compare benchmarks/results/baseline_A.json benchmarks/results/baseline_B.json
+
+Dependencies:
+- numpy
+- pandas
+- the stage modules of this project (stages whose dependencies are missing are skipped)
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_DIR = 'benchmarks'
+
+SCALES = {'10k': 10000, '100k': 100000, '568k': 568454, '5m': 5000000}
+
+# Share of each score in the real dataset
+SCORE_PROBABILITIES = {1: 0.092, 2: 0.052, 3: 0.075, 4: 0.142, 5: 0.639}
+
+# Probability that a sentence is positive, neutral or negative, per score
+SENTENCE_MOOD = {
+    1: (0.10, 0.25, 0.65),
+    2: (0.20, 0.30, 0.50),
+    3: (0.35, 0.35, 0.30),
+    4: (0.60, 0.30, 0.10),
+    5: (0.70, 0.25, 0.05)
+}
+
+SUBJECTS = ['this coffee', 'the tea', 'this product', 'the flavor', 'the taste', 'my dog', 'the price',
+            'the quality', 'shipping', 'delivery', 'the packaging', 'these chips', 'the sauce',
+            'this snack', 'the cereal', 'customer service', 'the box', 'the value', 'my kids',
+            'the texture', 'the smell', 'this brand', 'the cookies', 'the candy', 'the formula']
+POSITIVE = ['is great', 'is delicious', 'tastes amazing', 'is excellent', 'was perfect', 'is the best',
+            'is really good', 'is fresh and tasty', 'is worth the price', 'was easy to use',
+            'arrived quickly', 'is a great value', 'is sturdy and solid', 'is my favorite',
+            'was wonderful', 'is high quality', 'is cheap and good', 'is simple to prepare']
+NEUTRAL = ['is okay', 'arrived on time', 'is what I expected', 'is similar to the store brand',
+           'comes in a large box', 'is available in several sizes', 'was ordered last month',
+           'is made in the usa', 'has a mild flavor', 'lasts about two weeks']
+NEGATIVE = ['is terrible', 'tastes bad', 'was stale', 'is too expensive', 'was disappointing',
+            'is the worst', 'arrived broken', 'is bland', 'was difficult to open', 'is poor quality',
+            'smells awful', 'is overpriced', 'was complicated to use', 'had a horrible aftertaste']
+OPENERS = ['', '', '', 'I think ', 'Honestly, ', 'Overall ', 'I found that ', 'My husband says ',
+           'After a week ', 'Unfortunately ', 'Surprisingly ', 'As always ']
+ENDINGS = ['.', '.', '.', '!', '!!', '.<br /><br />', '...', '. :)']
+SUMMARIES = {
+    'positive': ['Great product', 'Delicious!', 'Love it', 'Best coffee ever', 'Excellent value',
+                 'Highly recommended', 'Yummy', 'Perfect snack', 'Five stars', 'My favorite tea'],
+    'neutral': ['Okay', 'Not bad', 'As expected', 'Decent', 'It is fine', 'Average taste'],
+    'negative': ['Disappointed', 'Terrible', 'Do not buy', 'Stale', 'Waste of money', 'Not as described']
+}
+
+def _sentence_pool(rng, size_per_mood=3000):
+    """Sentence pools per mood, built from subject/predicate/opener combinations."""
+    pools = []
+    for predicates in (POSITIVE, NEUTRAL, NEGATIVE):
+        sentences = set()
+        while len(sentences) < size_per_mood:
+            opener = OPENERS[rng.integers(len(OPENERS))]
+            subject = SUBJECTS[rng.integers(len(SUBJECTS))]
+            predicate = predicates[rng.integers(len(predicates))]
+            text = f"{opener}{subject} {predicate}"
+            if rng.random() < 0.5:
+                text += f" and {SUBJECTS[rng.integers(len(SUBJECTS))]} {predicates[rng.integers(len(predicates))]}"
+            sentences.add(text[0].upper() + text[1:] + ENDINGS[rng.integers(len(ENDINGS))])
+        pools.append(np.array(sorted(sentences), dtype=object))
+    return pools
+
+def _zipf_ids(rng, n, n_distinct, exponent=1.1):
+    """Zipf-like ids in [0, n_distinct): a few very active ids and a long tail."""
+    ranks = np.arange(1, n_distinct + 1, dtype=np.float64)
+    weights = ranks ** -exponent
+    cumulative = np.cumsum(weights / weights.sum())
+    ids = np.searchsorted(cumulative, rng.random(n))
+    return np.minimum(ids, n_distinct - 1)
+
+def generate_reviews(n_rows, path, seed=42, chunksize=100000, duplicate_rate=0.25):
+    """
+    Write a synthetic Reviews.csv with `n_rows` rows in chunks (bounded memory).
+
+    Args:
+        n_rows: Number of reviews
+        path: Output CSV path
+        seed: Random seed; the same seed and size give the same file
+        chunksize: Rows generated per chunk
+        duplicate_rate: Share of reviews that repeat an earlier review verbatim
+            (same user, text and score) under another product
+
+    Returns:
+        path
+    """
+    rng = np.random.default_rng(seed)
+    pools = _sentence_pool(rng)
+    n_products = max(10, int(n_rows * 0.13))
+    n_users = max(10, int(n_rows * 0.45))
+    scores = np.array(list(SCORE_PROBABILITIES))
+    score_p = np.array(list(SCORE_PROBABILITIES.values()))
+    # Real timestamps are whole days between late 1999 and late 2012, skewed to recent years
+    start, end = 939340800, 1351209600
+    days = (end - start) // 86400
+
+    # Duplicates copy earlier reviews of the chunk or a bounded reservoir of earlier chunks
+    reservoir = None
+    written = 0
+    for offset in range(0, n_rows, chunksize):
+        n = min(chunksize, n_rows - offset)
+        score = rng.choice(scores, size=n, p=score_p)
+        user = _zipf_ids(rng, n, n_users, 0.9)
+
+        # Sentences per review from a lognormal word count (about 10 words per sentence)
+        n_sentences = np.clip(np.round(rng.lognormal(np.log(55 / 10), 0.75, n)), 1, 250).astype(np.int64)
+        mood_p = np.array([SENTENCE_MOOD[s] for s in range(1, 6)])[score - 1]
+        total = int(n_sentences.sum())
+        review_of_sentence = np.repeat(np.arange(n), n_sentences)
+        u = rng.random(total)
+        cumulative = np.cumsum(mood_p[review_of_sentence], axis=1)
+        mood = (u[:, None] > cumulative).sum(axis=1)
+        picks = np.empty(total, dtype=object)
+        for m, pool in enumerate(pools):
+            mask = mood == m
+            picks[mask] = pool[rng.integers(len(pool), size=int(mask.sum()))]
+        bounds = np.concatenate([[0], np.cumsum(n_sentences)])
+        text = [' '.join(picks[bounds[i]:bounds[i + 1]]) for i in range(n)]
+
+        summary_mood = np.where(score >= 4, 'positive', np.where(score == 3, 'neutral', 'negative'))
+        summary = [SUMMARIES[m][rng.integers(len(SUMMARIES[m]))] for m in summary_mood]
+
+        # About 47% of reviews have no votes; the helpful share rises with the score
+        denominator = np.where(rng.random(n) < 0.47, 0, rng.geometric(0.35, n))
+        helpful_p = np.clip(0.35 + 0.12 * (score - 3), 0.05, 0.95)
+        numerator = rng.binomial(denominator, helpful_p)
+        day = (days * rng.beta(4, 1.6, n)).astype(np.int64)
+
+        chunk = pd.DataFrame({
+            'Id': np.arange(offset + 1, offset + n + 1),
+            'ProductId': _zipf_ids(rng, n, n_products),
+            'UserId': user,
+            'ProfileName': user,
+            'HelpfulnessNumerator': numerator,
+            'HelpfulnessDenominator': denominator,
+            'Score': score,
+            'Time': start + day * 86400,
+            'Summary': summary,
+            'Text': text
+        })
+
+        if duplicate_rate > 0:
+            # Copy from a random earlier review: one of the reservoir or earlier in this chunk
+            dup = np.flatnonzero(rng.random(n) < duplicate_rate)
+            dup = dup[dup > 0] if reservoir is None else dup
+            earlier = chunk if reservoir is None else pd.concat([reservoir, chunk], ignore_index=True)
+            n_reservoir = 0 if reservoir is None else len(reservoir)
+            source = earlier.iloc[(rng.random(len(dup)) * (n_reservoir + dup)).astype(np.int64)]
+            for column in ['UserId', 'ProfileName', 'HelpfulnessNumerator', 'HelpfulnessDenominator',
+                           'Score', 'Time', 'Summary', 'Text']:
+                chunk.loc[chunk.index[dup], column] = source[column].to_numpy()
+            reservoir = chunk.sample(min(len(chunk), 20000), random_state=int(rng.integers(2 ** 31)))
+
+        out = chunk.copy()
+        out['ProductId'] = ['B%09d' % i for i in chunk['ProductId']]
+        out['UserId'] = ['A%012d' % i for i in chunk['UserId']]
+        out['ProfileName'] = ['user %d' % i for i in chunk['ProfileName']]
+        out.to_csv(path, mode='w' if offset == 0 else 'a', header=(offset == 0), index=False)
+        written += n
+        print(f"Generated {written} of {n_rows} reviews...")
+    return path
+
+def dataset_path(rows, seed=42, directory=f'{BENCHMARK_DIR}/data'):
+    """Generate (once) and return the synthetic dataset for a size and seed."""
+    path = os.path.abspath(f'{directory}/Reviews_{rows}_{seed}.csv')
+    if not os.path.exists(path):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        generate_reviews(rows, path + '.tmp', seed)
+        os.replace(path + '.tmp', path)
+    return path
+
+# Benchmark cases. Each takes the case context and returns the number of rows it handled.
+
+def _bench_process(context):
+    from amazon_review_processor import main_processing_pipeline
+    main_processing_pipeline(context['input'], chunksize=context['chunksize'], n_jobs=context['n_jobs'])
+    return context['rows']
+
+def _reviews(context, columns):
+    from review_store import load_processed_reviews
+    return load_processed_reviews(columns=columns)
+
+def _limit(df, context):
+    limit = context['max_rows']
+    return df if limit is None or len(df) <= limit else df.head(limit)
+
+def _bench_topics(context):
+    from updated_topic_modeling import TopicModeler
+    from token_corpus import load_token_corpus
+    df = _limit(_reviews(context, ['clean_text', 'sentiment_score']), context)
+    df['clean_text'] = df['clean_text'].fillna('')
+    corpus = load_token_corpus()
+    if corpus is not None and len(corpus) != len(df):
+        corpus = None
+    TopicModeler().find_optimal_topics(df, corpus)
+    return len(df)
+
+def _bench_aspects(context):
+    from sentiment_analysis import SentimentAnalyzer
+    texts = _limit(_reviews(context, ['Text']), context)['Text']
+    SentimentAnalyzer().extract_aspect_sentiments_batch(texts, n_jobs=context['n_jobs'])
+    return len(texts)
+
+def _bench_category_patterns(context):
+    from helpfulness_predictor import HelpfulnessPredictor
+    predictor = HelpfulnessPredictor()
+    df = predictor.load_processed_data()
+    features = predictor.create_features(df)
+    predictor.analyze_category_patterns(df, features, predictor.prepare_target(df))
+    return len(df)
+
+def _bench_impact(context):
+    from impact_analysis import ImpactAnalyzer
+    from review_store import load_compact_reviews
+    df = load_compact_reviews(columns=['ProductId', 'Score', 'Time', 'helpfulness_ratio',
+                                       'sentiment_score', 'text_length'])
+    ImpactAnalyzer(save_dir='impact_analysis').calculate_business_impact(df)
+    return len(df)
+
+def _bench_visualizations(context):
+    from updated_visualization import ReviewVisualizer
+    ReviewVisualizer().create_all_visualizations()
+    return context['rows']
+
+# Case name -> function; the process case produces the inputs of all later cases
+CASES = {
+    'process.main_processing_pipeline': _bench_process,
+    'topics.find_optimal_topics': _bench_topics,
+    'sentiment.extract_aspect_sentiments': _bench_aspects,
+    'helpfulness.analyze_category_patterns': _bench_category_patterns,
+    'impact.calculate_business_impact': _bench_impact,
+    'visualize.create_all_visualizations': _bench_visualizations
+}
+
+def _run_scale(scale, context, cases, repeat):
+    """Run the cases for one scale inside its own working directory (in a fresh process)."""
+    if CODE_DIR not in sys.path:
+        sys.path.insert(0, CODE_DIR)
+    from profiling import StageProfiler
+    workdir = context['workdir']
+    if not os.path.exists(workdir):
+        os.makedirs(workdir)
+    os.chdir(workdir)
+
+    profiler = StageProfiler(f'benchmark_{scale}')
+    profiler.start()
+    results = {}
+    for name in cases:
+        function = CASES[name]
+        times, rows, status, error = [], None, 'ok', None
+        for i in range(repeat):
+            start = time.perf_counter()
+            try:
+                with profiler.step(name) as step:
+                    rows = step['rows'] = function(context)
+            except ImportError as e:
+                status, error = 'skipped', f"missing dependency: {e}"
+                break
+            except Exception as e:
+                status, error = 'failed', ''.join(traceback.format_exception_only(type(e), e)).strip()
+                break
+            times.append(time.perf_counter() - start)
+        entry = profiler.steps.get(name, {})
+        results[name] = {
+            'status': status,
+            'error': error,
+            'rows': rows,
+            'runs': times,
+            'seconds_min': min(times) if times else None,
+            'seconds_median': statistics.median(times) if times else None,
+            'rows_per_second': rows / min(times) if times and rows else None,
+            'cpu_seconds': entry.get('cpu_seconds'),
+            'rss_growth_mb': entry.get('rss_growth_mb'),
+            'process_peak_rss_mb': entry.get('process_peak_rss_mb')
+        }
+        print(f"[benchmark {scale}] {name}: {status}"
+              + (f" {results[name]['seconds_min']:.2f}s" if times else f" ({error})"))
+    return results
+
+def _environment():
+    versions = {}
+    for module in ['numpy', 'pandas', 'sklearn', 'scipy', 'pyarrow', 'gensim', 'torch', 'textblob']:
+        try:
+            versions[module] = __import__(module).__version__
+        except Exception:
+            versions[module] = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=CODE_DIR, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': commit,
+        'packages': versions
+    }
+
+def run_benchmarks(scales=('10k',), cases=None, repeat=1, seed=42, n_jobs=1, stream_above=1000000,
+                   chunksize=100000, max_rows=50000, output_dir=f'{BENCHMARK_DIR}/results'):
+    """
+    Run the benchmark cases at each scale and save a JSON baseline.
+
+    Args:
+        scales: Scale names from SCALES or row counts
+        cases: Case names from CASES (default all, in order)
+        repeat: Timed repetitions per case; the minimum and median are reported
+        seed: Generator seed
+        n_jobs: Sentiment scoring processes for the process case
+        stream_above: Process inputs larger than this many rows with the streaming pipeline
+        chunksize: Streaming chunk size
+        max_rows: Row cap for the per-document NLP cases (topic sweep and aspect
+            extraction); None for the full dataset
+        output_dir: Directory for baseline files
+
+    Returns:
+        Path of the saved baseline
+    """
+    cases = list(cases or CASES)
+    baseline = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': _environment(),
+        'config': {'repeat': repeat, 'seed': seed, 'n_jobs': n_jobs, 'stream_above': stream_above,
+                   'chunksize': chunksize, 'max_rows': max_rows},
+        'scales': {}
+    }
+    # Each scale runs in a fresh process so memory figures and module state do not leak
+    context_manager = multiprocessing.get_context('spawn')
+    for scale in scales:
+        rows = SCALES[scale] if scale in SCALES else int(scale)
+        print(f"\n=== Benchmark scale {scale} ({rows} rows) ===")
+        context = {
+            'input': dataset_path(rows, seed),
+            'rows': rows,
+            'chunksize': chunksize if rows > stream_above else None,
+            'n_jobs': n_jobs,
+            'max_rows': max_rows,
+            'workdir': os.path.abspath(f'{BENCHMARK_DIR}/runs/{scale}')
+        }
+        with ProcessPoolExecutor(max_workers=1, mp_context=context_manager) as executor:
+            results = executor.submit(_run_scale, str(scale), context, cases, repeat).result()
+        baseline['scales'][str(scale)] = {'rows': rows, 'results': results}
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    path = f"{output_dir}/baseline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+    print(f"\nBaseline saved to {path}")
+    return path
+
+def compare_baselines(baseline_path, candidate_path, threshold=0.1):
+    """
+    Compare two baselines case by case.
+
+    Returns:
+        DataFrame with scale, case, baseline and candidate minimum seconds, their ratio
+        and whether the candidate is slower by more than `threshold`
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+    rows = []
+    for scale, data in candidate['scales'].items():
+        for case, result in data['results'].items():
+            before = baseline['scales'].get(scale, {}).get('results', {}).get(case, {})
+            old, new = before.get('seconds_min'), result.get('seconds_min')
+            ratio = new / old if old and new else None
+            rows.append({
+                'scale': scale, 'case': case, 'baseline_seconds': old, 'candidate_seconds': new,
+                'ratio': ratio, 'regression': ratio is not None and ratio > 1 + threshold
+            })
+    return pd.DataFrame(rows)
+
+def main(argv=None):
+    """Command line entry point (`argv` defaults to sys.argv[1:])."""
+    parser = argparse.ArgumentParser(description="Benchmark the review analysis pipeline.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate = subparsers.add_parser('generate', help="Write a synthetic Reviews.csv")
+    generate.add_argument('--rows', type=int, default=10000)
+    generate.add_argument('--output', default='Reviews_synthetic.csv')
+    generate.add_argument('--seed', type=int, default=42)
+
+    run = subparsers.add_parser('run', help="Run the benchmark suite and save a baseline")
+    run.add_argument('--scales', nargs='+', default=['10k'], help=f"{', '.join(SCALES)} or row counts")
+    run.add_argument('--cases', nargs='+', choices=list(CASES), default=None)
+    run.add_argument('--repeat', type=int, default=1)
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--jobs', type=int, default=1, help="Sentiment scoring processes")
+    run.add_argument('--max-rows', type=int, default=50000,
+                     help="Row cap for topic sweep and aspect extraction (0 for no cap)")
+
+    compare = subparsers.add_parser('compare', help="Compare two baselines")
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+    compare.add_argument('--threshold', type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        generate_reviews(args.rows, args.output, args.seed)
+    elif args.command == 'run':
+        run_benchmarks(args.scales, args.cases, args.repeat, args.seed, args.jobs,
+                       max_rows=args.max_rows or None)
+    else:
+        report = compare_baselines(args.baseline, args.candidate, args.threshold)
+        print(report.to_string(index=False))
+        if report['regression'].any():
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
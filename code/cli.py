@@ -0,0 +1,184 @@
+"""
+cli.py
+
+This module implements a single command line entry point for the analysis pipeline. Each
+subcommand imports only the stage module it runs, so heavy libraries (torch, transformers,
+gensim, LightGBM, plotting) are loaded only by the stages that need them, and the stage
+modules themselves defer those imports to the functions that use them. The time spent
+importing the stage module is printed and recorded as the 'import' step of the stage
+profile.
+
+Usage:
+    python cli.py process --input Reviews.csv --chunksize 100000 --jobs -1
+    python cli.py impact
+    python cli.py pipeline sentiment --force
+    python cli.py benchmark run --scales 10k
+    python cli.py serve --port 8765
+    python cli.py infer --quantize --chunksize 20000
+    python cli.py import-times
+
+Dependencies:
+- the stage modules of this project
+"""
+
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+from profiling import profile_stage, profile_step
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Subcommand -> (module, function, profile stage name)
+STAGES = {
+    'process': ('amazon_review_processor', 'main_processing_pipeline', 'process'),
+    'incremental': ('incremental_processing', 'incremental_processing_pipeline', 'process'),
+    'sentiment': ('sentiment_analysis', 'main', 'sentiment'),
+    'advanced-sentiment': ('advanced_sentiment', 'main', 'advanced_sentiment'),
+    'topics': ('updated_topic_modeling', 'main', 'topics'),
+    'helpfulness': ('helpfulness_predictor', 'main', 'helpfulness'),
+    'impact': ('impact_analysis', 'main', 'impact'),
+    'visualize': ('updated_visualization', 'main', 'visualize')
+}
+
+# Subcommands that hand their remaining arguments to another module's main(argv)
+FORWARDED = {
+    'pipeline': 'pipeline',
+    'benchmark': 'benchmark',
+    'serve': 'sentiment_server',
+    'infer': 'sentiment_inference'
+}
+
+def import_stage(module_name):
+    """Import a stage module, print the time it took and return the module."""
+    with profile_step('import'):
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        elapsed = time.perf_counter() - start
+    print(f"[cli] imported {module_name} in {elapsed * 1000:.0f} ms")
+    return module
+
+def run_stage(command, **kwargs):
+    """Import and run the stage behind `command` inside its stage profile."""
+    module_name, function, stage = STAGES[command]
+    with profile_stage(stage):
+        module = import_stage(module_name)
+        return getattr(module, function)(**kwargs)
+
+def measure_import_times(modules=None):
+    """
+    Cold import time of stage modules, each in a fresh interpreter.
+
+    Returns:
+        Dict of module -> (import seconds, interpreter wall seconds including start-up)
+    """
+    modules = modules or sorted({module for module, _, _ in STAGES.values()})
+    timer = "import sys, time; sys.path.insert(0, {!r}); start = time.perf_counter(); import {}; print(time.perf_counter() - start)"
+    times = {}
+    for module in modules:
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', timer.format(CODE_DIR, module)],
+                                capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        if result.returncode != 0:
+            print(f"  {module:<28} failed: {result.stderr.strip().splitlines()[-1]}")
+            continue
+        times[module] = (float(result.stdout.strip().splitlines()[-1]), wall)
+        print(f"  {module:<28} import {times[module][0] * 1000:7.0f} ms   process {wall * 1000:7.0f} ms")
+    return times
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Amazon review analysis pipeline.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for name in ('process', 'incremental'):
+        sub = subparsers.add_parser(name, help=f"Run the {name} stage")
+        sub.add_argument('--input', default='Reviews.csv', help="Raw reviews CSV")
+        sub.add_argument('--jobs', type=int, default=1, help="Sentiment scoring processes (-1 for all cores)")
+        sub.add_argument('--cache', default=None, help="SentimentCache path")
+        sub.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="Processed store format")
+        sub.add_argument('--sentiment-backend', choices=['textblob', 'lexicon'], default='textblob',
+                         help="TextBlob, or the vectorized TextBlob-compatible lexicon engine")
+        if name == 'process':
+            sub.add_argument('--chunksize', type=int, default=None, help="Stream the input in chunks of this many rows")
+            sub.add_argument('--features', choices=['tfidf', 'hashed'], default='tfidf', help="Topic feature mode")
+        else:
+            sub.add_argument('--chunksize', type=int, default=50000, help="Rows per chunk")
+            sub.add_argument('--refit-fraction', type=float, default=0.1,
+                             help="Refit TF-IDF once the changed share of the corpus exceeds this")
+
+    sentiment = subparsers.add_parser('sentiment', help="Run the sentiment stage")
+    sentiment.add_argument('--jobs', type=int, default=-1, help="Aspect extraction processes (-1 for all cores)")
+    sentiment.add_argument('--lexicon', default=None, help="JSON {aspect: [terms]} extending the aspect lexicon")
+    sentiment.add_argument('--classifier', choices=['forest', 'streaming'], default='forest',
+                           help="In-memory random forest or out-of-core partial_fit training")
+    sentiment.add_argument('--sentiment-backend', choices=['textblob', 'lexicon'], default='textblob',
+                           help="Polarity backend for aspect sentences")
+
+    advanced = subparsers.add_parser('advanced-sentiment', help="Run the advanced sentiment stage")
+    advanced.add_argument('--sample-size', type=int, default=50000, help="Reviews to sample (0 for the full corpus)")
+    advanced.add_argument('--batch-size', type=int, default=32, help="Reviews per forward pass")
+    advanced.add_argument('--accumulation-steps', type=int, default=1,
+                          help="Batches per optimizer step (effective batch = batch size x steps)")
+    advanced.add_argument('--bf16', action='store_true', help="bfloat16 autocast for the forward pass")
+    advanced.add_argument('--no-resume', dest='resume', action='store_false',
+                          help="Ignore an existing training checkpoint")
+    advanced.add_argument('--jobs', type=int, default=-1, help="Group statistics processes (-1 for all cores)")
+
+    impact = subparsers.add_parser('impact', help="Run the impact stage")
+    impact.add_argument('--jobs', type=int, default=-1, help="Group statistics processes (-1 for all cores)")
+
+    for name in ('topics', 'helpfulness', 'visualize'):
+        subparsers.add_parser(name, help=f"Run the {name} stage")
+
+    # No -h of their own, so --help reaches the forwarded parser
+    subparsers.add_parser('pipeline', add_help=False, help="Run the orchestrator (arguments are passed to pipeline.py)")
+    subparsers.add_parser('benchmark', add_help=False, help="Run the benchmark suite (arguments are passed to benchmark.py)")
+    subparsers.add_parser('serve', add_help=False,
+                          help="Serve the saved sentiment classifier (arguments are passed to sentiment_server.py)")
+    subparsers.add_parser('infer', add_help=False,
+                          help="Score all reviews with the fine-tuned DistilBERT model "
+                               "(arguments are passed to sentiment_inference.py)")
+
+    times = subparsers.add_parser('import-times', help="Measure cold import time of the stage modules")
+    times.add_argument('modules', nargs='*', help="Modules to measure (default: all stage modules)")
+    return parser
+
+def main(argv=None):
+    """Command line entry point (`argv` defaults to sys.argv[1:])."""
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command not in FORWARDED:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+
+    if args.command in FORWARDED:
+        start = time.perf_counter()
+        module = importlib.import_module(FORWARDED[args.command])
+        print(f"[cli] imported {FORWARDED[args.command]} in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return module.main(extra)
+    if args.command == 'import-times':
+        return measure_import_times(args.modules)
+    if args.command == 'process':
+        return run_stage('process', input_filename=args.input, chunksize=args.chunksize, n_jobs=args.jobs,
+                         cache_path=args.cache, output_format=args.format, feature_mode=args.features,
+                         sentiment_backend=args.sentiment_backend)
+    if args.command == 'incremental':
+        return run_stage('incremental', input_filename=args.input, chunksize=args.chunksize, n_jobs=args.jobs,
+                         cache_path=args.cache, output_format=args.format, refit_fraction=args.refit_fraction,
+                         sentiment_backend=args.sentiment_backend)
+    if args.command == 'advanced-sentiment':
+        return run_stage('advanced-sentiment', sample_size=args.sample_size, batch_size=args.batch_size,
+                         accumulation_steps=args.accumulation_steps, bf16=args.bf16, resume=args.resume,
+                         n_jobs=args.jobs)
+    if args.command == 'impact':
+        return run_stage('impact', n_jobs=args.jobs)
+    if args.command == 'sentiment':
+        return run_stage('sentiment', n_jobs=args.jobs, lexicon_path=args.lexicon,
+                         classifier=args.classifier, sentiment_backend=args.sentiment_backend)
+    return run_stage(args.command)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+feature_store.py
+
+This module implements a shared, memory-mapped store of the numeric review columns used by
+most stages (Score, helpfulness_ratio, sentiment_score, text_length, word_count and Time).
+The processor writes each column once as a flat binary array, all aligned and sorted by
+review Id. Readers map the files instead of parsing the processed reviews again, and worker
+processes attach to the same files by path, so the pages are shared between processes
+rather than copied into each worker.
+
+Dependencies:
+- numpy
+- pandas
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from artifact_registry import get_registry
+
+# Column -> on-disk dtype; Id is the sort key of the store
+FEATURE_COLUMNS = {
+    'Id': 'int64',
+    'Score': 'int8',
+    'helpfulness_ratio': 'float32',
+    'sentiment_score': 'float32',
+    'text_length': 'int32',
+    'word_count': 'int32',
+    'Time': 'datetime64[s]'
+}
+
+def _column_path(base, column):
+    return f'{base}.{column}.bin'
+
+class FeatureStoreWriter:
+    """Append review frames to the store files chunk by chunk."""
+
+    def __init__(self, timestamp, directory='processed_data'):
+        self.base = f'{directory}/feature_store_{timestamp}'
+        self.files = {column: open(_column_path(self.base, column), 'wb') for column in FEATURE_COLUMNS}
+        self.rows = 0
+        self.is_sorted = True
+        self.last_id = None
+
+    def write(self, chunk):
+        if not len(chunk):
+            return
+        ids = chunk['Id'].to_numpy(dtype=np.int64)
+        if (self.last_id is not None and ids[0] < self.last_id) or (np.diff(ids) < 0).any():
+            self.is_sorted = False
+        self.last_id = ids[-1]
+        for column, dtype in FEATURE_COLUMNS.items():
+            values = chunk[column]
+            if column == 'Time':
+                values = pd.to_datetime(values)
+            self.files[column].write(values.to_numpy(dtype=dtype).tobytes())
+        self.rows += len(chunk)
+
+    def close(self):
+        """Finish the files, sorting them by Id if needed, and return the descriptor path."""
+        for f in self.files.values():
+            f.close()
+        if not self.is_sorted:
+            _sort_by_id(self.base)
+
+        descriptor = {
+            'columns': {column: {'path': _column_path(self.base, column), 'dtype': dtype}
+                        for column, dtype in FEATURE_COLUMNS.items()},
+            'rows': self.rows
+        }
+        with open(f'{self.base}.json', 'w') as f:
+            json.dump(descriptor, f, indent=2)
+        return f'{self.base}.json'
+
+def build_feature_store(chunks, timestamp, directory='processed_data'):
+    """
+    Write the feature columns of review frames to the store files.
+
+    Args:
+        chunks: Iterable of DataFrames holding at least FEATURE_COLUMNS
+        timestamp: Run timestamp used in the file names
+        directory: Output directory
+
+    Returns:
+        Path of the store descriptor (JSON) for FeatureStore.open
+    """
+    writer = FeatureStoreWriter(timestamp, directory)
+    for chunk in chunks:
+        writer.write(chunk)
+    return writer.close()
+
+def _sort_by_id(base):
+    """Reorder every column file by Id, one column in memory at a time."""
+    order = np.argsort(np.fromfile(_column_path(base, 'Id'), dtype=np.int64), kind='stable')
+    for column, dtype in FEATURE_COLUMNS.items():
+        path = _column_path(base, column)
+        values = np.fromfile(path, dtype=dtype)[order]
+        values.tofile(path)
+
+class FeatureStore:
+    """Read-only, Id-indexed view over the memory-mapped feature columns."""
+
+    def __init__(self, path, arrays):
+        self.path = path
+        self.arrays = arrays
+        self.ids = arrays['Id']
+
+    @classmethod
+    def open(cls, path):
+        """Map every column of the store described by `path` (no data is read up front)."""
+        with open(path) as f:
+            descriptor = json.load(f)
+        arrays = {}
+        for column, spec in descriptor['columns'].items():
+            if descriptor['rows']:
+                arrays[column] = np.memmap(spec['path'], dtype=spec['dtype'], mode='r')
+            else:
+                arrays[column] = np.zeros(0, dtype=spec['dtype'])
+        return cls(path, arrays)
+
+    @property
+    def columns(self):
+        return list(self.arrays)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, column):
+        return self.arrays[column]
+
+    def positions(self, ids):
+        """
+        Row positions of review Ids.
+
+        Raises:
+            KeyError: If any Id is not in the store
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, ids)
+        found = pos < len(self.ids)
+        found[found] = self.ids[pos[found]] == ids[found]
+        if not found.all():
+            raise KeyError(f"{int((~found).sum())} Ids are not in the feature store, e.g. {ids[~found][0]}")
+        return pos
+
+    def take(self, column, ids):
+        """Values of `column` for the given review Ids, in that order."""
+        return self.arrays[column][self.positions(ids)]
+
+    def frame(self, columns=None, rows=None):
+        """
+        DataFrame of selected columns indexed by Id.
+
+        Args:
+            columns: Columns to include (default all but Id)
+            rows: Optional slice or index array of row positions
+        """
+        columns = [c for c in self.columns if c != 'Id'] if columns is None else list(columns)
+        rows = slice(None) if rows is None else rows
+        return pd.DataFrame({column: self.arrays[column][rows] for column in columns},
+                            index=pd.Index(self.ids[rows], name='Id'))
+
+_attached = {}
+
+def attach_feature_store(path):
+    """
+    Open a store once per process and reuse it.
+
+    Pass the descriptor path (not the arrays) to pool workers and call this in the
+    worker: every process maps the same files, so the OS shares their pages.
+    """
+    store = _attached.get(path)
+    if store is None:
+        store = _attached[path] = FeatureStore.open(path)
+    return store
+
+def register_feature_store(path, directory='processed_data'):
+    """Register a built store with the artifact registry and return it."""
+    store = attach_feature_store(path)
+    get_registry().register(f'{directory}/feature_store', path, 'process', rows=len(store),
+                            inputs=[f'{directory}/processed_reviews'], handle=store)
+    return store
+
+def load_feature_store(directory='processed_data'):
+    """
+    The current feature store.
+
+    Raises:
+        FileNotFoundError: If the processor has not built a store yet
+    """
+    try:
+        return get_registry().load(f'{directory}/feature_store', attach_feature_store, ('json',))
+    except FileNotFoundError:
+        raise FileNotFoundError("Feature store not found. Run amazon_review_processor.py first.")
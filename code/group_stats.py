@@ -0,0 +1,201 @@
+"""
+group_stats.py
+
+This module implements streaming, mergeable per-group statistics over the processed
+reviews. For every group (e.g. product or month) and measure an accumulator holds the
+count, mean and sum of squared deviations (M2, as in Welford's algorithm). Accumulators
+of different chunks or processes combine exactly with the pairwise update of Chan et al.:
+
+    n = n_a + n_b,  delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n,  M2 = M2_a + M2_b + delta^2 * n_a * n_b / n
+
+so the result does not depend on how the data was split, and, unlike a running sum of
+squares, the variance does not lose precision when the mean is large relative to the
+spread. The processed reviews are read in chunks of a few columns; chunks are summarized
+in worker processes and merged as they arrive, so memory grows with the number of
+groups, not the number of reviews, and the full corpus is used instead of a sample.
+
+Dependencies:
+- numpy
+- pandas
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from review_store import iter_reviews, latest_processed_reviews
+from rollup_cube import _month_ordinals
+from sentiment_scoring import resolve_n_jobs
+
+# Review columns summarized by default
+MEASURES = ('sentiment_score', 'helpfulness_ratio', 'Score')
+
+# Group key -> review column it is derived from
+GROUPINGS = {'ProductId': 'ProductId', 'month': 'Time', 'Score': 'Score'}
+
+STATISTICS = ('count', 'mean', 'var', 'std')
+
+def _group_keys(chunk, grouping):
+    if grouping == 'month':
+        return _month_ordinals(chunk['Time'])
+    if grouping == 'ProductId':
+        return chunk['ProductId'].astype(str).to_numpy(dtype=object)
+    return chunk[GROUPINGS[grouping]].to_numpy()
+
+class GroupStats:
+    """Count, mean and M2 per group for a set of measures; mergeable across chunks."""
+
+    def __init__(self, grouping, count, mean, m2):
+        """
+        Args:
+            grouping: Group key name from GROUPINGS
+            count, mean, m2: DataFrames indexed by group with one column per measure
+        """
+        self.grouping = grouping
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_frame(cls, df, grouping, measures=MEASURES):
+        """Accumulators of one review frame (or chunk)."""
+        values = df[list(measures)].astype(np.float64)
+        grouped = values.groupby(_group_keys(df, grouping), sort=False)
+        count = grouped.count().astype(np.float64)
+        mean = grouped.mean()
+        # Population variance times count is M2; groups without values get 0
+        m2 = (grouped.var(ddof=0) * count).fillna(0.0)
+        return cls(grouping, count, mean.fillna(0.0), m2)
+
+    def __len__(self):
+        return len(self.count)
+
+    def merge(self, other):
+        """Combine with the accumulators of other reviews (exact for disjoint data); returns a new GroupStats."""
+        if other.grouping != self.grouping:
+            raise ValueError(f"Cannot merge stats grouped by {self.grouping} and {other.grouping}")
+        index = self.count.index.union(other.count.index)
+        n_a = self.count.reindex(index, fill_value=0.0)
+        n_b = other.count.reindex(index, fill_value=0.0)
+        mean_a = self.mean.reindex(index, fill_value=0.0)
+        mean_b = other.mean.reindex(index, fill_value=0.0)
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share_b = (n_b / n).fillna(0.0)
+            mean = mean_a + delta * share_b
+            m2 = (self.m2.reindex(index, fill_value=0.0) + other.m2.reindex(index, fill_value=0.0)
+                  + (delta * delta * n_a * share_b).fillna(0.0))
+        return GroupStats(self.grouping, n, mean, m2)
+
+    def aggregate(self, by, spec):
+        """
+        Statistics per group, shaped like DataFrame.groupby().agg() and RollupCube.aggregate.
+
+        Args:
+            by: The grouping these accumulators were built for
+            spec: {measure: [statistics]} with statistics from STATISTICS (ddof=1 for var and std)
+
+        Returns:
+            DataFrame indexed by group (months as a monthly PeriodIndex) with
+            (measure, statistic) columns
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        if by != [self.grouping]:
+            raise ValueError(f"These statistics are grouped by {self.grouping}, not {by}")
+        order = np.argsort(self.count.index.to_numpy(), kind='stable')
+        result = {}
+        for measure, statistics in spec.items():
+            count = self.count[measure].to_numpy()[order]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                var = np.where(count > 1, self.m2[measure].to_numpy()[order] / (count - 1), np.nan)
+            values = {
+                'count': count.astype(np.int64),
+                'mean': np.where(count > 0, self.mean[measure].to_numpy()[order], np.nan),
+                'var': var,
+                'std': np.sqrt(var)
+            }
+            for statistic in statistics:
+                if statistic not in values:
+                    raise ValueError(f"Unknown statistic '{statistic}', expected one of {STATISTICS}")
+                result[(measure, statistic)] = values[statistic]
+
+        keys = self.count.index.to_numpy()[order]
+        if self.grouping == 'month':
+            index = pd.PeriodIndex.from_ordinals(keys.astype(np.int64), freq='M', name='month')
+        else:
+            index = pd.Index(keys, name=self.grouping)
+        frame = pd.DataFrame(result, index=index)
+        frame.columns = pd.MultiIndex.from_tuples(frame.columns)
+        return frame
+
+def _chunk_stats(chunk, groupings, measures):
+    """Row count and accumulators of one chunk per grouping; top-level so it can run in workers."""
+    return len(chunk), {grouping: GroupStats.from_frame(chunk, grouping, measures) for grouping in groupings}
+
+def stream_group_stats(groupings=('ProductId', 'month'), measures=MEASURES, path=None, chunksize=100000,
+                       n_jobs=1):
+    """
+    Per-group statistics of the full processed reviews in one streaming pass.
+
+    Args:
+        groupings: Group keys from GROUPINGS, all computed in the same pass
+        measures: Review columns to summarize
+        path: Processed reviews file (default the current one)
+        chunksize: Rows read per chunk
+        n_jobs: Worker processes summarizing chunks (-1 for all cores)
+
+    Returns:
+        Dict of grouping -> GroupStats
+    """
+    from hashed_features import _ordered_map
+
+    unknown = set(groupings) - set(GROUPINGS)
+    if unknown:
+        raise ValueError(f"Unknown groupings {sorted(unknown)}, expected some of {list(GROUPINGS)}")
+    path = path or latest_processed_reviews()
+    columns = list(dict.fromkeys([GROUPINGS[grouping] for grouping in groupings] + list(measures)))
+
+    n_workers = resolve_n_jobs(n_jobs)
+    executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+    merged, rows = {}, 0
+    try:
+        chunks = iter_reviews(path, columns, chunksize)
+        for chunk_rows, partial in _ordered_map(executor, _chunk_stats, chunks, list(groupings), list(measures),
+                                                max_pending=2 * n_workers):
+            for grouping, stats in partial.items():
+                merged[grouping] = merged[grouping].merge(stats) if grouping in merged else stats
+            rows += chunk_rows
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(f"Group statistics over {rows} reviews: " +
+          ", ".join(f"{len(stats)} {grouping} groups" for grouping, stats in merged.items()))
+    return merged
+
+def check_group_stats(df, groupings=('ProductId', 'month'), measures=MEASURES, n_splits=7):
+    """
+    Compare merged chunk statistics with direct groupbys over a review frame.
+
+    Returns:
+        Largest absolute difference of count/mean/std over the groupings
+    """
+    spec = {measure: ['count', 'mean', 'std'] for measure in measures}
+    worst = 0.0
+    for grouping in groupings:
+        bounds = np.linspace(0, len(df), n_splits + 1).astype(int)
+        parts = [GroupStats.from_frame(df.iloc[start:stop], grouping, measures)
+                 for start, stop in zip(bounds[:-1], bounds[1:])]
+        merged = parts[0]
+        for part in parts[1:]:
+            merged = merged.merge(part)
+        key = (pd.to_datetime(df['Time']).dt.to_period('M') if grouping == 'month'
+               else df[GROUPINGS[grouping]].astype(str) if grouping == 'ProductId' else df[GROUPINGS[grouping]])
+        expected = df[list(measures)].astype(np.float64).groupby(key.rename(grouping)).agg(spec)
+        actual = merged.aggregate(grouping, spec).reindex(expected.index)
+        worst = max(worst, float(np.nanmax(np.abs(actual.to_numpy(dtype=np.float64)
+                                                  - expected.to_numpy(dtype=np.float64)))))
+    return worst
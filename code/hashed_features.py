@@ -0,0 +1,186 @@
+"""
+hashed_features.py
+
+This module implements out-of-core TF-IDF features for topic modeling. Documents are hashed
+into a fixed feature space with a HashingVectorizer, so no vocabulary has to be held in
+memory. A first pass over the chunks accumulates document frequencies and corpus term
+counts, and a second pass builds the CSR matrix chunk by chunk. Only the `max_features`
+most frequent hashed columns are kept, with sklearn's smoothed IDF and l2 normalization.
+Both passes can run chunks in parallel. A reverse-lookup table maps the kept columns
+back to the terms seen in them.
+
+Dependencies:
+- numpy
+- pandas
+- scipy
+- scikit-learn
+"""
+
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.utils import murmurhash3_32
+
+from sentiment_scoring import resolve_n_jobs
+
+def make_hashing_vectorizer(n_features=2 ** 20):
+    """Hashing counterpart of the processor's TF-IDF vectorizer settings (raw counts)."""
+    return HashingVectorizer(n_features=n_features, stop_words='english',
+                             alternate_sign=False, norm=None)
+
+def hashed_column(term, n_features):
+    """Column a single term hashes to, matching HashingVectorizer without alternate signs."""
+    return abs(murmurhash3_32(term, seed=0, positive=False)) % n_features
+
+def _count_chunk(texts, n_features):
+    """Per-column document frequency and total term count for one chunk."""
+    counts = make_hashing_vectorizer(n_features).transform(texts)
+    df = np.bincount(counts.indices, minlength=n_features)
+    tf = np.asarray(counts.sum(axis=0)).ravel()
+    return len(texts), df, tf
+
+def _transform_chunk(texts, n_features, columns, idf):
+    """TF-IDF rows for one chunk, restricted to the selected columns."""
+    counts = make_hashing_vectorizer(n_features).transform(texts).tocsc()[:, columns]
+    features = counts.tocsr() @ sparse.diags(idf)
+    return normalize(features, norm='l2', copy=False).tocsr()
+
+def _ordered_map(executor, function, chunks, *args, max_pending=4):
+    """
+    Ordered map over a chunk iterator with a bounded number of chunks in flight, so
+    memory stays flat regardless of corpus size. Runs inline when executor is None.
+    """
+    if executor is None:
+        for chunk in chunks:
+            yield function(chunk, *args)
+        return
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(function, chunk, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+class HashedTfidf:
+    """Two-pass, out-of-core TF-IDF over hashed features."""
+
+    def __init__(self, max_features=1000, n_features=2 ** 20, n_jobs=1, lookup_docs=20000):
+        """
+        Args:
+            max_features: Number of hashed columns kept (most frequent in the corpus)
+            n_features: Size of the hashed feature space
+            n_jobs: Worker processes for both passes (-1 for all cores)
+            lookup_docs: Documents sampled to build the reverse term lookup
+        """
+        self.max_features = max_features
+        self.n_features = n_features
+        self.n_jobs = n_jobs
+        self.lookup_docs = lookup_docs
+        self.columns = None
+        self.idf = None
+        self.n_docs = 0
+
+    def fit(self, chunks):
+        """
+        Accumulate document frequencies from an iterable of text chunks.
+
+        The IDF is built incrementally, so `chunks` may be a generator.
+        """
+        doc_freq = np.zeros(self.n_features, dtype=np.int64)
+        term_freq = np.zeros(self.n_features, dtype=np.float64)
+        self.n_docs = 0
+
+        with self._executor() as executor:
+            for n_docs, df, tf in _ordered_map(executor, _count_chunk, chunks, self.n_features,
+                                               max_pending=self._max_pending()):
+                self.n_docs += n_docs
+                doc_freq += df
+                term_freq += tf
+
+        # Same selection and smoothing as TfidfVectorizer(max_features=...)
+        candidates = np.flatnonzero(term_freq)
+        top = candidates[np.argsort(-term_freq[candidates], kind='stable')[:self.max_features]]
+        self.columns = np.sort(top)
+        self.idf = np.log((1 + self.n_docs) / (1 + doc_freq[self.columns])) + 1
+        return self
+
+    def transform(self, chunks):
+        """Build the CSR feature matrix chunk by chunk from an iterable of text chunks."""
+        with self._executor() as executor:
+            blocks = list(_ordered_map(executor, _transform_chunk, chunks, self.n_features,
+                                       self.columns, self.idf, max_pending=self._max_pending()))
+        if not blocks:
+            return sparse.csr_matrix((0, len(self.columns)))
+        return sparse.vstack(blocks, format='csr')
+
+    def term_lookup(self, texts):
+        """
+        Reverse lookup for the kept columns from a sample of documents.
+
+        Returns:
+            DataFrame with column, hash_index, term and count, most frequent term first
+            per column; colliding terms are all listed
+        """
+        analyzer = make_hashing_vectorizer(self.n_features).build_analyzer()
+        term_counts = Counter()
+        for i, text in enumerate(texts):
+            if i >= self.lookup_docs:
+                break
+            term_counts.update(analyzer(text))
+
+        position = {column: i for i, column in enumerate(self.columns)}
+        rows = []
+        for term, count in term_counts.items():
+            index = hashed_column(term, self.n_features)
+            if index in position:
+                rows.append((position[index], index, term, count))
+        lookup = pd.DataFrame(rows, columns=['column', 'hash_index', 'term', 'count'])
+        return lookup.sort_values(['column', 'count'], ascending=[True, False]).reset_index(drop=True)
+
+    def feature_names(self, lookup):
+        """Most frequent term per kept column, or 'hash_<index>' if none was sampled."""
+        best = lookup.drop_duplicates('column').set_index('column')['term']
+        return np.array([best.get(i, f'hash_{column}') for i, column in enumerate(self.columns)],
+                        dtype=object)
+
+    def _executor(self):
+        n_workers = resolve_n_jobs(self.n_jobs)
+        return ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else _NoExecutor()
+
+    def _max_pending(self):
+        return 2 * resolve_n_jobs(self.n_jobs)
+
+class _NoExecutor:
+    """Context manager standing in for a pool when running serially."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+def hashed_topic_features(make_chunks, max_features=1000, n_features=2 ** 20, n_jobs=1):
+    """
+    Compute hashed TF-IDF features from a re-iterable source of text chunks.
+
+    Args:
+        make_chunks: Callable returning a fresh iterator of text chunks (lists or
+            Series of clean_text); called once per pass
+        max_features: Number of hashed columns kept
+        n_features: Size of the hashed feature space
+        n_jobs: Worker processes (-1 for all cores)
+
+    Returns:
+        (text_features, feature_names, lookup) where lookup is the reverse-lookup table
+    """
+    model = HashedTfidf(max_features=max_features, n_features=n_features, n_jobs=n_jobs)
+    model.fit(make_chunks())
+    text_features = model.transform(make_chunks())
+    lookup = model.term_lookup(text for chunk in make_chunks() for text in chunk)
+    return text_features, model.feature_names(lookup), lookup
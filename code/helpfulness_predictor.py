@@ -15,35 +15,56 @@ Dependencies:
 
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import mean_squared_error, r2_score
-import lightgbm as lgb
-import shap
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 from datetime import datetime
-import glob
+from review_store import artifact_name, load_compact_reviews
+from artifact_registry import get_registry
+from feature_store import load_feature_store
+from profiling import profile_stage, profile_step
+
+# scikit-learn, lightgbm, shap and the plotting libraries are imported where they are
+# used, so importing this module (e.g. for the CLI) stays fast.
 
 class HelpfulnessPredictor:
     def __init__(self):
         """Initialize the helpfulness predictor."""
         self.model = None
-        self.scaler = StandardScaler()
+        self._scaler = None
         self.feature_names = None
     
+    @property
+    def scaler(self):
+        """Feature scaler, created on first use (imports scikit-learn)."""
+        if self._scaler is None:
+            from sklearn.preprocessing import StandardScaler
+            self._scaler = StandardScaler()
+        return self._scaler
+
+    @scaler.setter
+    def scaler(self, scaler):
+        self._scaler = scaler
+
+    # Numeric columns used for features and target, plus ProductId for category patterns
+    columns = ['text_length', 'word_count', 'Score', 'sentiment_score', 'Time',
+               'helpfulness_ratio', 'ProductId']
+
     def load_processed_data(self):
-        """Load the most recent processed review data."""
-        processed_files = glob.glob('processed_data/processed_reviews_*.csv')
-        
-        if not processed_files:
-            raise FileNotFoundError("Processed data files not found.")
-            
-        latest_file = max(processed_files)
-        df = pd.read_csv(latest_file)
-        print(f"Loaded processed data from: {latest_file}")
-        
+        """
+        Load the columns needed for helpfulness analysis from the most recent processed data, in compact dtypes.
+
+        The numeric columns are taken from the memory-mapped feature store, so only Id and
+        ProductId are parsed from the processed reviews; without a store every column is
+        read from the reviews.
+        """
+        try:
+            store = load_feature_store()
+        except FileNotFoundError:
+            return load_compact_reviews(columns=self.columns)
+        df = load_compact_reviews(columns=['Id', 'ProductId'])
+        positions = store.positions(df['Id'])
+        for column in self.columns:
+            if column != 'ProductId':
+                df[column] = store[column][positions]
         return df
 
     def create_features(self, df):
@@ -95,6 +116,10 @@ class HelpfulnessPredictor:
         Returns:
             Trained model and evaluation metrics
         """
+        import lightgbm as lgb
+        from sklearn.metrics import mean_squared_error, r2_score
+        from sklearn.model_selection import train_test_split
+        
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, random_state=42
@@ -136,6 +161,8 @@ class HelpfulnessPredictor:
         Returns:
             DataFrame with feature importance analysis
         """
+        import shap
+        
         # Calculate SHAP values
         explainer = shap.TreeExplainer(self.model)
         shap_values = explainer.shap_values(X)
@@ -192,28 +219,41 @@ class HelpfulnessPredictor:
             
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
+        registry = get_registry()
+        
         # Save feature importance
         if 'feature_importance' in results_dict:
             results_dict['feature_importance'].to_csv(
                 f'{directory}/feature_importance_{timestamp}.csv'
             )
+            registry.register(f'{directory}/feature_importance',
+                              f'{directory}/feature_importance_{timestamp}.csv', 'helpfulness',
+                              data=results_dict['feature_importance'], inputs=[artifact_name()])
         
         # Save category patterns
         if 'category_patterns' in results_dict:
             results_dict['category_patterns'].to_csv(
                 f'{directory}/category_patterns_{timestamp}.csv'
             )
+            registry.register(f'{directory}/category_patterns',
+                              f'{directory}/category_patterns_{timestamp}.csv', 'helpfulness',
+                              data=results_dict['category_patterns'], inputs=[artifact_name()])
         
         # Save model performance metrics
         if 'metrics' in results_dict:
             pd.DataFrame([results_dict['metrics']]).to_csv(
                 f'{directory}/model_metrics_{timestamp}.csv'
             )
+            registry.register(f'{directory}/model_metrics', f'{directory}/model_metrics_{timestamp}.csv',
+                              'helpfulness', inputs=[artifact_name()])
         
         print(f"Results saved in {directory} directory with timestamp {timestamp}")
 
     def create_visualizations(self, results_dict, directory='helpfulness_analysis'):
         """Create visualizations of the analysis results."""
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         # Feature importance plot
@@ -252,25 +292,31 @@ def main():
         
         # Load data
         print("Loading data...")
-        df = predictor.load_processed_data()
+        with profile_step('load') as step:
+            df = predictor.load_processed_data()
+            step['rows'] = len(df)
         
         # Create features
         print("Creating features...")
-        X = predictor.create_features(df)
-        y = predictor.prepare_target(df)
+        with profile_step('features', rows=len(df)):
+            X = predictor.create_features(df)
+            y = predictor.prepare_target(df)
         
         # Train model
         print("Training model...")
-        metrics = predictor.train_model(X, y)
+        with profile_step('train', rows=len(X)):
+            metrics = predictor.train_model(X, y)
         print(f"Model R² score: {metrics['r2']:.4f}")
         
         # Analyze feature importance
         print("Analyzing feature importance...")
-        feature_importance = predictor.analyze_feature_importance(X)
+        with profile_step('shap', rows=len(X)):
+            feature_importance = predictor.analyze_feature_importance(X)
         
         # Analyze category patterns
         print("Analyzing category patterns...")
-        category_patterns = predictor.analyze_category_patterns(df, X, y)
+        with profile_step('category_patterns', rows=len(df)):
+            category_patterns = predictor.analyze_category_patterns(df, X, y)
         
         # Save results
         results = {
@@ -278,10 +324,12 @@ def main():
             'feature_importance': feature_importance,
             'category_patterns': category_patterns
         }
-        predictor.save_results(results)
+        with profile_step('save'):
+            predictor.save_results(results)
         
         # Create visualizations
-        predictor.create_visualizations(results)
+        with profile_step('plotting'):
+            predictor.create_visualizations(results)
         
         print("Helpfulness analysis completed successfully!")
         
@@ -290,4 +338,5 @@ def main():
         raise e
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile_stage('helpfulness'):
+        main()
\ No newline at end of file
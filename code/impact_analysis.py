@@ -7,15 +7,16 @@ sentiment, topics, and helpfulness.
 
 import pandas as pd
 import numpy as np
-from scipy import stats
-import seaborn as sns
-import matplotlib.pyplot as plt
-import glob
+from review_store import artifact_name, load_compact_reviews
+from artifact_registry import get_registry
+from profiling import profile_stage, profile_step
+from rollup_cube import load_rollup_cube
+from group_stats import stream_group_stats
 from datetime import datetime
 import os
-from scipy import stats
-import seaborn as sns
-import matplotlib.pyplot as plt
+
+# The plotting libraries are imported where they are used, so importing this module
+# (e.g. for the CLI) stays fast.
 
 class ImpactAnalyzer:
     def __init__(self, save_dir='impact_analysis'):
@@ -24,28 +25,26 @@ class ImpactAnalyzer:
             os.makedirs(save_dir)
 
     def load_all_results(self):
-        """Load results from all previous analyses."""
+        """Load results from all previous analyses through the artifact registry."""
+        registry = get_registry()
         results = {}
         
-        # Load topic distributions
-        topic_files = glob.glob('topic_models/topic_distributions_*.csv')
-        if topic_files:
-            results['topic_distributions'] = pd.read_csv(max(topic_files))
-            
-        # Load sentiment results
-        sentiment_files = glob.glob('advanced_sentiment/temporal_trends_*.csv')
-        if sentiment_files:
-            results['sentiment_trends'] = pd.read_csv(max(sentiment_files))
-            
-        # Load helpfulness results
-        helpfulness_files = glob.glob('helpfulness_analysis/feature_importance_*.csv')
-        if helpfulness_files:
-            results['feature_importance'] = pd.read_csv(max(helpfulness_files))
+        artifacts = {
+            'topic_distributions': 'topic_models/topic_distributions',
+            'sentiment_trends': 'advanced_sentiment/temporal_trends',
+            'feature_importance': 'helpfulness_analysis/feature_importance'
+        }
+        for key, name in artifacts.items():
+            if registry.find(name) is not None:
+                results[key] = registry.load(name, pd.read_csv)
             
         return results
 
     def analyze_topic_sentiment_relationships(self, topic_distributions, sentiment_scores):
         """Analyze relationships between topics and sentiment."""
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        
         correlations = pd.DataFrame(index=['correlation'])
         for topic in topic_distributions.columns:
             correlations[topic] = np.corrcoef(topic_distributions[topic], 
@@ -59,8 +58,13 @@ class ImpactAnalyzer:
         plt.savefig(f"{self.save_dir}/topic_sentiment_correlations.png")
         return correlations
 
-    def calculate_business_impact(self, df):
-        """Calculate business impact metrics."""
+    def calculate_business_impact(self, df, cube=None, product_stats=None):
+        """
+        Calculate business impact metrics.
+        
+        Temporal patterns come from `cube` and category performance from
+        `product_stats` when given (see the analyze_* methods).
+        """
         impact_metrics = {
             'review_characteristics': {
                 'optimal_length': {
@@ -72,8 +76,8 @@ class ImpactAnalyzer:
                     'rating_increase': self.measure_sentiment_impact(df)
                 }
             },
-            'category_performance': self.analyze_category_performance(df),
-            'temporal_patterns': self.analyze_temporal_patterns(df)
+            'category_performance': self.analyze_category_performance(df, product_stats),
+            'temporal_patterns': self.analyze_temporal_patterns(df, cube)
         }
         return impact_metrics
 
@@ -103,22 +107,32 @@ class ImpactAnalyzer:
             'effect_size': (optimal_mean - other_mean) / pooled_std if pooled_std != 0 else 0
         }
     
-    def analyze_category_performance(self, df):
-        """Analyze performance patterns by category."""
-        return df.groupby('ProductId').agg({
+    def analyze_category_performance(self, df, stats=None):
+        """Analyze performance patterns by category, from ProductId GroupStats if given."""
+        spec = {
             'helpfulness_ratio': ['mean', 'std'],
             'sentiment_score': ['mean', 'std'],
             'Score': ['mean', 'count']
-        }).round(3)
+        }
+        if stats is not None:
+            return stats.aggregate('ProductId', spec).round(3)
+        return df.groupby('ProductId', observed=True).agg(spec).round(3)
 
-    def analyze_temporal_patterns(self, df):
-        """Analyze temporal patterns in review impact."""
-        df['Time'] = pd.to_datetime(df['Time'])
-        return df.groupby(df['Time'].dt.to_period('M')).agg({
+    def analyze_temporal_patterns(self, df, cube=None):
+        """
+        Analyze temporal patterns in review impact.
+        
+        `cube` (a RollupCube, or GroupStats grouped by month) replaces grouping `df`.
+        """
+        spec = {
             'helpfulness_ratio': ['mean', 'std'],
             'sentiment_score': ['mean', 'std'],
             'Score': ['mean', 'count']
-        }).round(3)
+        }
+        if cube is not None:
+            return cube.aggregate('month', spec).rename_axis('Time').round(3)
+        df['Time'] = pd.to_datetime(df['Time'])
+        return df.groupby(df['Time'].dt.to_period('M')).agg(spec).round(3)
 
     def generate_recommendations(self, impact_metrics):
         """Generate actionable business recommendations."""
@@ -154,33 +168,52 @@ class ImpactAnalyzer:
         """Save analysis results."""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
+        registry = get_registry()
+        inputs = [artifact_name(), 'topic_models/topic_distributions',
+                  'advanced_sentiment/temporal_trends', 'helpfulness_analysis/feature_importance']
+        
         for name, data in results_dict.items():
             if isinstance(data, pd.DataFrame):
                 data.to_csv(f'{self.save_dir}/{name}_{timestamp}.csv')
             else:
                 pd.DataFrame([data]).to_csv(f'{self.save_dir}/{name}_{timestamp}.csv')
+            registry.register(f'{self.save_dir}/{name}', f'{self.save_dir}/{name}_{timestamp}.csv',
+                              'impact', inputs=inputs)
 
-def main():
-    """Run complete impact analysis."""
+def main(n_jobs=-1):
+    """
+    Run complete impact analysis.
+    
+    Product and monthly statistics are streamed over the processed reviews with
+    `n_jobs` processes (-1 for all cores), or read from the rollup cube.
+    """
     try:
         analyzer = ImpactAnalyzer()
         
         # Load processed data with correct filename
         print("Loading analysis results...")
-        latest_processed = max(glob.glob('processed_data/processed_reviews_*.csv'))
-        df = pd.read_csv(latest_processed)
-        results = analyzer.load_all_results()
+        with profile_step('load') as step:
+            df = load_compact_reviews(columns=['ProductId', 'Score', 'Time', 'helpfulness_ratio',
+                                               'sentiment_score', 'text_length'])
+            results = analyzer.load_all_results()
+            step['rows'] = len(df)
         
         # Continue with remaining analysis...
         print("Analyzing topic-sentiment relationships...")
-        topic_sentiment = analyzer.analyze_topic_sentiment_relationships(
-            results['topic_distributions'],
-            df['sentiment_score']
-        )
+        with profile_step('topic_sentiment', rows=len(df)):
+            topic_sentiment = analyzer.analyze_topic_sentiment_relationships(
+                results['topic_distributions'],
+                df['sentiment_score']
+            )
         
         # Calculate business impact
         print("Calculating business impact...")
-        impact_metrics = analyzer.calculate_business_impact(df)
+        with profile_step('business_impact', rows=len(df)):
+            cube = load_rollup_cube()
+            group_stats = stream_group_stats(['ProductId'] if cube is not None else ['ProductId', 'month'],
+                                             n_jobs=n_jobs)
+            impact_metrics = analyzer.calculate_business_impact(
+                df, cube if cube is not None else group_stats['month'], group_stats['ProductId'])
         
         # Generate recommendations
         print("Generating recommendations...")
@@ -192,7 +225,8 @@ def main():
             'impact_metrics': impact_metrics,
             'recommendations': recommendations
         }
-        analyzer.save_results(results_dict)
+        with profile_step('save'):
+            analyzer.save_results(results_dict)
         
         print("Impact analysis completed successfully!")
         
@@ -201,4 +235,5 @@ def main():
         raise e
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile_stage('impact'):
+        main()
\ No newline at end of file
@@ -0,0 +1,286 @@
+"""
+incremental_processing.py
+
+This module implements incremental processing of the Amazon reviews dataset. A manifest
+records the Id and a content hash of every processed review; each run hashes the input,
+processes only new or changed reviews and appends them to the processed store. TF-IDF
+features are extended with the existing vectorizer, and only refitted once the data that
+was not seen at fit time exceeds a configurable fraction of the corpus. The rollup cube
+of the previous snapshot is updated with the delta (changed reviews are taken out and
+re-added) instead of being rebuilt.
+
+Dependencies:
+- pandas
+- numpy
+- scipy
+- scikit-learn
+"""
+
+import os
+import pickle
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+
+from amazon_review_processor import (clean_reviews, create_text_features, iter_processed_column,
+                                     make_tfidf_vectorizer, perform_sentiment_analysis,
+                                     register_processed_data)
+from feature_store import FEATURE_COLUMNS, build_feature_store, register_feature_store
+from review_store import (PROCESSED_DIR, ParquetReviewWriter, delta_path, iter_reviews, parts_path, review_parts,
+                          reviews_path, store_format, write_parts)
+from rollup_cube import CUBE_COLUMNS, RollupCube, cube_path, save_rollup_cube
+from sentiment_cache import SentimentCache
+from sentiment_scoring import sentiment_pool
+
+# Incremental CSV stores always carry the time of day, so appended chunks agree on format
+INCREMENTAL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Parts a snapshot may grow to before the next run rewrites it as a single file
+MAX_PARTS = 16
+
+def manifest_path(directory=PROCESSED_DIR):
+    return f'{directory}/review_manifest.npz'
+
+def load_manifest(directory=PROCESSED_DIR):
+    """
+    Load the manifest of processed reviews, or None before the first incremental run.
+
+    Returns:
+        Dict with 'ids' and 'hashes' (in store row order), 'timestamp', 'store' and
+        'features' of the current snapshot, and 'unseen_rows' (reviews added or
+        changed since TF-IDF was last fitted)
+    """
+    path = manifest_path(directory)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {
+            'ids': data['ids'],
+            'hashes': data['hashes'],
+            'timestamp': str(data['timestamp']),
+            'store': str(data['store']),
+            'features': str(data['features']),
+            'unseen_rows': int(data['unseen_rows'])
+        }
+
+def save_manifest(manifest, directory=PROCESSED_DIR):
+    np.savez(manifest_path(directory), ids=manifest['ids'], hashes=manifest['hashes'],
+             timestamp=np.array(manifest['timestamp']), store=np.array(manifest['store']),
+             features=np.array(manifest['features']), unseen_rows=np.array(manifest['unseen_rows']))
+
+def hash_reviews(chunk):
+    """Content hash of every raw input column except Id, one uint64 per row."""
+    content = chunk.drop(columns=['Id'])
+    return pd.util.hash_pandas_object(content, index=False).to_numpy()
+
+def _lookup(sorted_ids, sorted_values, ids):
+    """Map ids to values from a sorted id array; returns (found mask, values)."""
+    if len(sorted_ids) == 0:
+        return np.zeros(len(ids), dtype=bool), np.zeros(len(ids), dtype=sorted_values.dtype)
+    pos = np.clip(np.searchsorted(sorted_ids, ids), 0, len(sorted_ids) - 1)
+    found = sorted_ids[pos] == ids
+    return found, sorted_values[pos]
+
+def find_delta(input_filename, manifest, chunksize=50000):
+    """
+    Hash the input and compare against the manifest.
+
+    Returns:
+        (delta, changed): dict of Id -> hash for new or changed reviews, and the
+        array of Ids whose content changed since they were processed
+    """
+    if manifest is not None:
+        order = np.argsort(manifest['ids'], kind='stable')
+        sorted_ids, sorted_hashes = manifest['ids'][order], manifest['hashes'][order]
+    else:
+        sorted_ids, sorted_hashes = np.array([], dtype=np.int64), np.array([], dtype=np.uint64)
+
+    delta, changed = {}, []
+    for chunk in pd.read_csv(input_filename, chunksize=chunksize):
+        ids = chunk['Id'].to_numpy(dtype=np.int64)
+        hashes = hash_reviews(chunk)
+        found, known_hashes = _lookup(sorted_ids, sorted_hashes, ids)
+        is_delta = ~found | (known_hashes != hashes)
+        delta.update(zip(ids[is_delta].tolist(), hashes[is_delta].tolist()))
+        changed.extend(ids[found & (known_hashes != hashes)].tolist())
+
+    return delta, np.array(changed, dtype=np.int64)
+
+class _StoreWriter:
+    """Append processed chunks to a new CSV or Parquet store snapshot."""
+
+    def __init__(self, path, row_group_size):
+        self.path = path
+        self.parquet = ParquetReviewWriter(path, row_group_size) if path.endswith('.parquet') else None
+        self.started = os.path.exists(path)
+
+    def write(self, df):
+        if self.parquet is not None:
+            self.parquet.write(df)
+        else:
+            df.to_csv(self.path, mode='a' if self.started else 'w', header=not self.started,
+                      index=False, date_format=INCREMENTAL_DATE_FORMAT)
+        self.started = True
+
+    def close(self):
+        if self.parquet is not None:
+            self.parquet.close()
+
+def incremental_processing_pipeline(input_filename='Reviews.csv', chunksize=50000, n_jobs=1,
+                                    cache_path=None, output_format='csv', refit_fraction=0.1,
+                                    directory=PROCESSED_DIR, sentiment_backend='textblob'):
+    """
+    Process only reviews that are new or changed since the last incremental run.
+
+    The new snapshot holds the previous store (minus changed reviews) followed by the
+    freshly processed delta. When no review changed and the format is unchanged, the
+    delta is written to its own file and the new snapshot is a part list naming the
+    previous parts plus that file, so no previous row is read or copied; once a
+    snapshot reaches MAX_PARTS parts, or reviews changed, previous rows are streamed
+    into a single new file without re-running any NLP. Previous snapshots and their
+    companion artifacts are kept either way (their files are shared with the new part
+    list), so a failed run leaves the current snapshot intact. Reviews missing from the
+    input are kept, i.e. the feed is treated as append/update only.
+
+    Args:
+        input_filename: Raw reviews CSV
+        chunksize: Rows per chunk when streaming input and store
+        n_jobs: Sentiment scoring processes (-1 for all cores)
+        cache_path: Optional SentimentCache path
+        output_format: 'csv' or 'parquet' for the processed store
+        refit_fraction: Refit TF-IDF once reviews added or changed since the last fit
+            exceed this fraction of the corpus; otherwise extend with transform()
+        directory: Processed data directory
+        sentiment_backend: 'textblob' or 'lexicon' (see perform_sentiment_analysis)
+
+    Returns:
+        Timestamp of the snapshot now current (unchanged if there was no delta)
+    """
+    print("Starting incremental data processing pipeline...")
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    manifest = load_manifest(directory)
+    delta, changed = find_delta(input_filename, manifest, chunksize)
+    print(f"Found {len(delta)} new or changed reviews ({len(changed)} changed)")
+
+    if not delta:
+        print("Processed data is up to date.")
+        return manifest['timestamp']
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    store_path = reviews_path(timestamp, output_format, directory)
+
+    # Update the previous snapshot's cube; without one it is rebuilt from the new store
+    cube = None
+    if manifest is not None and os.path.exists(cube_path(manifest['timestamp'], directory)):
+        cube = RollupCube.load(cube_path(manifest['timestamp'], directory))
+
+    # Carry previous rows over to the new snapshot
+    keep = np.ones(0, dtype=bool)
+    previous_parts = None
+    if manifest is not None:
+        keep = ~np.isin(manifest['ids'], changed)
+        if (len(changed) == 0 and store_format(manifest['store']) == output_format and
+                len(review_parts(manifest['store'])) < MAX_PARTS):
+            previous_parts = review_parts(manifest['store'])
+            store_path = parts_path(timestamp, directory)
+            writer = _StoreWriter(delta_path(timestamp, output_format, directory), chunksize)
+        else:
+            writer = _StoreWriter(store_path, chunksize)
+            for chunk in iter_reviews(manifest['store'], None, chunksize):
+                is_changed = chunk['Id'].isin(changed)
+                if cube is not None:
+                    cube.remove(chunk[is_changed])
+                chunk = chunk[~is_changed]
+                if len(chunk):
+                    writer.write(chunk)
+    else:
+        writer = _StoreWriter(store_path, chunksize)
+
+    # Process the delta, appending in input order
+    wanted = np.fromiter(delta.keys(), dtype=np.int64, count=len(delta))
+    delta_ids, delta_texts = [], []
+    executor = sentiment_pool(n_jobs)
+    cache = SentimentCache(cache_path) if cache_path else None
+    try:
+        for chunk in pd.read_csv(input_filename, chunksize=chunksize):
+            chunk = chunk[chunk['Id'].isin(wanted)]
+            if not len(chunk):
+                continue
+            chunk = clean_reviews(chunk.reset_index(drop=True))
+            chunk = perform_sentiment_analysis(chunk, n_jobs, executor, cache, sentiment_backend)
+            chunk = create_text_features(chunk)
+            writer.write(chunk)
+            if cube is not None:
+                cube.add(chunk)
+            delta_ids.extend(chunk['Id'].tolist())
+            delta_texts.extend(chunk['clean_text'].tolist())
+            print(f"Processed {len(delta_ids)} of {len(delta)} reviews...")
+    finally:
+        writer.close()
+        if executor is not None:
+            executor.shutdown()
+        if cache is not None:
+            print(f"Sentiment cache: {cache.stats()}")
+            cache.close()
+    if previous_parts is not None:
+        write_parts(store_path, previous_parts + ([writer.path] if writer.started else []))
+
+    delta_ids = np.array(delta_ids, dtype=np.int64)
+    delta_hashes = np.array([delta[i] for i in delta_ids.tolist()], dtype=np.uint64)
+    if manifest is not None:
+        ids = np.concatenate([manifest['ids'][keep], delta_ids])
+        hashes = np.concatenate([manifest['hashes'][keep], delta_hashes])
+    else:
+        ids, hashes = delta_ids, delta_hashes
+
+    # Extend TF-IDF features with the existing vectorizer unless a refit is due
+    vectorizer_path = f'{directory}/tfidf_vectorizer.pkl'
+    unseen_rows = (manifest['unseen_rows'] if manifest else 0) + len(delta_ids)
+    refit = (manifest is None or not os.path.exists(vectorizer_path) or
+             unseen_rows > refit_fraction * len(ids))
+
+    if refit:
+        print("Fitting TF-IDF features...")
+        tfidf = make_tfidf_vectorizer()
+        text_features = tfidf.fit_transform(iter_processed_column(store_path, 'clean_text', chunksize))
+        with open(vectorizer_path, 'wb') as f:
+            pickle.dump(tfidf, f)
+        unseen_rows = 0
+    else:
+        print("Extending TF-IDF features...")
+        with open(vectorizer_path, 'rb') as f:
+            tfidf = pickle.load(f)
+        previous = sparse.load_npz(manifest['features']).tocsr()
+        text_features = sparse.vstack([previous[keep], tfidf.transform(delta_texts)], format='csr')
+
+    sparse.save_npz(f'{directory}/text_features_{timestamp}.npz', text_features)
+    feature_names = tfidf.get_feature_names_out()
+    pd.Series(feature_names).to_csv(f'{directory}/feature_names_{timestamp}.csv', index=False)
+    register_processed_data(timestamp, output_format, text_features=text_features, path=store_path,
+                            feature_names=feature_names, rows=len(ids), directory=directory)
+    feature_store_path = build_feature_store(iter_reviews(store_path, list(FEATURE_COLUMNS), chunksize),
+                                             timestamp, directory)
+    register_feature_store(feature_store_path, directory)
+    if cube is None:
+        cube = RollupCube.from_chunks(iter_reviews(store_path, CUBE_COLUMNS, chunksize))
+    save_rollup_cube(cube, timestamp, directory)
+
+    save_manifest({
+        'ids': ids,
+        'hashes': hashes,
+        'timestamp': timestamp,
+        'store': store_path,
+        'features': f'{directory}/text_features_{timestamp}.npz',
+        'unseen_rows': unseen_rows
+    }, directory)
+
+    print(f"Data saved in '{directory}' directory with timestamp {timestamp}")
+    print("Processing complete!")
+    return timestamp
+
+if __name__ == "__main__":
+    incremental_processing_pipeline()
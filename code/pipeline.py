@@ -0,0 +1,319 @@
+"""
+pipeline.py
+
+This module implements an orchestrator for the full analysis pipeline. It knows the
+dependency graph between the stage scripts, skips stages whose code (the stage module
+and every project module it imports), configuration and input artifacts are unchanged
+since their last successful run, runs independent stages
+concurrently in separate processes and reports per-stage timings and the critical path.
+Every stage that runs is profiled (see profiling.py) under the orchestrator's run id.
+
+Dependencies:
+- artifact_registry (this project)
+"""
+
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from artifact_registry import REGISTRY_DIR, fingerprint, get_registry
+from profiling import profile_stage
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGE_CACHE_PATH = f'{REGISTRY_DIR}/stage_cache.json'
+
+class Stage:
+    """A pipeline stage: a module-level function plus its place in the graph."""
+
+    def __init__(self, name, target, deps=(), outputs=(), files=(), config=None):
+        """
+        Args:
+            name: Stage name
+            target: 'module:function' to call
+            deps: Names of stages that must run first
+            outputs: Artifact names the stage registers
+            files: External input files (e.g. the raw CSV) that feed the stage
+            config: Keyword arguments passed to the target
+        """
+        self.name = name
+        self.target = target
+        self.deps = list(deps)
+        self.outputs = list(outputs)
+        self.files = list(files)
+        self.config = dict(config or {})
+
+def default_stages(input_filename='Reviews.csv', process_config=None, cores=None):
+    """
+    The stage graph of this project.
+
+    Up to four stages run side by side once 'process' is done, and 'impact' overlaps
+    with 'visualize', so the stages that start worker processes get a share of `cores`
+    (default all) instead of every core each.
+    """
+    cores = cores or os.cpu_count() or 1
+    wide, narrow = max(1, cores // 4), max(1, cores // 2)
+    processed = ['processed_data/processed_reviews', 'processed_data/text_features',
+                 'processed_data/feature_names', 'processed_data/feature_store']
+    return [
+        Stage('process', 'amazon_review_processor:main_processing_pipeline',
+              outputs=processed, files=[input_filename],
+              config={'input_filename': input_filename, **(process_config or {})}),
+        Stage('sentiment', 'sentiment_analysis:main', deps=['process'],
+              outputs=['sentiment_analysis/aspect_sentiments', 'sentiment_analysis/time_trends',
+                       'sentiment_analysis/rating_trends'],
+              config={'n_jobs': wide}),
+        Stage('advanced_sentiment', 'advanced_sentiment:main', deps=['process'],
+              outputs=['advanced_sentiment/sentiment_model', 'advanced_sentiment/temporal_trends',
+                       'advanced_sentiment/category_patterns'],
+              config={'n_jobs': wide}),
+        Stage('topics', 'updated_topic_modeling:main', deps=['process'],
+              outputs=['topic_models/topic_distributions', 'topic_models/top_terms',
+                       'topic_models/coherence_scores']),
+        Stage('helpfulness', 'helpfulness_predictor:main', deps=['process'],
+              outputs=['helpfulness_analysis/feature_importance', 'helpfulness_analysis/category_patterns',
+                       'helpfulness_analysis/model_metrics']),
+        Stage('impact', 'impact_analysis:main', deps=['process', 'topics', 'advanced_sentiment', 'helpfulness'],
+              outputs=['impact_analysis/topic_sentiment_correlations', 'impact_analysis/impact_metrics',
+                       'impact_analysis/recommendations'],
+              config={'n_jobs': narrow}),
+        Stage('visualize', 'updated_visualization:main', deps=['process', 'topics', 'sentiment', 'helpfulness'])
+    ]
+
+def project_modules(module_name):
+    """
+    Files of `module_name` and every module of this project it imports, directly or
+    through other project modules.
+
+    Imports are read from the source (including those inside functions, which load
+    optional dependencies lazily), so nothing is imported and third-party modules are
+    ignored.
+    """
+    seen = set()
+    pending = [module_name]
+    while pending:
+        name = pending.pop()
+        path = os.path.join(CODE_DIR, name + '.py')
+        if name in seen or not os.path.exists(path):
+            continue
+        seen.add(name)
+        with open(path) as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module.split('.')[0])
+    return sorted(os.path.join(CODE_DIR, name + '.py') for name in seen)
+
+def _run_stage(name, target, config):
+    """Run a stage target in a worker process, profiled, and return its wall time."""
+    if CODE_DIR not in sys.path:
+        sys.path.insert(0, CODE_DIR)
+    # Forked workers inherit the parent's registry index; re-read it so the stage
+    # resolves the outputs its dependencies have just registered
+    get_registry().refresh()
+    module_name, function_name = target.split(':')
+    function = getattr(importlib.import_module(module_name), function_name)
+    start = time.perf_counter()
+    with profile_stage(name):
+        function(**config)
+    return time.perf_counter() - start
+
+class PipelineOrchestrator:
+    """Run a stage graph with input-hash caching and concurrent independent stages."""
+
+    def __init__(self, stages=None, max_workers=None, force=False):
+        self.stages = {stage.name: stage for stage in (stages or default_stages())}
+        self.max_workers = max_workers or os.cpu_count()
+        self.force = force
+        self.registry = get_registry()
+        # Stage workers inherit the environment, so their registries share this run id
+        os.environ['PIPELINE_RUN_ID'] = self.registry.run_id
+        self.timings = {}
+        self.status = {}
+
+    def _load_cache(self):
+        if not os.path.exists(STAGE_CACHE_PATH):
+            return {}
+        with open(STAGE_CACHE_PATH) as f:
+            return json.load(f)
+
+    def _save_cache(self, cache):
+        if not os.path.exists(REGISTRY_DIR):
+            os.makedirs(REGISTRY_DIR)
+        with open(STAGE_CACHE_PATH, 'w') as f:
+            json.dump(cache, f, indent=2)
+
+    def stage_key(self, stage):
+        """Hash of the stage's code, configuration and input fingerprints."""
+        parts = {
+            'target': stage.target,
+            'code': {os.path.basename(path): fingerprint(path)
+                     for path in project_modules(stage.target.split(':')[0])},
+            'config': stage.config,
+            'files': {path: fingerprint(path) for path in stage.files if os.path.exists(path)},
+            'inputs': {}
+        }
+        for dep in stage.deps:
+            for name in self.stages[dep].outputs:
+                record = self.registry.record(name)
+                parts['inputs'][name] = record['fingerprint'] if record else None
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _outputs_current(self, stage, since):
+        """Check that every declared output was (re-)registered after `since`."""
+        self.registry.refresh()
+        for name in stage.outputs:
+            record = self.registry.record(name)
+            if record is None or record['created'] < since:
+                return False
+        return True
+
+    def _select(self, targets):
+        """The requested stages plus everything they depend on."""
+        if not targets:
+            return list(self.stages)
+        selected, pending = set(), list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage '{name}'. Available: {', '.join(self.stages)}")
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.stages[name].deps)
+        return [name for name in self.stages if name in selected]
+
+    def run(self, targets=None):
+        """
+        Run the requested stages (default: all) in dependency order.
+
+        Returns:
+            Dict of stage name -> 'ran', 'skipped', 'failed' or 'blocked'
+        """
+        selected = self._select(targets)
+        cache = self._load_cache()
+        remaining = set(selected)
+        running = {}
+        pipeline_start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining or running:
+                for name in [n for n in selected if n in remaining]:
+                    stage = self.stages[name]
+                    dep_status = [self.status.get(dep) for dep in stage.deps if dep in selected]
+                    if any(s in ('failed', 'blocked') for s in dep_status):
+                        self.status[name] = 'blocked'
+                        remaining.discard(name)
+                        print(f"[pipeline] {name}: blocked by a failed dependency")
+                        continue
+                    if any(s is None for s in dep_status):
+                        continue
+
+                    remaining.discard(name)
+                    key = self.stage_key(stage)
+                    if not self.force and cache.get(name) == key:
+                        self.status[name] = 'skipped'
+                        self.timings[name] = 0.0
+                        print(f"[pipeline] {name}: inputs unchanged, skipping")
+                        continue
+
+                    print(f"[pipeline] {name}: starting")
+                    since = datetime.now().isoformat(timespec='seconds')
+                    running[executor.submit(_run_stage, name, stage.target, stage.config)] = (name, since)
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, since = running.pop(future)
+                    stage = self.stages[name]
+                    try:
+                        self.timings[name] = future.result()
+                        ok = self._outputs_current(stage, since)
+                    except Exception as e:
+                        print(f"[pipeline] {name}: {e}")
+                        ok = False
+
+                    if ok:
+                        self.status[name] = 'ran'
+                        cache[name] = self.stage_key(stage)
+                        self._save_cache(cache)
+                        print(f"[pipeline] {name}: finished in {self.timings[name]:.1f}s")
+                    else:
+                        self.status[name] = 'failed'
+                        cache.pop(name, None)
+                        self._save_cache(cache)
+                        print(f"[pipeline] {name}: failed (outputs were not produced)")
+
+        self.total_time = time.perf_counter() - pipeline_start
+        self.report()
+        return self.status
+
+    def critical_path(self):
+        """Longest chain of dependent stages by measured wall time."""
+        finish, previous = {}, {}
+        for name in self.stages:
+            if name not in self.timings:
+                continue
+            deps = [dep for dep in self.stages[name].deps if dep in finish]
+            before = max(deps, key=lambda dep: finish[dep], default=None)
+            finish[name] = self.timings[name] + (finish[before] if before else 0.0)
+            previous[name] = before
+        if not finish:
+            return [], 0.0
+        name = max(finish, key=finish.get)
+        length, path = finish[name], []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return path[::-1], length
+
+    def report(self):
+        """Print per-stage timings and save them alongside the run manifest."""
+        print("\nStage timings:")
+        for name, status in self.status.items():
+            print(f"  {name:<20} {status:<8} {self.timings.get(name, 0.0):8.1f}s")
+        path, length = self.critical_path()
+        print(f"Critical path: {' -> '.join(path)} ({length:.1f}s); total wall time {self.total_time:.1f}s")
+        statuses = list(self.status.values())
+        hits, misses = statuses.count('skipped'), statuses.count('ran') + statuses.count('failed')
+        stage_cache = {'hits': hits, 'misses': misses,
+                       'hit_rate': hits / (hits + misses) if hits + misses else None}
+
+        runs_dir = f'{REGISTRY_DIR}/runs'
+        if not os.path.exists(runs_dir):
+            os.makedirs(runs_dir)
+        with open(f'{runs_dir}/{self.registry.run_id}_timings.json', 'w') as f:
+            json.dump({
+                'status': self.status,
+                'timings': self.timings,
+                'critical_path': path,
+                'critical_path_seconds': length,
+                'total_seconds': self.total_time,
+                'stage_cache': stage_cache
+            }, f, indent=2)
+
+def main(argv=None):
+    """Run the pipeline from the command line (`argv` defaults to sys.argv[1:])."""
+    parser = argparse.ArgumentParser(description="Run the review analysis pipeline.")
+    parser.add_argument('stages', nargs='*', help="Stages to run (with their dependencies); default all")
+    parser.add_argument('--input', default='Reviews.csv', help="Raw reviews CSV")
+    parser.add_argument('--jobs', type=int, default=None, help="Maximum concurrent stages")
+    parser.add_argument('--force', action='store_true', help="Re-run stages even if inputs are unchanged")
+    args = parser.parse_args(argv)
+
+    orchestrator = PipelineOrchestrator(default_stages(args.input), max_workers=args.jobs, force=args.force)
+    status = orchestrator.run(args.stages)
+    if any(s in ('failed', 'blocked') for s in status.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+polarity_engine.py
+
+This module implements a vectorized lexicon scoring engine that reproduces TextBlob's
+default (pattern) sentiment. The pattern lexicon TextBlob ships is loaded once into
+array-backed lookup tables indexed by token id. A batch of documents is tokenized,
+mapped to ids in one hashed lookup, and scored by running pattern's left-to-right
+assessment rules (intensifiers, negation, exclamation marks, emoticons and the
+sarcasm mark) on all documents at once. The loop runs over token positions, with one
+NumPy operation per rule covering every document still that long, instead of one
+Python object per document and word.
+
+Compatibility: the tokenizer is a regex approximation of pattern's find_tokens. It
+differs mainly on abbreviations and punctuation inside words. Scores match TextBlob
+within POLARITY_TOLERANCE for at least EQUIVALENCE_SHARE of reviews; run
+check_equivalence (or this module as a script) to verify it on a sample.
+test_polarity_engine.py requires an exact match on fixed reviews covering every rule.
+
+Usage:
+    python polarity_engine.py Reviews.csv --sample 5000
+
+Dependencies:
+- numpy
+- pandas
+- textblob (for the lexicon and, in check_equivalence, the reference scores)
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Documented tolerance of the engine against TextBlob's polarity and subjectivity
+POLARITY_TOLERANCE = 0.05
+EQUIVALENCE_SHARE = 0.99
+
+class PolarityEngine:
+    """Pattern-compatible polarity and subjectivity scoring over batches of texts."""
+
+    def __init__(self):
+        from textblob.en import sentiment as pattern_sentiment
+        from textblob._text import EMOTICONS, PUNCTUATION, RE_EMOTICONS, RE_SARCASM
+
+        pattern_sentiment.load()
+        lexicon = dict(pattern_sentiment)
+        negations = set(pattern_sentiment.negations)
+        modifiers = pattern_sentiment.modifiers
+
+        # Emoticons in the order pattern tests them (first match wins)
+        emoticons = {}
+        for (_, polarity), faces in EMOTICONS.items():
+            for face in faces:
+                face = face.lower()
+                if not face.isalpha() and len(face) <= 5 and face not in PUNCTUATION:
+                    emoticons.setdefault(face, polarity)
+
+        terms = list(lexicon)
+        terms += [w for w in sorted(negations | {'!', '(!)'} | set(emoticons)) if w not in lexicon]
+        self.vocabulary = pd.Index(terms)
+
+        # Row 0 describes unknown tokens; token id k uses row k + 1
+        size = len(terms) + 1
+        self.known = np.zeros(size, dtype=bool)
+        self.polarity = np.zeros(size)
+        self.subjectivity = np.zeros(size)
+        self.intensity = np.ones(size)
+        self.is_modifier = np.zeros(size, dtype=bool)
+        self.ends_ly = np.zeros(size, dtype=bool)
+        self.is_negation = np.zeros(size, dtype=bool)
+        self.is_exclamation = np.zeros(size, dtype=bool)
+        self.is_irony = np.zeros(size, dtype=bool)
+        self.is_emoticon = np.zeros(size, dtype=bool)
+        self.emoticon_polarity = np.zeros(size)
+        for row, term in enumerate(terms, start=1):
+            if term in lexicon:
+                self.known[row] = True
+                self.polarity[row], self.subjectivity[row], self.intensity[row] = lexicon[term][None]
+                self.is_modifier[row] = any(tag in lexicon[term] for tag in modifiers)
+            else:
+                self.is_exclamation[row] = term == '!'
+                self.is_irony[row] = term == '(!)'
+                if term in emoticons:
+                    self.is_emoticon[row] = True
+                    self.emoticon_polarity[row] = emoticons[term]
+            self.ends_ly[row] = term.endswith('ly')
+            self.is_negation[row] = term in negations
+
+        leading = re.escape(PUNCTUATION.replace('.', ''))
+        trailing = re.escape(PUNCTUATION + '.')
+        self._quotes = re.compile('([“”‘’\'"])')
+        self._leading = re.compile(rf'(?:(?<=\s)|^)[{leading}]+')
+        self._trailing = re.compile(rf'(\.\.\.|[{trailing}])(?=(?:\.\.\.|[{trailing}])*(?:\s|$))')
+        self._sarcasm = RE_SARCASM
+        self._emoticons = RE_EMOTICONS
+
+    def tokenize(self, text):
+        """Lowercased tokens of a text, split the way pattern's find_tokens splits them."""
+        text = self._quotes.sub(r' \1 ', str(text).replace("n't", " n't"))
+        text = self._leading.sub(lambda m: ' '.join(m.group()) + ' ', text)
+        text = self._trailing.sub(r' \1 ', text)
+        text = ' '.join(text.split())
+        text = self._sarcasm.sub('(!)', text)
+        text = self._emoticons.sub(lambda m: m.group(1).replace(' ', '') + m.group(2), text)
+        return text.lower().split()
+
+    def encode(self, texts):
+        """
+        Tokenize a batch into flat arrays.
+
+        Returns:
+            (token table rows, token lengths, document offsets) where row 0 marks
+            tokens outside the vocabulary
+        """
+        documents = [self.tokenize(text) for text in texts]
+        lengths = np.fromiter(map(len, documents), dtype=np.int64, count=len(documents))
+        offsets = np.zeros(len(documents) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        tokens = [token for document in documents for token in document]
+        rows = self.vocabulary.get_indexer(tokens) + 1 if tokens else np.zeros(0, dtype=np.int64)
+        token_lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+        return rows, token_lengths, offsets
+
+    def score(self, texts):
+        """Float array of shape (len(texts), 2) with polarity and subjectivity, in input order."""
+        texts = list(texts)
+        rows, token_lengths, offsets = self.encode(texts)
+        n_docs = len(texts)
+        doc_lengths = np.diff(offsets)
+        # Longest documents first, so the documents still active at a position are a prefix
+        order = np.argsort(-doc_lengths, kind='stable')
+        starts = offsets[:-1][order]
+        sorted_lengths = doc_lengths[order]
+
+        has_last = np.zeros(n_docs, dtype=bool)
+        last_p, last_s, last_i = np.zeros(n_docs), np.zeros(n_docs), np.ones(n_docs)
+        last_negated = np.zeros(n_docs, dtype=bool)
+        sum_p, sum_s, count = np.zeros(n_docs), np.zeros(n_docs), np.zeros(n_docs)
+        modifier = np.zeros(n_docs, dtype=bool)
+        modifier_ly = np.zeros(n_docs, dtype=bool)
+        negation = np.zeros(n_docs, dtype=bool)
+
+        def close_last(mask):
+            """Add the pending assessment of the masked documents to their sums."""
+            done = mask & has_last[:active]
+            sum_p[:active][done] += np.where(last_negated[:active][done], -0.5, 1.0) * last_p[:active][done]
+            sum_s[:active][done] += last_s[:active][done]
+            count[:active][done] += 1
+
+        def open_new(mask, p, s, i):
+            close_last(mask)
+            has_last[:active][mask] = True
+            last_p[:active][mask], last_s[:active][mask], last_i[:active][mask] = p, s, i
+            last_negated[:active][mask] = False
+
+        max_length = int(sorted_lengths[0]) if n_docs else 0
+        active = n_docs
+        for t in range(max_length):
+            while active and sorted_lengths[active - 1] <= t:
+                active -= 1
+            row = rows[starts[:active] + t]
+            width = token_lengths[starts[:active] + t]
+            known = self.known[row]
+            m, n = modifier[:active], negation[:active]
+
+            # Known word: a new assessment, or it completes the preceding modifier ("very good")
+            fresh = known & ~m
+            open_new(fresh, self.polarity[row][fresh], self.subjectivity[row][fresh], self.intensity[row][fresh])
+            modified = known & m
+            if modified.any():
+                li = last_i[:active][modified]
+                last_p[:active][modified] = np.clip(self.polarity[row][modified] * li, -1.0, 1.0)
+                last_s[:active][modified] = np.clip(self.subjectivity[row][modified] * li, -1.0, 1.0)
+                last_i[:active][modified] = self.intensity[row][modified]
+            # Known word preceded by a negation ("not good")
+            negated = known & n
+            if negated.any():
+                last_i[:active][negated] = 1.0 / last_i[:active][negated]
+                last_negated[:active][negated] = True
+
+            unknown = ~known
+            is_negation = self.is_negation[row]
+            # Unknown word: may be a negation, which survives short words ("not a good")
+            keep_n = np.where(is_negation, True, n & ~(width > 1))
+            # A negation after an -ly modifier negates the modifier's assessment ("really not good")
+            flip = unknown & keep_n & m & modifier_ly[:active]
+            last_negated[:active][flip] = True
+            keep_n &= ~flip
+            # Otherwise a modifier survives short words ("really is a good")
+            keep_m = m & (flip | (width <= 2))
+            # Exclamation marks boost the previous assessment
+            boost = unknown & self.is_exclamation[row] & has_last[:active]
+            last_p[:active][boost] = np.clip(last_p[:active][boost] * 1.25, -1.0, 1.0)
+            irony = unknown & self.is_irony[row]
+            open_new(irony, 0.0, 1.0, 1.0)
+            emoticon = unknown & self.is_emoticon[row]
+            open_new(emoticon, self.emoticon_polarity[row][emoticon], 1.0, 1.0)
+
+            modifier[:active] = np.where(known, self.is_modifier[row], keep_m)
+            modifier_ly[:active] = np.where(known, self.ends_ly[row], modifier_ly[:active])
+            negation[:active] = np.where(known, is_negation, keep_n)
+
+        active = n_docs
+        close_last(np.ones(n_docs, dtype=bool))
+        scores = np.empty((n_docs, 2), dtype=np.float64)
+        denominator = np.maximum(count, 1)
+        scores[order, 0] = sum_p / denominator
+        scores[order, 1] = sum_s / denominator
+        return scores
+
+_engine = None
+
+def get_engine():
+    """Process-wide engine; the lexicon is loaded on first use."""
+    global _engine
+    if _engine is None:
+        _engine = PolarityEngine()
+    return _engine
+
+def score_batch(texts):
+    """(polarity, subjectivity) rows for a batch of texts; top-level for worker processes."""
+    return get_engine().score(texts)
+
+def compare_with_textblob(texts, tolerance=POLARITY_TOLERANCE):
+    """
+    Score texts with both the engine and TextBlob and summarize the differences.
+
+    Returns:
+        Dict with the maximum and mean absolute difference of polarity and
+        subjectivity and the share of texts within `tolerance` on both
+    """
+    from textblob import TextBlob
+
+    texts = ['' if text is None else str(text) for text in texts]
+    engine = score_batch(texts)
+    reference = np.array([tuple(TextBlob(text).sentiment) for text in texts], dtype=np.float64).reshape(-1, 2)
+    difference = np.abs(engine - reference)
+    return {
+        'texts': len(texts),
+        'max_abs_diff': {'polarity': float(difference[:, 0].max(initial=0.0)),
+                         'subjectivity': float(difference[:, 1].max(initial=0.0))},
+        'mean_abs_diff': {'polarity': float(difference[:, 0].mean()) if len(texts) else 0.0,
+                          'subjectivity': float(difference[:, 1].mean()) if len(texts) else 0.0},
+        'share_within_tolerance': float((difference.max(axis=1) <= tolerance).mean()) if len(texts) else 1.0,
+        'tolerance': tolerance
+    }
+
+def check_equivalence(texts, tolerance=POLARITY_TOLERANCE, share=EQUIVALENCE_SHARE):
+    """
+    Check the engine against TextBlob on a sample of texts.
+
+    Raises:
+        AssertionError: If fewer than `share` of the texts are within `tolerance`
+    """
+    report = compare_with_textblob(texts, tolerance)
+    if report['share_within_tolerance'] < share:
+        raise AssertionError(f"Only {report['share_within_tolerance']:.2%} of texts within "
+                             f"{tolerance} of TextBlob (required {share:.0%}): {report}")
+    return report
+
+def main(argv=None):
+    """Check the engine against TextBlob on a sample of a reviews CSV."""
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description="Compare the lexicon polarity engine with TextBlob.")
+    parser.add_argument('input', help="CSV with a Text column (raw or processed reviews)")
+    parser.add_argument('--sample', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    texts = pd.read_csv(args.input, usecols=['Text'], nrows=args.sample)['Text'].fillna('').tolist()
+    report = check_equivalence(texts)
+
+    from textblob import TextBlob
+    start = time.perf_counter()
+    score_batch(texts)
+    engine_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for text in texts:
+        TextBlob(text).sentiment
+    report['speedup'] = (time.perf_counter() - start) / engine_seconds
+    print(json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+pretokenized_dataset.py
+
+This module implements a tokenize-once training set for AdvancedSentimentAnalyzer. Review
+texts are batch-tokenized with the fast tokenizer a single time and input_ids,
+attention_mask and the token length of every review are written as .npy arrays that are
+memory-mapped on load. The files are keyed by tokenizer name, max_length and a fingerprint
+of the texts, so every epoch and every later run on the same sample reuses them.
+
+Training batches are gathered from the mapped arrays with one indexing operation per batch
+instead of one tokenizer call per review, which is cheap enough that the DataLoader needs
+no worker processes. A length-bucketing sampler groups reviews of similar token length
+and the collator trims every batch to its longest review, so compute follows the real
+review lengths rather than max_length, and raising max_length only costs for the reviews
+that are actually that long. The collator counts real and padded tokens, from which
+padding waste and tokens per second are reported.
+
+Dependencies:
+- numpy
+- pandas
+- torch (for the dataset and loader)
+- transformers (a tokenizer, preferably a fast one)
+"""
+
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from artifact_registry import get_registry
+from review_store import artifact_name
+
+TOKEN_CACHE_DIR = 'advanced_sentiment/token_cache'
+
+# Reviews per tokenizer call when building the arrays
+TOKENIZE_BATCH_SIZE = 4096
+
+def texts_fingerprint(texts):
+    """Content hash of an ordered sequence of texts."""
+    hashed = pd.util.hash_pandas_object(pd.Series(texts, dtype=object).astype(str), index=False)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()[:16]
+
+def cache_base(tokenizer_name, max_length, fingerprint, directory=TOKEN_CACHE_DIR):
+    """Path prefix of the cached arrays for a tokenizer, max_length and text set."""
+    safe_name = re.sub(r'[^\w.-]+', '_', tokenizer_name)
+    return f'{directory}/{safe_name}_len{max_length}_{fingerprint}'
+
+class TokenizedReviews:
+    """Memory-mapped input_ids, attention_mask and token lengths of a set of reviews."""
+
+    def __init__(self, input_ids, attention_mask, lengths, path=None):
+        self.input_ids = input_ids
+        self.attention_mask = attention_mask
+        self.lengths = lengths
+        self.path = path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open the arrays of the cache described by `path` (mapped, not read, by default)."""
+        with open(path) as f:
+            descriptor = json.load(f)
+        mode = 'r' if mmap else None
+        return cls(*(np.load(descriptor[name], mmap_mode=mode)
+                     for name in ('input_ids', 'attention_mask', 'lengths')), path=path)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @property
+    def max_length(self):
+        return self.input_ids.shape[1]
+
+def _fill(arrays, texts, tokenizer, max_length, verbose=True):
+    """Tokenize `texts` batch by batch into preallocated input_ids/attention_mask/lengths arrays."""
+    n = len(texts)
+    for start in range(0, n, TOKENIZE_BATCH_SIZE):
+        batch = [str(text) for text in texts[start:start + TOKENIZE_BATCH_SIZE]]
+        encoding = tokenizer(batch, add_special_tokens=True, max_length=max_length, padding='max_length',
+                             truncation=True, return_attention_mask=True, return_tensors='np')
+        stop = start + len(batch)
+        arrays['input_ids'][start:stop] = encoding['input_ids']
+        arrays['attention_mask'][start:stop] = encoding['attention_mask']
+        arrays['lengths'][start:stop] = encoding['attention_mask'].sum(axis=1)
+        if verbose:
+            print(f"Tokenized {stop} of {n} reviews...")
+
+def tokenize_reviews(texts, tokenizer, max_length=128):
+    """Tokenize texts into in-memory arrays without caching them (e.g. one chunk of a stream)."""
+    texts = list(texts)
+    n = len(texts)
+    arrays = {
+        'input_ids': np.empty((n, max_length), dtype=np.int32),
+        'attention_mask': np.empty((n, max_length), dtype=np.int8),
+        'lengths': np.empty(n, dtype=np.int32)
+    }
+    _fill(arrays, texts, tokenizer, max_length, verbose=False)
+    return TokenizedReviews(arrays['input_ids'], arrays['attention_mask'], arrays['lengths'])
+
+def _tokenize_into(texts, tokenizer, max_length, base):
+    """Tokenize `texts` batch by batch straight into .npy files under `base`."""
+    n = len(texts)
+    arrays = {
+        'input_ids': np.lib.format.open_memmap(f'{base}.input_ids.tmp.npy', mode='w+',
+                                               dtype=np.int32, shape=(n, max_length)),
+        'attention_mask': np.lib.format.open_memmap(f'{base}.attention_mask.tmp.npy', mode='w+',
+                                                    dtype=np.int8, shape=(n, max_length)),
+        'lengths': np.lib.format.open_memmap(f'{base}.lengths.tmp.npy', mode='w+', dtype=np.int32, shape=(n,))
+    }
+    _fill(arrays, texts, tokenizer, max_length)
+
+    for array in arrays.values():
+        array.flush()
+    paths = {}
+    for name in arrays:
+        paths[name] = f'{base}.{name}.npy'
+        os.replace(f'{base}.{name}.tmp.npy', paths[name])
+    return paths
+
+def pretokenize(texts, tokenizer, max_length=128, tokenizer_name=None, directory=TOKEN_CACHE_DIR):
+    """
+    Tokenized arrays of `texts`, built on first use and reused afterwards.
+
+    Args:
+        texts: Sequence of review texts (the order is kept)
+        tokenizer: HuggingFace tokenizer; a fast tokenizer is strongly preferred
+        max_length: Padded and truncated sequence length
+        tokenizer_name: Cache key of the tokenizer (default its name_or_path)
+        directory: Cache directory
+
+    Returns:
+        TokenizedReviews mapped from the cache files
+    """
+    texts = list(texts)
+    tokenizer_name = tokenizer_name or getattr(tokenizer, 'name_or_path', None) or type(tokenizer).__name__
+    base = cache_base(tokenizer_name, max_length, texts_fingerprint(texts), directory)
+    path = f'{base}.json'
+    if os.path.exists(path):
+        print(f"Using pre-tokenized reviews from {path}")
+        return TokenizedReviews.load(path)
+
+    if not getattr(tokenizer, 'is_fast', False):
+        print(f"Warning: {tokenizer_name} has no fast tokenizer; pre-tokenization will be slow")
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    descriptor = _tokenize_into(texts, tokenizer, max_length, base)
+    descriptor.update(tokenizer=tokenizer_name, max_length=max_length, rows=len(texts))
+    # The descriptor is written last, so an interrupted build is never picked up
+    with open(path, 'w') as f:
+        json.dump(descriptor, f, indent=2)
+    get_registry().register(f'{directory}/tokenized_reviews', path, 'advanced_sentiment',
+                            rows=len(texts), inputs=[artifact_name()])
+    return TokenizedReviews.load(path)
+
+class PretokenizedReviewDataset:
+    """
+    Map-style dataset over TokenizedReviews that is indexed by whole batches.
+
+    `dataset[indices]` returns the rows of those reviews as numpy arrays (still padded
+    to the cached max_length), their token lengths and positions; DynamicPaddingCollator
+    trims and converts them. Labels are optional, for inference.
+    """
+
+    def __init__(self, tokenized, labels=None):
+        self.tokenized = tokenized
+        self.labels = None if labels is None else np.asarray(labels, dtype=np.int64)
+        if self.labels is not None and len(self.labels) != len(tokenized):
+            raise ValueError(f"{len(self.labels)} labels for {len(tokenized)} tokenized reviews")
+
+    def __len__(self):
+        return len(self.tokenized)
+
+    @property
+    def lengths(self):
+        return self.tokenized.lengths
+
+    def __getitem__(self, indices):
+        # Sorted positions read the mapped rows front to back
+        indices = np.sort(np.atleast_1d(np.asarray(indices, dtype=np.int64)))
+        batch = {
+            'indices': indices,
+            'input_ids': self.tokenized.input_ids[indices],
+            'attention_mask': self.tokenized.attention_mask[indices],
+            'lengths': self.tokenized.lengths[indices]
+        }
+        if self.labels is not None:
+            batch['labels'] = self.labels[indices]
+        return batch
+
+class LengthBucketSampler:
+    """
+    Batches of review positions with similar token lengths.
+
+    For training (shuffle=True) the positions are shuffled, cut into pools of
+    `bucket_size` batches, sorted by length within each pool and split into batches
+    whose order is shuffled again, so batches stay random but padding stays small.
+    Without shuffling all positions are sorted by length (longest first), which
+    minimizes padding for inference.
+
+    With a seed the batches of an epoch are reproducible, and `position` counts the
+    batches handed out, so state_dict/load_state_dict resume an epoch exactly where it
+    stopped.
+    """
+
+    def __init__(self, lengths, batch_size=32, shuffle=True, bucket_size=50, seed=None):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = bucket_size
+        self.seed = seed
+        self.epoch = 0
+        self.position = 0
+
+    def set_epoch(self, epoch):
+        """Use a different (reproducible) shuffle for each epoch, starting at its first batch."""
+        self.epoch = epoch
+        self.position = 0
+
+    def state_dict(self):
+        return {'epoch': self.epoch, 'position': self.position, 'seed': self.seed,
+                'batch_size': self.batch_size, 'rows': len(self.lengths)}
+
+    def load_state_dict(self, state):
+        """Continue the saved epoch from the first batch that had not been handed out."""
+        if (state['seed'], state['batch_size'], state['rows']) != (self.seed, self.batch_size, len(self.lengths)):
+            raise ValueError("Sampler state was saved for a different seed, batch size or dataset")
+        self.epoch = state['epoch']
+        self.position = state['position']
+
+    def __len__(self):
+        return -(-len(self.lengths) // self.batch_size)
+
+    def _batches(self):
+        if not self.shuffle:
+            order = np.argsort(-self.lengths, kind='stable')
+            return [order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size)]
+
+        seed = None if self.seed is None else self.seed + self.epoch
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self.lengths))
+        pool = self.batch_size * self.bucket_size
+        batches = []
+        for start in range(0, len(order), pool):
+            chunk = order[start:start + pool]
+            chunk = chunk[np.argsort(self.lengths[chunk], kind='stable')]
+            batches.extend(chunk[i:i + self.batch_size] for i in range(0, len(chunk), self.batch_size))
+        return [batches[i] for i in rng.permutation(len(batches))]
+
+    def __iter__(self):
+        batches = self._batches()
+        while self.position < len(batches):
+            batch = batches[self.position]
+            self.position += 1
+            yield batch.tolist()
+
+class PaddingStats:
+    """Token counts of the batches produced by a collator, for padding waste and throughput."""
+
+    def __init__(self, max_length):
+        self.max_length = max_length
+        self.reset()
+
+    def reset(self):
+        self.rows = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+
+    def record(self, lengths, width):
+        self.rows += len(lengths)
+        self.tokens += int(lengths.sum())
+        self.padded_tokens += len(lengths) * width
+
+    @property
+    def waste(self):
+        """Share of processed positions that are padding."""
+        return 1 - self.tokens / self.padded_tokens if self.padded_tokens else 0.0
+
+    @property
+    def fixed_waste(self):
+        """Padding share the same rows would have had at a fixed max_length."""
+        fixed = self.rows * self.max_length
+        return 1 - self.tokens / fixed if fixed else 0.0
+
+    def report(self, seconds, label=''):
+        """Print and return padding waste and tokens per second (real tokens only)."""
+        summary = {
+            'rows': self.rows,
+            'tokens': self.tokens,
+            'padded_tokens': self.padded_tokens,
+            'padding_waste': self.waste,
+            'fixed_length_padding_waste': self.fixed_waste,
+            'tokens_per_second': self.tokens / seconds if seconds else float('nan')
+        }
+        print(f"{label}padding waste {summary['padding_waste']:.1%} "
+              f"(vs {summary['fixed_length_padding_waste']:.1%} at max_length={self.max_length}), "
+              f"{summary['tokens_per_second']:,.0f} tokens/s")
+        return summary
+
+class DynamicPaddingCollator:
+    """Trim a gathered batch to its longest review (rounded up) and convert it to tensors."""
+
+    def __init__(self, max_length, pad_to_multiple_of=8, stats=None):
+        self.pad_to_multiple_of = pad_to_multiple_of
+        self.stats = stats if stats is not None else PaddingStats(max_length)
+
+    def __call__(self, batch):
+        import torch
+        lengths = batch['lengths']
+        width = int(lengths.max()) if len(lengths) else 0
+        if self.pad_to_multiple_of:
+            width = -(-width // self.pad_to_multiple_of) * self.pad_to_multiple_of
+        width = min(max(width, 1), batch['input_ids'].shape[1])
+        self.stats.record(lengths, width)
+        collated = {
+            # Rows are right-padded, so the first `width` columns hold every real token
+            'input_ids': torch.from_numpy(np.ascontiguousarray(batch['input_ids'][:, :width], dtype=np.int64)),
+            'attention_mask': torch.from_numpy(np.ascontiguousarray(batch['attention_mask'][:, :width],
+                                                                    dtype=np.int64)),
+            'indices': torch.from_numpy(batch['indices'])
+        }
+        if 'labels' in batch:
+            collated['labels'] = torch.from_numpy(batch['labels'])
+        return collated
+
+def batch_loader(dataset, batch_size=32, shuffle=True, seed=None, pad_to_multiple_of=8, stats=None):
+    """
+    DataLoader of length-bucketed, dynamically padded batches, built in the main process.
+
+    The LengthBucketSampler is `loader.sampler` and the collator's PaddingStats are
+    `loader.collate_fn.stats` (`stats`, if given, to accumulate over several loaders).
+    """
+    from torch.utils.data import DataLoader
+
+    sampler = LengthBucketSampler(dataset.lengths, batch_size, shuffle=shuffle, seed=seed)
+    collator = DynamicPaddingCollator(dataset.tokenized.max_length, pad_to_multiple_of, stats)
+    # batch_size=None: each sampled item already is a list of indices
+    return DataLoader(dataset, sampler=sampler, batch_size=None, collate_fn=collator)
@@ -0,0 +1,264 @@
+"""
+profiling.py
+
+This module implements per-stage instrumentation for the pipeline. A StageProfiler records,
+for the whole stage and for each named step inside it (load, clean, sentiment, TF-IDF, LDA
+sweep, SHAP, plotting, ...), the wall time, CPU time, resident memory, rows processed per
+second and any cache hit rates reported to it. Steps report how much resident memory they
+added; the peak figures come from getrusage and are high-water marks of the whole process
+so far, not of the step. Steps with the same name are aggregated, so
+per-chunk steps of the streaming pipeline add up. Each stage writes one JSON document per
+run under artifacts/profiles/<run_id>/, and compare_runs flags steps that got slower.
+
+An optional sampling profiler can be attached to a stage; the built-in one samples the
+main thread's stack and writes folded stacks (one 'frame;frame;frame count' line per
+stack) that flame graph tools read directly.
+
+Dependencies:
+- resource (standard library, Unix only; memory figures are omitted elsewhere)
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from artifact_registry import REGISTRY_DIR, get_registry
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_DIR = f'{REGISTRY_DIR}/profiles'
+
+def _rss_mb():
+    """Current resident set size in MB (Linux), or None."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _peak_rss_mb(who=None):
+    """
+    High-water mark of resident memory in MB over the lifetime of this process (or the
+    largest of its terminated children), or None.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who is None else who)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return usage.ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+def _children_cpu():
+    """CPU seconds of terminated child processes (e.g. pool workers)."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class SamplingProfiler:
+    """Sample the main thread's call stack at a fixed interval from a background thread."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self, thread_id):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(threading.main_thread().ident,), daemon=True)
+        self._thread.start()
+
+    def stop(self, path):
+        """Stop sampling and write folded stacks to `path`; returns the path."""
+        self._stop.set()
+        self._thread.join()
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
+
+class StageProfiler:
+    """Collect timings, memory, throughput and cache statistics for one pipeline stage."""
+
+    def __init__(self, stage, run_id=None, directory=PROFILE_DIR, sampler=None):
+        """
+        Args:
+            stage: Stage name, used for the output file
+            run_id: Run the profile belongs to (default: the registry's run id)
+            directory: Root directory for profile JSON files
+            sampler: Optional profiler object with start() and stop(path); None uses the
+                built-in SamplingProfiler if PIPELINE_PROFILE_INTERVAL is set in the environment
+        """
+        self.stage = stage
+        self.run_id = run_id or get_registry().run_id
+        self.directory = directory
+        self.steps = {}
+        self.caches = {}
+        if sampler is None and os.environ.get('PIPELINE_PROFILE_INTERVAL'):
+            sampler = SamplingProfiler(float(os.environ['PIPELINE_PROFILE_INTERVAL']))
+        self.sampler = sampler
+        self.started = None
+
+    def start(self):
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children_cpu = _children_cpu()
+        if self.sampler is not None:
+            self.sampler.start()
+
+    @contextmanager
+    def step(self, name, rows=None):
+        """
+        Time a step. Repeated steps with the same name are summed.
+
+        Yields a dict; set its 'rows' entry inside the block if the row count is only
+        known afterwards.
+        """
+        info = {'rows': rows}
+        wall, cpu, children_cpu = time.perf_counter(), time.process_time(), _children_cpu()
+        rss = _rss_mb()
+        try:
+            yield info
+        finally:
+            entry = self.steps.setdefault(name, {
+                'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                'children_cpu_seconds': 0.0, 'rows': None
+            })
+            entry['calls'] += 1
+            entry['wall_seconds'] += time.perf_counter() - wall
+            entry['cpu_seconds'] += time.process_time() - cpu
+            entry['children_cpu_seconds'] += _children_cpu() - children_cpu
+            if info['rows'] is not None:
+                entry['rows'] = (entry['rows'] or 0) + int(info['rows'])
+                entry['rows_per_second'] = entry['rows'] / entry['wall_seconds'] if entry['wall_seconds'] else None
+            entry['rss_mb'] = _rss_mb()
+            if rss is not None and entry['rss_mb'] is not None:
+                # Largest growth of a single call, so per-chunk steps are not summed
+                entry['rss_growth_mb'] = max(entry.get('rss_growth_mb', 0.0), entry['rss_mb'] - rss)
+            entry['process_peak_rss_mb'] = _peak_rss_mb()
+
+    def record_cache(self, name, stats):
+        """Record cache statistics (a dict with at least 'hits' and 'misses')."""
+        stats = dict(stats)
+        total = stats.get('hits', 0) + stats.get('misses', 0)
+        stats.setdefault('hit_rate', stats.get('hits', 0) / total if total else None)
+        self.caches[name] = stats
+
+    def summary(self):
+        return {
+            'run_id': self.run_id,
+            'stage': self.stage,
+            'started': self.started,
+            'wall_seconds': time.perf_counter() - self._wall,
+            'cpu_seconds': time.process_time() - self._cpu,
+            'children_cpu_seconds': _children_cpu() - self._children_cpu,
+            'process_peak_rss_mb': _peak_rss_mb(),
+            'children_peak_rss_mb': _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+            'steps': self.steps,
+            'caches': self.caches
+        }
+
+    def save(self):
+        """Write the stage profile as JSON and return its path."""
+        run_dir = f'{self.directory}/{self.run_id}'
+        if not os.path.exists(run_dir):
+            os.makedirs(run_dir)
+        summary = self.summary()
+        if self.sampler is not None:
+            summary['samples'] = self.sampler.stop(f'{run_dir}/{self.stage}.folded')
+        path = f'{run_dir}/{self.stage}.json'
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        return path
+
+_current = None
+
+def get_profiler():
+    """The profiler of the running stage; outside of profile_stage, an unsaved default."""
+    global _current
+    if _current is None:
+        _current = StageProfiler('default')
+        _current.start()
+    return _current
+
+@contextmanager
+def profile_stage(stage, sampler=None):
+    """Profile a whole stage and save its JSON on exit, also when the stage fails."""
+    global _current
+    previous = _current
+    _current = StageProfiler(stage, sampler=sampler)
+    _current.start()
+    try:
+        yield _current
+    finally:
+        path = _current.save()
+        print(f"Profile saved to {path}")
+        _current = previous
+
+def profile_step(name, rows=None):
+    """Time a step of the running stage (see StageProfiler.step)."""
+    return get_profiler().step(name, rows)
+
+def profile_iter(iterable, name):
+    """Yield from `iterable`, timing each fetch as step `name` with the item's length as rows."""
+    iterator = iter(iterable)
+    while True:
+        with profile_step(name) as step:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            step['rows'] = len(item)
+        yield item
+
+def load_run(run_id, directory=PROFILE_DIR):
+    """All stage profiles of a run, keyed by stage name."""
+    run_dir = f'{directory}/{run_id}'
+    profiles = {}
+    for name in sorted(os.listdir(run_dir)):
+        if name.endswith('.json'):
+            with open(f'{run_dir}/{name}') as f:
+                profiles[name[:-5]] = json.load(f)
+    return profiles
+
+def compare_runs(baseline_run, run, threshold=0.2, directory=PROFILE_DIR):
+    """
+    Compare step wall times of two runs.
+
+    Returns:
+        List of (stage, step, baseline seconds, seconds, ratio) for steps that got
+        slower by more than `threshold` (a fraction)
+    """
+    baseline, current = load_run(baseline_run, directory), load_run(run, directory)
+    regressions = []
+    for stage, profile in current.items():
+        if stage not in baseline:
+            continue
+        for step, entry in profile['steps'].items():
+            before = baseline[stage]['steps'].get(step)
+            if not before or not before['wall_seconds']:
+                continue
+            ratio = entry['wall_seconds'] / before['wall_seconds']
+            if ratio > 1 + threshold:
+                regressions.append((stage, step, before['wall_seconds'], entry['wall_seconds'], ratio))
+    return regressions
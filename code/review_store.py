@@ -0,0 +1,292 @@
+"""
+review_store.py
+
+This module implements storage and loading of the processed review frame. Besides the
+original CSV layout, reviews can be written as compressed Parquet with Time stored as
+timestamps and ProductId/UserId as categoricals, and loaded with column projection and
+row-group predicate pushdown so stages only read the columns and rows they need. A
+declared compact schema downcasts the review frame after loading for stages that hold the
+full dataset in memory.
+
+A snapshot is either one data file or a part list (processed_reviews_<ts>.parts.json)
+naming data files in row order, so the incremental pipeline can append a delta as a new
+part instead of rewriting the store. The readers below accept both.
+
+Dependencies:
+- pandas
+- pyarrow (optional, required for the Parquet format)
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from artifact_registry import get_registry
+
+PROCESSED_DIR = 'processed_data'
+CATEGORICAL_COLUMNS = ['ProductId', 'UserId']
+FORMATS = ('csv', 'parquet')
+PARTS_SUFFIX = '.parts.json'
+
+# Compact in-memory dtypes of the processed review frame; columns not listed (the text
+# columns) keep their loaded dtype. Integer targets are checked against the data range.
+REVIEW_SCHEMA = {
+    'Id': 'int32',
+    'ProductId': 'category',
+    'UserId': 'category',
+    'ProfileName': 'category',
+    'HelpfulnessNumerator': 'int16',
+    'HelpfulnessDenominator': 'int16',
+    'Score': 'int8',
+    'Time': 'datetime64[s]',
+    'helpfulness_ratio': 'float32',
+    'sentiment_score': 'float32',
+    'subjectivity_score': 'float32',
+    'text_length': 'int32',
+    'summary_length': 'int32',
+    'word_count': 'int32'
+}
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("The parquet format requires pyarrow. Install it with 'pip install pyarrow'.")
+    return pyarrow
+
+def reviews_path(timestamp, fmt='csv', directory=PROCESSED_DIR):
+    """Path of the processed reviews file for a run timestamp and format."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+    return f'{directory}/processed_reviews_{timestamp}.{fmt}'
+
+def parts_path(timestamp, directory=PROCESSED_DIR):
+    """Path of the part list of a multi-part snapshot for a run timestamp."""
+    return f'{directory}/processed_reviews_{timestamp}{PARTS_SUFFIX}'
+
+def delta_path(timestamp, fmt='csv', directory=PROCESSED_DIR):
+    """Path of the data file holding the reviews appended by a run, as one part of a snapshot."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+    return f'{directory}/review_delta_{timestamp}.{fmt}'
+
+def review_parts(path):
+    """Data files of a snapshot in row order: the file itself, or the files its part list names."""
+    if not path.endswith(PARTS_SUFFIX):
+        return [path]
+    with open(path) as f:
+        return json.load(f)['parts']
+
+def write_parts(path, parts):
+    """Write a part list atomically, so readers never see a partial one."""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'parts': list(parts)}, f, indent=2)
+    os.replace(tmp_path, path)
+
+def store_format(path):
+    """'csv' or 'parquet' for a snapshot path."""
+    return 'parquet' if review_parts(path)[0].endswith('.parquet') else 'csv'
+
+def snapshot_timestamp(path):
+    """Run timestamp of a snapshot path (data file or part list)."""
+    name = os.path.basename(path)
+    for suffix in (PARTS_SUFFIX,) + tuple(f'.{fmt}' for fmt in FORMATS):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return name[len('processed_reviews_'):]
+
+def artifact_name(directory=PROCESSED_DIR):
+    """Registry name of the processed reviews artifact."""
+    return f'{directory}/processed_reviews'
+
+def latest_processed_reviews(directory=PROCESSED_DIR):
+    """
+    Resolve the current processed reviews file in either format via the artifact registry.
+
+    Raises:
+        FileNotFoundError: If no processed reviews file exists
+    """
+    try:
+        # Prefer Parquet when both formats share a timestamp
+        return get_registry().resolve(artifact_name(directory), extensions=('csv', 'parquet'))
+    except FileNotFoundError:
+        raise FileNotFoundError("Processed data files not found. Run amazon_review_processor.py first.")
+
+def to_storage_frame(df):
+    """Apply the storage dtypes: categorical IDs and datetime Time."""
+    df = df.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    if 'Time' in df.columns:
+        df['Time'] = pd.to_datetime(df['Time'])
+    return df
+
+class ParquetReviewWriter:
+    """
+    Append review chunks to a single Parquet file.
+
+    The schema is fixed by the first chunk, with dictionary indices widened to int32,
+    so later chunks with different category sets or all-null columns still conform.
+    """
+
+    def __init__(self, path, row_group_size=100000, compression='zstd'):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.schema = None
+        self.writer = None
+        self.pa = _require_pyarrow()
+
+    def write(self, df):
+        pa = self.pa
+        table = pa.Table.from_pandas(to_storage_frame(df), preserve_index=False)
+
+        if self.writer is None:
+            fields = [
+                pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type))
+                if pa.types.is_dictionary(field.type) else field
+                for field in table.schema
+            ]
+            self.schema = pa.schema(fields, metadata=table.schema.metadata)
+            self.writer = pa.parquet.ParquetWriter(self.path, self.schema, compression=self.compression)
+
+        self.writer.write_table(table.cast(self.schema), row_group_size=self.row_group_size)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def save_reviews(df, path, row_group_size=100000):
+    """Save a processed review frame as CSV or Parquet depending on the file extension."""
+    if path.endswith('.parquet'):
+        with ParquetReviewWriter(path, row_group_size=row_group_size) as writer:
+            writer.write(df)
+    else:
+        df.to_csv(path, index=False)
+
+def _apply_filters(df, filters):
+    """Evaluate pyarrow-style [(column, op, value), ...] filters on a frame (AND semantics)."""
+    ops = {
+        '==': lambda s, v: s == v, '=': lambda s, v: s == v, '!=': lambda s, v: s != v,
+        '<': lambda s, v: s < v, '<=': lambda s, v: s <= v,
+        '>': lambda s, v: s > v, '>=': lambda s, v: s >= v,
+        'in': lambda s, v: s.isin(v), 'not in': lambda s, v: ~s.isin(v)
+    }
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        mask &= ops[op](df[column], value)
+    return df[mask].reset_index(drop=True)
+
+def load_processed_reviews(path=None, columns=None, filters=None):
+    """
+    Load processed reviews with optional projection and predicate pushdown.
+
+    Args:
+        path: File to load; defaults to the current processed reviews artifact, reusing
+            the in-memory frame if it was produced earlier in this process
+        columns: Columns to read, or None for all
+        filters: List of (column, op, value) tuples combined with AND, e.g.
+            [('Score', '>=', 4)]. For Parquet, row groups whose statistics exclude
+            the predicate are skipped without being read.
+
+    Returns:
+        DataFrame with 'Time' as datetime
+    """
+    if path is None:
+        handle = get_registry().handle(artifact_name())
+        if handle is not None and (columns is None or set(columns) <= set(handle.columns)):
+            df = handle if columns is None else handle[list(columns)]
+            df = _apply_filters(df, filters) if filters else df.copy()
+            print("Using processed data from this run")
+            return df
+        path = latest_processed_reviews()
+
+    parts = [_load_file(part, columns, filters) for part in review_parts(path)]
+    df = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    print(f"Loaded processed data from: {path}")
+    return df
+
+def _load_file(path, columns, filters):
+    """Load one data file of a snapshot (see load_processed_reviews)."""
+    if path.endswith('.parquet'):
+        _require_pyarrow()
+        return pd.read_parquet(path, columns=columns, filters=filters or None)
+    usecols = None
+    if columns is not None:
+        # Filter columns must be read even if they are not projected
+        usecols = list(dict.fromkeys(list(columns) + [f[0] for f in filters or []]))
+    df = pd.read_csv(path, usecols=usecols)
+    if 'Time' in df.columns:
+        df['Time'] = pd.to_datetime(df['Time'])
+    if filters:
+        df = _apply_filters(df, filters)
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+def _compact_column(series, dtype):
+    """Cast one column to its schema dtype, widening integers that would overflow."""
+    if dtype == 'category' or dtype.startswith('datetime'):
+        return series.astype(dtype)
+    if np.dtype(dtype).kind == 'f':
+        return series.astype(dtype)
+    if series.isna().any():
+        # Missing values cannot be held by a numpy integer dtype
+        return series.astype('float32')
+    limits = np.iinfo(dtype)
+    if len(series) and (series.min() < limits.min or series.max() > limits.max):
+        return pd.to_numeric(series, downcast='integer')
+    return series.astype(dtype)
+
+def to_compact_frame(df, schema=None):
+    """Apply the compact schema (REVIEW_SCHEMA by default) to the columns present in df."""
+    schema = REVIEW_SCHEMA if schema is None else schema
+    for column, dtype in schema.items():
+        if column in df.columns and str(df[column].dtype) != dtype:
+            df[column] = _compact_column(df[column], dtype)
+    return df
+
+def frame_memory_mb(df):
+    """Deep memory usage of a frame in MB."""
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+def load_compact_reviews(path=None, columns=None, filters=None):
+    """
+    Load processed reviews like load_processed_reviews and downcast them to the
+    compact schema, reporting memory usage before and after.
+    
+    Returns:
+        DataFrame with categorical IDs, downcast numerics and datetime64[s] Time
+    """
+    df = load_processed_reviews(path, columns, filters)
+    before = frame_memory_mb(df)
+    df = to_compact_frame(df)
+    after = frame_memory_mb(df)
+    print(f"Review frame memory: {before:.1f} MB -> {after:.1f} MB "
+          f"({after / before if before else 1:.0%} of default dtypes)")
+    return df
+
+def iter_reviews(path, columns, chunksize=50000):
+    """Yield DataFrame chunks of selected columns from a processed reviews snapshot."""
+    for part in review_parts(path):
+        if part.endswith('.parquet'):
+            pa = _require_pyarrow()
+            parquet_file = pa.parquet.ParquetFile(part)
+            for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas()
+        else:
+            for chunk in pd.read_csv(part, usecols=columns, chunksize=chunksize):
+                if 'Time' in chunk.columns:
+                    chunk['Time'] = pd.to_datetime(chunk['Time'])
+                yield chunk
@@ -0,0 +1,277 @@
+"""
+rollup_cube.py
+
+This module implements a precomputed aggregate cube of the processed reviews over
+month x Score x ProductId. Each non-empty cell holds the count, sum and sum of squares of
+the sentiment, helpfulness and rating columns, which is enough to answer mean, std, var,
+sum and count for any grouping of the three dimensions without reading the reviews.
+
+The cube is additive: new reviews are folded in with add() and replaced reviews taken
+out with remove(), so the processors maintain it chunk by chunk and the incremental
+pipeline only touches the delta. Roll-ups to month x Score (the common trend queries)
+are materialized on first use and kept until the cube changes, so they answer in
+milliseconds regardless of corpus size.
+
+Dependencies:
+- numpy
+- pandas
+"""
+
+import numpy as np
+import pandas as pd
+
+from artifact_registry import get_registry
+from review_store import PROCESSED_DIR, artifact_name, latest_processed_reviews, snapshot_timestamp
+
+DIMENSIONS = ('month', 'Score', 'ProductId')
+
+# Review columns aggregated in every cell
+MEASURES = ('sentiment_score', 'helpfulness_ratio', 'Score')
+
+# Columns a review frame needs to be added to the cube
+CUBE_COLUMNS = ['Time', 'Score', 'ProductId', 'sentiment_score', 'helpfulness_ratio']
+
+STATISTICS = ('count', 'sum', 'mean', 'var', 'std')
+
+# Partial aggregates buffered by add() before they are merged into the cells
+MAX_PENDING = 32
+
+def _month_ordinals(times):
+    """Months since 1970-01 (the ordinal of a monthly Period) for datetime values."""
+    times = pd.to_datetime(pd.Series(times))
+    return ((times.dt.year - 1970) * 12 + times.dt.month - 1).to_numpy(dtype=np.int32)
+
+def _stat_columns():
+    return [f'{measure}_{part}' for measure in MEASURES for part in ('count', 'sum', 'sumsq')]
+
+def _consolidate(cells):
+    """Merge cells that share a key and drop cells emptied by remove()."""
+    keys = list(DIMENSIONS)
+    merged = cells.groupby(keys, sort=True).sum().reset_index()
+    return merged[merged['reviews'] > 0].reset_index(drop=True)
+
+class RollupCube:
+    """Additive month x Score x ProductId aggregates of the review measures."""
+
+    def __init__(self, cells=None, products=None):
+        """
+        Args:
+            cells: DataFrame with the DIMENSIONS (ProductId as codes into `products`),
+                'reviews' and count/sum/sumsq columns per measure
+            products: Index of ProductId values
+        """
+        self.products = pd.Index([] if products is None else products, dtype=object)
+        if cells is None:
+            cells = pd.DataFrame({column: np.zeros(0, dtype=np.int64) for column in DIMENSIONS})
+            cells['reviews'] = np.zeros(0, dtype=np.int64)
+            for column in _stat_columns():
+                cells[column] = np.zeros(0, dtype=np.float64)
+        self._cells = cells
+        self._pending = []
+        self._rollups = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        """Cube of a review frame holding CUBE_COLUMNS."""
+        return cls().add(df)
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """Cube of an iterable of review frames."""
+        cube = cls()
+        for chunk in chunks:
+            cube.add(chunk)
+        return cube
+
+    def __len__(self):
+        """Number of non-empty cells."""
+        return len(self.cells)
+
+    @property
+    def reviews(self):
+        return int(self.cells['reviews'].sum())
+
+    @property
+    def cells(self):
+        self._flush()
+        return self._cells
+
+    def _flush(self):
+        if self._pending:
+            self._cells = _consolidate(pd.concat([self._cells] + self._pending, ignore_index=True))
+            self._pending = []
+
+    def _product_codes(self, product_ids):
+        """Codes of ProductIds, appending unseen products so existing codes stay valid."""
+        product_ids = pd.Series(product_ids).astype(str).to_numpy(dtype=object)
+        codes = self.products.get_indexer(product_ids)
+        new = codes < 0
+        if new.any():
+            self.products = self.products.append(pd.Index(pd.unique(product_ids[new]), dtype=object))
+            codes[new] = self.products.get_indexer(product_ids[new])
+        return codes
+
+    def _partial(self, df, sign):
+        """Aggregate a review frame into cells, scaled by +1 (add) or -1 (remove)."""
+        frame = pd.DataFrame({
+            'month': _month_ordinals(df['Time']),
+            'Score': df['Score'].to_numpy(dtype=np.int64),
+            'ProductId': self._product_codes(df['ProductId']),
+            'reviews': np.full(len(df), sign, dtype=np.int64)
+        })
+        for measure in MEASURES:
+            values = df[measure].to_numpy(dtype=np.float64)
+            present = ~np.isnan(values)
+            values = np.where(present, values, 0.0)
+            frame[f'{measure}_count'] = sign * present.astype(np.float64)
+            frame[f'{measure}_sum'] = sign * values
+            frame[f'{measure}_sumsq'] = sign * values * values
+        return frame.groupby(list(DIMENSIONS), sort=False).sum().reset_index()
+
+    def _update(self, df, sign):
+        if len(df):
+            self._pending.append(self._partial(df, sign))
+            self._rollups = {}
+            if len(self._pending) >= MAX_PENDING:
+                self._flush()
+        return self
+
+    def add(self, df):
+        """Fold new reviews (a frame holding CUBE_COLUMNS) into the cube; returns self."""
+        return self._update(df, 1)
+
+    def remove(self, df):
+        """Take previously added reviews (e.g. ones being replaced) out of the cube; returns self."""
+        return self._update(df, -1)
+
+    def _rollup(self, by):
+        """Cells summed over the dimensions not in `by`, cached until the cube changes."""
+        key = tuple(dim for dim in DIMENSIONS if dim in by)
+        rollup = self._rollups.get(key)
+        if rollup is None:
+            columns = ['reviews'] + _stat_columns()
+            rollup = self._rollups[key] = self.cells.groupby(list(key), sort=True)[columns].sum()
+        return rollup
+
+    def aggregate(self, by, spec, products=None):
+        """
+        Statistics of the measures grouped by cube dimensions, like DataFrame.groupby().agg().
+
+        Args:
+            by: Dimension name or list of names from DIMENSIONS
+            spec: {measure: [statistics]} with measures from MEASURES and statistics from
+                STATISTICS (std and var use ddof=1, as pandas does)
+            products: Optional ProductIds to restrict the cells to
+
+        Returns:
+            DataFrame indexed by `by` (months as a monthly PeriodIndex, ProductId as the
+            original ids) with (measure, statistic) columns
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        unknown = set(by) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions {sorted(unknown)}, expected {DIMENSIONS}")
+
+        if products is not None:
+            codes = self.products.get_indexer(pd.Index(products, dtype=object))
+            cells = self.cells[self.cells['ProductId'].isin(codes[codes >= 0])]
+            grouped = cells.groupby(by, sort=True)[['reviews'] + _stat_columns()].sum()
+        else:
+            grouped = self._rollup(by)
+            grouped = grouped.reorder_levels(by) if len(by) > 1 else grouped
+
+        result = {}
+        for measure, statistics in spec.items():
+            if measure not in MEASURES:
+                raise ValueError(f"Unknown measure '{measure}', expected one of {MEASURES}")
+            count = grouped[f'{measure}_count'].to_numpy()
+            total = grouped[f'{measure}_sum'].to_numpy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = np.where(count > 0, total / count, np.nan)
+                # Clamp tiny negative values left by rounding in sumsq - n * mean^2
+                var = np.where(count > 1, np.maximum(grouped[f'{measure}_sumsq'].to_numpy() - total * mean, 0.0)
+                               / (count - 1), np.nan)
+            values = {'count': count.astype(np.int64), 'sum': total, 'mean': mean, 'var': var, 'std': np.sqrt(var)}
+            for statistic in statistics:
+                if statistic not in values:
+                    raise ValueError(f"Unknown statistic '{statistic}', expected one of {STATISTICS}")
+                result[(measure, statistic)] = values[statistic]
+
+        frame = pd.DataFrame(result, index=self._labels(grouped.index, by))
+        frame.columns = pd.MultiIndex.from_tuples(frame.columns)
+        return frame
+
+    def _labels(self, index, by):
+        """Replace month ordinals and product codes in a group index by their values."""
+        levels = []
+        for position, dim in enumerate(by):
+            values = index.get_level_values(position).to_numpy() if len(by) > 1 else index.to_numpy()
+            if dim == 'month':
+                levels.append(pd.PeriodIndex.from_ordinals(values, freq='M', name='month'))
+            elif dim == 'ProductId':
+                levels.append(pd.Index(self.products[values], dtype=object, name='ProductId'))
+            else:
+                levels.append(pd.Index(values, name=dim))
+        return levels[0] if len(levels) == 1 else pd.MultiIndex.from_arrays(levels)
+
+    def save(self, path):
+        cells = self.cells
+        np.savez(path, products=self.products.to_numpy(dtype=str),
+                 **{column: cells[column].to_numpy() for column in cells.columns})
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            products = data['products'].astype(object)
+            cells = pd.DataFrame({column: data[column] for column in data.files if column != 'products'})
+        return cls(cells, products)
+
+def cube_path(timestamp, directory=PROCESSED_DIR):
+    """Path of the cube that belongs to the processed reviews of a run timestamp."""
+    return f'{directory}/rollup_cube_{timestamp}.npz'
+
+def save_rollup_cube(cube, timestamp, directory=PROCESSED_DIR):
+    """Write the cube next to the processed reviews of `timestamp` and register it."""
+    path = cube.save(cube_path(timestamp, directory))
+    get_registry().register(f'{directory}/rollup_cube', path, 'process', rows=len(cube),
+                            inputs=[artifact_name(directory)], handle=cube)
+    print(f"Rollup cube: {len(cube)} cells over {cube.reviews} reviews")
+    return path
+
+def load_rollup_cube(directory=PROCESSED_DIR):
+    """
+    The cube of the current processed reviews, or None.
+
+    None is returned when the current processed reviews were written without a cube
+    (e.g. by an older run), so callers can fall back to grouping the review frame.
+    """
+    try:
+        reviews = latest_processed_reviews(directory)
+    except FileNotFoundError:
+        return None
+    path = cube_path(snapshot_timestamp(reviews), directory)
+    registry = get_registry()
+    if registry.find(f'{directory}/rollup_cube', ('npz',)) != path:
+        return None
+    return registry.load(f'{directory}/rollup_cube', RollupCube.load, ('npz',))
+
+def check_cube(df, cube=None):
+    """
+    Compare cube answers with direct groupbys over a review frame.
+
+    Returns:
+        Largest absolute difference over mean/std/count by month, Score and ProductId
+    """
+    cube = RollupCube.from_frame(df) if cube is None else cube
+    spec = {'sentiment_score': ['mean', 'std', 'count'], 'helpfulness_ratio': ['mean', 'std'],
+            'Score': ['mean', 'count']}
+    keys = {'month': pd.to_datetime(df['Time']).dt.to_period('M').rename('month'),
+            'Score': df['Score'], 'ProductId': df['ProductId'].astype(str)}
+    worst = 0.0
+    for by in (['month'], ['Score'], ['ProductId'], ['month', 'Score']):
+        expected = df.groupby([keys[dim] for dim in by], observed=True).agg(spec)
+        actual = cube.aggregate(by, spec).reindex(expected.index)
+        worst = max(worst, float(np.nanmax(np.abs(actual.to_numpy(dtype=np.float64)
+                                                  - expected.to_numpy(dtype=np.float64)))))
+    return worst
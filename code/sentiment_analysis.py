@@ -8,73 +8,82 @@ Dependencies:
 - pandas
 - numpy
 - textblob
-- nltk
 - scikit-learn
 """
 
 import pandas as pd
 import numpy as np
-from textblob import TextBlob
-import nltk
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
 import pickle
 import os
 from datetime import datetime
-import glob
+from review_store import artifact_name, iter_reviews, latest_processed_reviews, load_processed_reviews
+from artifact_registry import get_registry
+from profiling import profile_stage, profile_step
+from rollup_cube import load_rollup_cube
+from aspect_matching import DEFAULT_ASPECT_LEXICON, AspectMatcher, load_lexicon, merge_lexicons, score_aspects, score_review
 
 class SentimentAnalyzer:
-    def __init__(self):
-        """Initialize the SentimentAnalyzer with default parameters."""
-        self.aspect_lexicon = {
-            'quality': ['quality', 'durability', 'durable', 'sturdy', 'solid'],
-            'price': ['price', 'cost', 'expensive', 'cheap', 'value'],
-            'usability': ['easy', 'simple', 'difficult', 'complicated', 'user-friendly'],
-            'service': ['delivery', 'shipping', 'customer service', 'support', 'warranty']
-        }
-        self.model = None
-        self.vectorizer = TfidfVectorizer(max_features=1000)
+    def __init__(self, extra_lexicon=None):
+        """
+        Initialize the SentimentAnalyzer with default parameters.
         
-    def load_processed_data(self):
-        """Load the most recent processed review data."""
-        processed_files = glob.glob('processed_data/processed_reviews_*.csv')
+        `extra_lexicon` ({aspect: [terms]} or the path of a JSON file holding one)
+        adds aspects or terms to the default aspect lexicon.
+        """
+        if isinstance(extra_lexicon, str):
+            extra_lexicon = load_lexicon(extra_lexicon)
+        self.aspect_lexicon = merge_lexicons(DEFAULT_ASPECT_LEXICON, extra_lexicon)
+        self._matcher = None
+        self.model = None
+        self._vectorizer = None
+        self.classifier_metrics = None
+
+    @property
+    def vectorizer(self):
+        """TF-IDF vectorizer for the classifier, created on first use (imports scikit-learn)."""
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            self._vectorizer = TfidfVectorizer(max_features=1000)
+        return self._vectorizer
+
+    @vectorizer.setter
+    def vectorizer(self, vectorizer):
+        self._vectorizer = vectorizer
         
-        if not processed_files:
-            raise FileNotFoundError("Processed data files not found. Run amazon_review_processor.py first.")
-            
-        latest_file = max(processed_files)
-        df = pd.read_csv(latest_file)
-        print(f"Loaded processed data from: {latest_file}")
+    def load_processed_data(self, columns=('Text', 'Score', 'Time', 'sentiment_score')):
+        """Load the columns this analysis uses from the most recent processed review data."""
+        return load_processed_reviews(columns=list(columns) if columns else None)
         
-        return df
+    @property
+    def matcher(self):
+        """Compiled AspectMatcher for aspect_lexicon, rebuilt if the lexicon was changed."""
+        if self._matcher is None or self._matcher.lexicon != self.aspect_lexicon:
+            self._matcher = AspectMatcher(self.aspect_lexicon)
+        return self._matcher
+
+    def add_aspect_terms(self, aspect, terms):
+        """Add terms (or a new aspect) to the aspect lexicon."""
+        self.aspect_lexicon = merge_lexicons(self.aspect_lexicon, {aspect: list(terms)})
         
-    def extract_aspect_sentiments(self, text):
+    def extract_aspect_sentiments(self, text, backend='textblob'):
         """
-        Extract sentiment scores for different aspects of a review using simple splitting.
+        Extract sentiment scores for different aspects of a review.
+        
+        Sentences are split on '.'; terms match as whole words (case-insensitive) and
+        only sentences mentioning an aspect are scored, with TextBlob or the
+        vectorized 'lexicon' backend.
         """
-        # Split text into sentences using simple period-based splitting
-        sentences = str(text).split('.')
-        aspect_sentiments = {aspect: [] for aspect in self.aspect_lexicon}
-        
-        for sentence in sentences:
-            if sentence.strip():  # Check if sentence is not empty
-                blob = TextBlob(sentence.lower())
-                sentence_sentiment = blob.sentiment.polarity
-                
-                # Check each aspect
-                for aspect, terms in self.aspect_lexicon.items():
-                    if any(term in sentence for term in terms):
-                        aspect_sentiments[aspect].append(sentence_sentiment)
-        
-        # Average sentiments for each aspect
-        return {
-            aspect: np.mean(sentiments) if sentiments else np.nan
-            for aspect, sentiments in aspect_sentiments.items()
-        }
+        return score_review(self.matcher, text, backend=backend)
+
+    def extract_aspect_sentiments_batch(self, texts, n_jobs=1, chunk_size=20000, backend='textblob'):
+        """Aspect sentiments for many reviews as a DataFrame, spread over `n_jobs` processes."""
+        return score_aspects(texts, self.aspect_lexicon, n_jobs=n_jobs, chunk_size=chunk_size, backend=backend)
     
     def train_sentiment_classifier(self, texts, ratings):
         """Train a sentiment classifier using review texts and ratings."""
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.model_selection import train_test_split
+        
         # Convert ratings to sentiment labels
         labels = pd.cut(ratings, bins=[-np.inf, 2, 3, np.inf], labels=['negative', 'neutral', 'positive'])
         
@@ -99,6 +108,43 @@ class SentimentAnalyzer:
         
         return accuracy
 
+    def train_sentiment_classifier_streaming(self, make_batches=None, batch_size=50000, n_jobs=1, **kwargs):
+        """
+        Train a linear classifier on hashed features out of core with partial_fit.
+        
+        `make_batches` returns a fresh iterator of frames with Id, Text and Score; by
+        default the processed reviews are streamed in `batch_size` rows. Reviews held
+        out by Id are scored by the final model in a second pass over the stream (the
+        progressive-validation accuracy of training is reported alongside) and the
+        metrics are saved by save_results. The model and vectorizer replace
+        the random forest and TF-IDF vectorizer, so save_results writes the same files.
+        Extra keyword arguments go to StreamingSentimentTrainer.
+        """
+        from streaming_classifier import StreamingSentimentTrainer
+        
+        if make_batches is None:
+            path = latest_processed_reviews()
+            make_batches = lambda: iter_reviews(path, ['Id', 'Text', 'Score'], chunksize=batch_size)
+        
+        print("Training streaming sentiment classifier...")
+        trainer = StreamingSentimentTrainer(n_jobs=n_jobs, **kwargs)
+        progressive = trainer.fit(make_batches)
+        self.model = trainer.model
+        self.vectorizer = trainer.vectorizer
+        metrics = trainer.evaluate(make_batches)
+        
+        print(f"Training samples: {progressive['train_rows']}, Held-out samples: {metrics['test_rows']}")
+        print(f"Progressive validation accuracy during training: {progressive['accuracy']:.4f}")
+        print(f"Training completed with held-out accuracy: {metrics['accuracy']:.4f}")
+        self.classifier_metrics = {
+            'accuracy': metrics['accuracy'],
+            **{f'recall_{label}': recall for label, recall in metrics['recall'].items()},
+            'progressive_accuracy': progressive['accuracy'],
+            'train_rows': progressive['train_rows'],
+            'test_rows': metrics['test_rows']
+        }
+        return metrics['accuracy']
+
     def save_results(self, aspect_sentiments_df, trends, directory='sentiment_analysis'):
         """Save sentiment analysis results."""
         if not os.path.exists(directory):
@@ -120,10 +166,39 @@ class SentimentAnalyzer:
             with open(f'{directory}/sentiment_vectorizer_{timestamp}.pkl', 'wb') as f:
                 pickle.dump(self.vectorizer, f)
         
+        if self.classifier_metrics is not None:
+            pd.DataFrame([self.classifier_metrics]).to_csv(
+                f'{directory}/classifier_metrics_{timestamp}.csv', index=False
+            )
+        
+        # Register outputs with the artifact registry
+        outputs = {'aspect_sentiments': 'csv', 'time_trends': 'csv', 'rating_trends': 'csv'}
+        if self.model is not None:
+            outputs.update(sentiment_classifier='pkl', sentiment_vectorizer='pkl')
+        if self.classifier_metrics is not None:
+            outputs.update(classifier_metrics='csv')
+        registry = get_registry()
+        for name, ext in outputs.items():
+            registry.register(f'{directory}/{name}', f'{directory}/{name}_{timestamp}.{ext}',
+                              'sentiment', inputs=[artifact_name()])
+        
         print(f"Results and models saved in {directory} directory with timestamp {timestamp}")
 
-def analyze_sentiment_trends(df):
-    """Analyze sentiment trends over time and by product category."""
+def analyze_sentiment_trends(df, cube=None):
+    """
+    Analyze sentiment trends over time and by product category.
+    
+    If the rollup `cube` of the reviews is given, the trends are read from it
+    instead of grouping the frame.
+    """
+    if cube is not None:
+        trends = {}
+        for key, (dimension, index_name) in {'time_trends': ('month', 'Time'),
+                                             'rating_trends': ('Score', 'Score')}.items():
+            means = cube.aggregate(dimension, {'sentiment_score': ['mean']})[('sentiment_score', 'mean')]
+            trends[key] = means.rename('sentiment_score').rename_axis(index_name)
+        return trends
+    
     df['Time'] = pd.to_datetime(df['Time'])
     
     # Analyze trends over time
@@ -137,36 +212,52 @@ def analyze_sentiment_trends(df):
         'rating_trends': rating_trends
     }
 
-def main():
-    """Main function to run sentiment analysis on processed review data."""
+def main(n_jobs=-1, lexicon_path=None, classifier='forest', sentiment_backend='textblob'):
+    """
+    Main function to run sentiment analysis on processed review data.
+    
+    Aspect sentiments are extracted for every review using `n_jobs` processes
+    (-1 for all cores); `lexicon_path` is an optional JSON lexicon extending the
+    default aspects. `classifier` is 'forest' (TF-IDF and random forest in memory)
+    or 'streaming' (out-of-core partial_fit on hashed features).
+    `sentiment_backend` scores aspect sentences with 'textblob' or 'lexicon'.
+    """
     try:
         # Initialize analyzer
-        analyzer = SentimentAnalyzer()
+        analyzer = SentimentAnalyzer(lexicon_path)
         
         # Load processed data
-        df = analyzer.load_processed_data()
+        with profile_step('load') as step:
+            df = analyzer.load_processed_data()
+            df['Text'] = df['Text'].fillna('')  # empty reviews are read back as NaN
+            step['rows'] = len(df)
         
         print("Starting sentiment analysis...")
         
         # Train sentiment classifier
-        accuracy = analyzer.train_sentiment_classifier(df['Text'], df['Score'])
+        with profile_step('train_classifier', rows=len(df)):
+            if classifier == 'streaming':
+                accuracy = analyzer.train_sentiment_classifier_streaming(n_jobs=n_jobs)
+            else:
+                accuracy = analyzer.train_sentiment_classifier(df['Text'], df['Score'])
         
-        # Extract aspect sentiments for a sample of reviews
+        # Extract aspect sentiments for all reviews
         print("\nAnalyzing aspect-based sentiments...")
-        sample_size = min(1000, len(df))  # Analyze up to 1000 reviews
-        sample_reviews = df['Text'].head(sample_size)
-        aspect_sentiments = [analyzer.extract_aspect_sentiments(text) for text in sample_reviews]
-        aspect_df = pd.DataFrame(aspect_sentiments)
+        with profile_step('aspect_sentiments', rows=len(df)):
+            aspect_df = analyzer.extract_aspect_sentiments_batch(df['Text'], n_jobs=n_jobs,
+                                                                backend=sentiment_backend)
         
         print("\nAverage aspect sentiments:")
         print(aspect_df.mean())
         
         # Analyze trends
         print("\nAnalyzing sentiment trends...")
-        trends = analyze_sentiment_trends(df)
+        with profile_step('trends', rows=len(df)):
+            trends = analyze_sentiment_trends(df, load_rollup_cube())
         
         # Save all results
-        analyzer.save_results(aspect_df, trends)
+        with profile_step('save'):
+            analyzer.save_results(aspect_df, trends)
         
         print("\nSentiment analysis completed successfully!")
         
@@ -174,4 +265,5 @@ def main():
         print(f"An error occurred: {str(e)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile_stage('sentiment'):
+        main()
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+sentiment_cache.py
+
+This module implements a persistent, content-addressed cache of sentiment scores.
+Review texts are keyed by a hash of their normalized content, so duplicate reviews
+and re-runs over overlapping datasets skip TextBlob scoring entirely.
+
+Dependencies:
+- sqlite3 (standard library)
+"""
+
+import hashlib
+import os
+import sqlite3
+
+class SentimentCache:
+    """SQLite-backed map from text hash to (polarity, subjectivity) with LRU eviction."""
+
+    # SQLite limits the number of bound parameters per statement
+    _QUERY_BATCH = 500
+
+    def __init__(self, path='processed_data/sentiment_cache.sqlite', max_entries=5000000):
+        """
+        Open (or create) the cache.
+
+        Args:
+            path: SQLite database file
+            max_entries: Size cap; least recently used entries are evicted beyond it
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS sentiment ('
+            'key BLOB PRIMARY KEY, polarity REAL, subjectivity REAL, last_used INTEGER)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS sentiment_last_used ON sentiment(last_used)')
+        self._clock = self.conn.execute('SELECT COALESCE(MAX(last_used), 0) FROM sentiment').fetchone()[0]
+        # Entry count kept up to date from statement row counts, so eviction does not
+        # scan the table after every insert
+        self._entries = len(self)
+
+    @staticmethod
+    def text_key(text):
+        """
+        Hash a review text after normalization.
+
+        Only surrounding whitespace is stripped: TextBlob ignores it, whereas case
+        and punctuation change the scores and so must stay part of the key.
+        """
+        return hashlib.blake2b(str(text).strip().encode('utf-8'), digest_size=16).digest()
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def get_many(self, keys):
+        """Look up keys, returning {key: (polarity, subjectivity)} for the ones present."""
+        keys = list(keys)
+        found = {}
+        for i in range(0, len(keys), self._QUERY_BATCH):
+            batch = keys[i:i + self._QUERY_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.conn.execute(
+                f'SELECT key, polarity, subjectivity FROM sentiment WHERE key IN ({placeholders})',
+                batch
+            ).fetchall()
+            found.update((key, (polarity, subjectivity)) for key, polarity, subjectivity in rows)
+
+        if found:
+            # Mark hits as most recently used
+            clock = self._tick()
+            self.conn.executemany(
+                'UPDATE sentiment SET last_used = ? WHERE key = ?',
+                [(clock, key) for key in found]
+            )
+            self.conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Store {key: (polarity, subjectivity)} entries and evict beyond the size cap."""
+        clock = self._tick()
+        rows = [(key, float(polarity), float(subjectivity), clock) for key, (polarity, subjectivity) in items.items()]
+        # INSERT OR IGNORE counts only new rows; keys stored meanwhile (e.g. by another
+        # process) are updated separately, which leaves the entry count unchanged
+        inserted = self.conn.executemany(
+            'INSERT OR IGNORE INTO sentiment (key, polarity, subjectivity, last_used) VALUES (?, ?, ?, ?)', rows
+        ).rowcount
+        if inserted < len(rows):
+            self.conn.executemany(
+                'UPDATE sentiment SET polarity = ?, subjectivity = ?, last_used = ? WHERE key = ?',
+                [(polarity, subjectivity, last_used, key) for key, polarity, subjectivity, last_used in rows]
+            )
+        self._entries += inserted
+        self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        excess = self._entries - self.max_entries
+        if excess > 0:
+            deleted = self.conn.execute(
+                'DELETE FROM sentiment WHERE key IN '
+                '(SELECT key FROM sentiment ORDER BY last_used LIMIT ?)',
+                (excess,)
+            ).rowcount
+            self._entries -= deleted
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM sentiment').fetchone()[0]
+
+    def stats(self):
+        """Return hit/miss counters for this session."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self)
+        }
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,185 @@
+"""
+sentiment_inference.py
+
+This module implements batch inference over the full review corpus with the DistilBERT
+sentiment model fine-tuned by advanced_sentiment.py. The saved state dict is loaded into
+the base architecture once, optionally converted to dynamic int8 quantization for CPU
+(Linear layers, which hold most of the compute), and run under inference mode with the
+thread pool sized to the machine. Reviews are streamed from the processed store in
+chunks; each chunk is tokenized in one batched call and scored in length-bucketed,
+dynamically padded batches, so memory is bounded by the chunk size.
+
+Every review gets a predicted label and the three class probabilities, appended to
+advanced_sentiment/review_predictions_<timestamp>.csv keyed by Id, with reviews/s and
+tokens/s reported per chunk and for the whole run.
+
+Usage:
+    python sentiment_inference.py --chunksize 20000 --batch-size 64
+    python sentiment_inference.py --quantize --threads 8
+    python sentiment_inference.py --limit 5000
+
+Dependencies:
+- numpy
+- pandas
+- torch
+- transformers
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from artifact_registry import get_registry
+from pretokenized_dataset import PaddingStats, PretokenizedReviewDataset, batch_loader, tokenize_reviews
+from profiling import profile_stage, profile_step
+from review_store import artifact_name, iter_reviews, latest_processed_reviews
+from streaming_classifier import SENTIMENT_CLASSES
+
+MODEL_ARTIFACT = 'advanced_sentiment/sentiment_model'
+
+def configure_threads(n_threads=None):
+    """Use `n_threads` intra-op threads (default all cores) and a single inter-op thread."""
+    import torch
+    n_threads = n_threads or os.cpu_count() or 1
+    torch.set_num_threads(n_threads)
+    try:
+        # Batches run one after another, so parallelism within an op is what counts
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # can only be set before the first parallel op in the process
+    return n_threads
+
+def load_sentiment_model(path=None, model_name='distilbert-base-uncased', quantize=False):
+    """
+    The fine-tuned classifier in eval mode on CPU.
+
+    Args:
+        path: Saved state dict; defaults to the latest registered sentiment model
+        model_name: Base architecture the state dict was trained from
+        quantize: Apply dynamic int8 quantization to the Linear layers
+
+    Returns:
+        (model, path of the loaded state dict)
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    path = path or get_registry().resolve(MODEL_ARTIFACT, ('pth',))
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, num_labels=len(SENTIMENT_CLASSES))
+    model.load_state_dict(torch.load(path, map_location='cpu'))
+    model.eval()
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    print(f"Loaded sentiment model from {path}{' (dynamic int8)' if quantize else ''}")
+    return model, path
+
+def predict_tokenized(model, tokenized, batch_size=64, device='cpu', stats=None):
+    """
+    Class probabilities for TokenizedReviews, in their original order.
+
+    Batches are sorted by length and dynamically padded; token counts are added to
+    `stats` (a PaddingStats) if given.
+    """
+    import torch
+
+    loader = batch_loader(PretokenizedReviewDataset(tokenized), batch_size=batch_size, shuffle=False, stats=stats)
+    probabilities = np.zeros((len(tokenized), len(SENTIMENT_CLASSES)), dtype=np.float32)
+    model.eval()
+    with torch.inference_mode():
+        for batch in loader:
+            logits = model(input_ids=batch['input_ids'].to(device),
+                           attention_mask=batch['attention_mask'].to(device)).logits
+            probabilities[batch['indices'].numpy()] = torch.softmax(logits.float(), dim=-1).cpu().numpy()
+    return probabilities
+
+def prediction_frame(ids, probabilities):
+    """Per-review prediction columns: Id, predicted_sentiment and one probability per class."""
+    frame = pd.DataFrame({'Id': np.asarray(ids)})
+    frame['predicted_sentiment'] = SENTIMENT_CLASSES[probabilities.argmax(axis=1)]
+    for i, label in enumerate(SENTIMENT_CLASSES):
+        frame[f'prob_{label}'] = probabilities[:, i]
+    return frame
+
+def score_corpus(model_path=None, model_name='distilbert-base-uncased', chunksize=20000, batch_size=64,
+                 max_length=128, quantize=False, n_threads=None, limit=None, directory='advanced_sentiment'):
+    """
+    Score every processed review with the fine-tuned model.
+
+    Args:
+        model_path: Saved state dict (default the latest registered one)
+        model_name: Base model and tokenizer name
+        chunksize: Reviews read, tokenized and scored per chunk
+        batch_size: Reviews per forward pass
+        max_length: Truncation length in tokens
+        quantize: Use dynamic int8 quantization on CPU
+        n_threads: Torch intra-op threads (default all cores)
+        limit: Stop after this many reviews (for trial runs)
+        directory: Output directory
+
+    Returns:
+        Path of the predictions CSV
+    """
+    from transformers import AutoTokenizer
+
+    n_threads = configure_threads(n_threads)
+    with profile_step('load_model'):
+        model, model_path = load_sentiment_model(model_path, model_name, quantize)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_path = f'{directory}/review_predictions_{timestamp}.csv'
+    print(f"Scoring reviews with {n_threads} threads, batches of {batch_size}, max_length {max_length}...")
+
+    stats = PaddingStats(max_length)
+    n_rows = 0
+    start = time.perf_counter()
+    for chunk in iter_reviews(latest_processed_reviews(), ['Id', 'Text'], chunksize):
+        if limit is not None:
+            chunk = chunk.iloc[:limit - n_rows]
+        chunk_start = time.perf_counter()
+        with profile_step('tokenize', rows=len(chunk)):
+            tokenized = tokenize_reviews(chunk['Text'].fillna('').astype(str), tokenizer, max_length)
+        with profile_step('predict', rows=len(chunk)):
+            probabilities = predict_tokenized(model, tokenized, batch_size, stats=stats)
+        with profile_step('save', rows=len(chunk)):
+            prediction_frame(chunk['Id'], probabilities).to_csv(
+                output_path, mode='w' if n_rows == 0 else 'a', header=(n_rows == 0), index=False)
+        n_rows += len(chunk)
+        seconds = time.perf_counter() - chunk_start
+        print(f"Scored {n_rows} reviews ({len(chunk) / seconds:,.0f} reviews/s in this chunk)")
+        if limit is not None and n_rows >= limit:
+            break
+
+    elapsed = time.perf_counter() - start
+    print(f"Scored {n_rows} reviews in {elapsed:.1f}s ({n_rows / elapsed if elapsed else 0:,.0f} reviews/s)")
+    stats.report(elapsed, label="Inference: ")
+    get_registry().register(f'{directory}/review_predictions', output_path, 'advanced_inference', rows=n_rows,
+                            inputs=[artifact_name(), MODEL_ARTIFACT])
+    print(f"Predictions saved to {output_path}")
+    return output_path
+
+def main(argv=None):
+    """Command line entry point (`argv` defaults to sys.argv[1:])."""
+    parser = argparse.ArgumentParser(description="Score all processed reviews with the fine-tuned DistilBERT model.")
+    parser.add_argument('--model', default=None, help="Saved state dict (default the latest sentiment_model_*.pth)")
+    parser.add_argument('--model-name', default='distilbert-base-uncased', help="Base model and tokenizer")
+    parser.add_argument('--chunksize', type=int, default=20000, help="Reviews per streamed chunk")
+    parser.add_argument('--batch-size', type=int, default=64, help="Reviews per forward pass")
+    parser.add_argument('--max-length', type=int, default=128, help="Truncation length in tokens")
+    parser.add_argument('--quantize', action='store_true', help="Dynamic int8 quantization of Linear layers")
+    parser.add_argument('--threads', type=int, default=None, help="Torch threads (default all cores)")
+    parser.add_argument('--limit', type=int, default=None, help="Score only the first N reviews")
+    args = parser.parse_args(argv)
+
+    with profile_stage('advanced_inference'):
+        return score_corpus(args.model, args.model_name, args.chunksize, args.batch_size, args.max_length,
+                            args.quantize, args.threads, args.limit)
+
+if __name__ == "__main__":
+    main()
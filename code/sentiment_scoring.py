@@ -0,0 +1,120 @@
+"""
+sentiment_scoring.py
+
+This module implements batch sentiment scoring for review texts. Each review is parsed
+by TextBlob once to produce both polarity and subjectivity, and batches can be spread
+across a process pool while keeping output order deterministic. The 'lexicon' backend
+scores whole batches with the vectorized, TextBlob-compatible engine in polarity_engine.
+
+Dependencies:
+- numpy
+- textblob
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+def resolve_n_jobs(n_jobs):
+    """Resolve an n_jobs value (None, -1 or a positive count) to a worker count."""
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return max(1, n_jobs)
+
+def score_text(text):
+    """Return (polarity, subjectivity) for a single text from one TextBlob parse."""
+    from textblob import TextBlob  # cached after the first call; keeps module import cheap
+    sentiment = TextBlob(text).sentiment
+    return sentiment.polarity, sentiment.subjectivity
+
+SENTIMENT_BACKENDS = ('textblob', 'lexicon')
+
+def score_batch(texts, backend='textblob'):
+    """
+    Score a batch of texts with a backend; top-level so it can be sent to worker processes.
+
+    Returns:
+        Float array of shape (len(texts), 2) with polarity and subjectivity
+    """
+    if backend == 'lexicon':
+        from polarity_engine import score_batch as lexicon_score_batch
+        return lexicon_score_batch(texts)
+    if backend != 'textblob':
+        raise ValueError(f"Unknown sentiment backend '{backend}', expected one of {SENTIMENT_BACKENDS}")
+    return np.array([score_text(text) for text in texts], dtype=np.float64).reshape(len(texts), 2)
+
+def sentiment_pool(n_jobs):
+    """
+    Create a process pool for sentiment scoring, or None when running serially.
+
+    Callers that score many frames (e.g. the streaming pipeline) should create the
+    pool once and pass it to score_texts to avoid paying worker start-up per chunk.
+    """
+    n_workers = resolve_n_jobs(n_jobs)
+    return ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+
+def score_texts(texts, n_jobs=1, batch_size=5000, executor=None, cache=None, backend='textblob'):
+    """
+    Score texts for polarity and subjectivity.
+
+    Args:
+        texts: Iterable of review texts
+        n_jobs: Number of worker processes (-1 for all cores); ignored if executor is given
+        batch_size: Number of texts sent to a worker per task
+        executor: Optional existing pool from sentiment_pool
+        cache: Optional SentimentCache consulted before scoring; duplicate texts
+            within the batch are also scored only once
+        backend: 'textblob' or 'lexicon' (see polarity_engine)
+
+    Returns:
+        Float array of shape (len(texts), 2) with polarity and subjectivity, in input order
+    """
+    texts = list(texts)
+    if cache is None:
+        return _score_all(texts, n_jobs, batch_size, executor, backend)
+
+    # The lexicon backend's scores are cached under their own keys
+    keys = [cache.text_key(text if backend == 'textblob' else f'{backend}:{text}') for text in texts]
+    unique = dict(zip(keys, texts))
+    known = cache.get_many(unique)
+
+    missing = [key for key in unique if key not in known]
+    if missing:
+        missing_scores = _score_all([unique[key] for key in missing], n_jobs, batch_size, executor, backend)
+        new_entries = dict(zip(missing, map(tuple, missing_scores)))
+        cache.put_many(new_entries)
+        known.update(new_entries)
+
+    scores = np.empty((len(texts), 2), dtype=np.float64)
+    if texts:
+        scores[:] = [known[key] for key in keys]
+    return scores
+
+def _score_all(texts, n_jobs, batch_size, executor, backend='textblob'):
+    """Score every text in `texts`, serially or on a process pool."""
+    scores = np.empty((len(texts), 2), dtype=np.float64)
+    if not texts:
+        return scores
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    if executor is None and (resolve_n_jobs(n_jobs) == 1 or len(batches) == 1):
+        scores[:] = score_batch(texts, backend)
+        return scores
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=min(resolve_n_jobs(n_jobs), len(batches)))
+    try:
+        # Executor.map yields results in submission order, so output is deterministic
+        start = 0
+        for batch_scores in executor.map(score_batch, batches, [backend] * len(batches)):
+            scores[start:start + len(batch_scores)] = batch_scores
+            start += len(batch_scores)
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    return scores
@@ -0,0 +1,372 @@
+"""
+sentiment_server.py
+
+This module implements a local scoring service for the sentiment classifier saved by
+sentiment_analysis.py. The latest classifier and vectorizer are loaded once; request
+threads put their texts on a queue and a single batching thread drains it into
+micro-batches, so concurrent requests share one vectorized transform and predict_proba
+call. The batching window only opens when requests are actually arriving concurrently,
+so a lone request is not delayed. Latency percentiles and throughput counters are served
+at /stats.
+
+Endpoints (HTTP on localhost, or on a Unix socket):
+    POST /score   {"texts": ["...", ...]} or {"text": "..."}
+                  -> {"predictions": [{"label": ..., "probabilities": {label: p}}, ...]}
+    GET  /stats   latency percentiles (ms), request/text/batch counters and throughput;
+                  latency is server-side, from reading the request until the response
+                  is handed to the socket, so it excludes network and client time
+    GET  /health  {"status": "ok", "model": <classifier path>}
+
+Usage:
+    python sentiment_server.py --port 8765 --max-batch 256 --max-wait-ms 2
+    python sentiment_server.py --socket /tmp/sentiment.sock
+    python sentiment_server.py --load-test http://127.0.0.1:8765 --requests 5000 --concurrency 32
+
+Dependencies:
+- numpy
+- scikit-learn (to unpickle the saved models)
+"""
+
+import argparse
+import json
+import os
+import pickle
+import queue
+import signal
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from artifact_registry import get_registry
+
+def load_latest_models(directory='sentiment_analysis'):
+    """
+    Load the latest saved classifier and the vectorizer saved with it.
+
+    Returns:
+        (model, vectorizer, classifier path)
+
+    Raises:
+        FileNotFoundError: If sentiment_analysis.py has not saved a classifier
+    """
+    try:
+        model_path = get_registry().resolve(f'{directory}/sentiment_classifier', ('pkl',))
+    except FileNotFoundError:
+        raise FileNotFoundError("Sentiment classifier not found. Run sentiment_analysis.py first.")
+    vectorizer_path = model_path.replace('sentiment_classifier_', 'sentiment_vectorizer_')
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    with open(vectorizer_path, 'rb') as f:
+        vectorizer = pickle.load(f)
+    if isinstance(getattr(model, 'coef_', None), np.ndarray):
+        # Linear models score with X @ coef_.T; Fortran order makes that transpose
+        # C-contiguous, so scipy does not copy the (classes x 2**20) weights per call
+        model.coef_ = np.asfortranarray(model.coef_)
+    print(f"Loaded {model_path} and {vectorizer_path}")
+    return model, vectorizer, model_path
+
+class ServiceStats:
+    """
+    Thread-safe latency window and throughput counters.
+
+    Latencies are recorded once the response has been written to the socket; time the
+    response spends in transit or in the client is not included, so compare with the
+    client-side percentiles of load_test.
+    """
+
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    def record_request(self, seconds, n_texts):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.requests += 1
+            self.texts += n_texts
+
+    def record_batch(self, n_texts):
+        with self.lock:
+            self.batches += 1
+            self.batch_sizes.append(n_texts)
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def snapshot(self):
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            batch_sizes = np.array(self.batch_sizes)
+            uptime = time.perf_counter() - self.started
+            p50, p90, p99, p999 = np.percentile(latencies, [50, 90, 99, 99.9]) if len(latencies) else [None] * 4
+            return {
+                'uptime_seconds': uptime,
+                'requests': self.requests,
+                'texts': self.texts,
+                'batches': self.batches,
+                'errors': self.errors,
+                'requests_per_second': self.requests / uptime if uptime else None,
+                'texts_per_second': self.texts / uptime if uptime else None,
+                'mean_batch_texts': float(batch_sizes.mean()) if len(batch_sizes) else None,
+                'latency_ms': {
+                    'p50': p50, 'p90': p90, 'p99': p99, 'p999': p999,
+                    'max': float(latencies.max()) if len(latencies) else None,
+                    'window': len(latencies)
+                }
+            }
+
+class MicroBatcher:
+    """Collect concurrent scoring requests into batches served by one background thread."""
+
+    def __init__(self, model, vectorizer, max_batch_size=256, max_wait_ms=2.0, stats=None):
+        """
+        Args:
+            model: Fitted classifier with predict_proba and classes_
+            vectorizer: Fitted vectorizer with transform
+            max_batch_size: Texts per batch at most (a larger single request is its own batch)
+            max_wait_ms: Longest time a batch waits for more requests once it has one; only
+                applied while the previous batch combined several requests (i.e. under load)
+            stats: Optional ServiceStats receiving batch counters
+        """
+        self.model = model
+        self.vectorizer = vectorizer
+        self.classes = [str(label) for label in model.classes_]
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = stats
+        self.queue = queue.Queue()
+        self._concurrent = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        """Queue texts for scoring; returns a Future of an (n, n_classes) probability array."""
+        future = Future()
+        self.queue.put((list(texts), future))
+        return future
+
+    def score(self, texts, timeout=None):
+        """Blocking convenience wrapper around submit."""
+        return self.submit(texts).result(timeout)
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        size = len(batch[0][0])
+        deadline = time.perf_counter() + (self.max_wait if self._concurrent else 0.0)
+        while size < self.max_batch_size:
+            try:
+                # Take whatever is already queued without waiting, then wait out the window
+                remaining = deadline - time.perf_counter()
+                item = self.queue.get_nowait() if remaining <= 0 else self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        self._concurrent = len(batch) > 1
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for item, _ in batch for text in item]
+            try:
+                probabilities = self.model.predict_proba(self.vectorizer.transform(texts)) if texts else \
+                    np.empty((0, len(self.classes)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            if self.stats is not None:
+                self.stats.record_batch(len(texts))
+            start = 0
+            for item, future in batch:
+                future.set_result(probabilities[start:start + len(item)])
+                start += len(item)
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """JSON endpoints of the scoring service; the server carries batcher, stats and model path."""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, so clients can reuse connections
+    # Headers and body are separate writes; with Nagle's algorithm the body would wait
+    # for the client's delayed ACK of the headers (~40 ms per keep-alive response)
+    disable_nagle_algorithm = True
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send(200, self.server.stats.snapshot())
+        elif self.path == '/health':
+            self._send(200, {'status': 'ok', 'model': self.server.model_path})
+        else:
+            self._send(404, {'error': f'unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/score':
+            self._send(404, {'error': f'unknown path {self.path}'})
+            return
+        start = time.perf_counter()
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            texts = request['texts'] if 'texts' in request else [request['text']]
+            if not isinstance(texts, list):
+                raise ValueError("'texts' must be a list of strings")
+            texts = ['' if text is None else str(text) for text in texts]
+        except (ValueError, KeyError, TypeError) as e:
+            self.server.stats.record_error()
+            self._send(400, {'error': f'bad request: {e}'})
+            return
+
+        try:
+            probabilities = self.server.batcher.score(texts, timeout=30)
+        except Exception as e:
+            self.server.stats.record_error()
+            self._send(500, {'error': str(e)})
+            return
+        classes = self.server.batcher.classes
+        predictions = [
+            {'label': classes[int(np.argmax(row))], 'probabilities': dict(zip(classes, map(float, row)))}
+            for row in probabilities
+        ]
+        self._send(200, {'predictions': predictions})
+        self.server.stats.record_request(time.perf_counter() - start, len(texts))
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        # Per-request logging would dominate at high QPS; see /stats instead
+        pass
+
+class ScoringHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128  # many clients connect at once under load
+
+class UnixScoringHandler(ScoringHandler):
+    disable_nagle_algorithm = False  # TCP_NODELAY is a TCP option; Unix sockets have no Nagle delay
+
+class ScoringUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+def create_server(host='127.0.0.1', port=8765, socket_path=None, max_batch_size=256, max_wait_ms=2.0,
+                  directory='sentiment_analysis'):
+    """
+    Load the latest models and build (but do not start) the scoring server.
+
+    Serves HTTP on host:port, or on the Unix socket `socket_path` if given.
+    """
+    model, vectorizer, model_path = load_latest_models(directory)
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ScoringUnixServer(socket_path, UnixScoringHandler)
+    else:
+        server = ScoringHTTPServer((host, port), ScoringHandler)
+    server.stats = ServiceStats()
+    server.batcher = MicroBatcher(model, vectorizer, max_batch_size, max_wait_ms, server.stats)
+    server.model_path = model_path
+    return server
+
+def serve(host='127.0.0.1', port=8765, socket_path=None, max_batch_size=256, max_wait_ms=2.0,
+          directory='sentiment_analysis'):
+    """Run the scoring server until interrupted."""
+    server = create_server(host, port, socket_path, max_batch_size, max_wait_ms, directory)
+    where = socket_path or f'http://{host}:{port}'
+    print(f"Serving sentiment scores on {where} (max batch {max_batch_size}, window {max_wait_ms} ms)")
+    # Stop cleanly on SIGTERM too; shutdown() must be called from another thread
+    signal.signal(signal.SIGTERM, lambda *args: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+        print(json.dumps(server.stats.snapshot(), indent=2))
+
+def load_test(url='http://127.0.0.1:8765', n_requests=2000, concurrency=16, texts_per_request=1):
+    """
+    Send concurrent single-review requests over keep-alive connections and report
+    client-side throughput and latency percentiles (ms).
+    """
+    import http.client
+    from urllib.parse import urlparse
+
+    target = urlparse(url)
+    sample = ["Great taste, my kids love it and the price is right.",
+              "Arrived stale and the box was damaged. Very disappointed.",
+              "It is okay, nothing special but not bad either."]
+    latencies = []
+    lock = threading.Lock()
+    per_worker = n_requests // concurrency
+
+    def worker(seed):
+        conn = http.client.HTTPConnection(target.hostname, target.port)
+        local = []
+        for i in range(per_worker):
+            body = json.dumps({'texts': [sample[(seed + i) % len(sample)]] * texts_per_request})
+            start = time.perf_counter()
+            conn.request('POST', '/score', body, {'Content-Type': 'application/json'})
+            conn.getresponse().read()
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    result = {
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+        'latency_ms': dict(zip(['p50', 'p90', 'p99'], np.percentile(latencies, [50, 90, 99]).tolist()))
+    }
+    print(json.dumps(result, indent=2))
+    return result
+
+def main(argv=None):
+    """Command line entry point (`argv` defaults to sys.argv[1:])."""
+    parser = argparse.ArgumentParser(description="Serve the saved sentiment classifier.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', default=None, help="Serve on this Unix socket instead of TCP")
+    parser.add_argument('--max-batch', type=int, default=256, help="Texts per micro-batch at most")
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help="Batching window under concurrent load")
+    parser.add_argument('--directory', default='sentiment_analysis', help="Directory of the saved models")
+    parser.add_argument('--load-test', metavar='URL', default=None, help="Load-test a running server instead")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        return load_test(args.load_test, args.requests, args.concurrency)
+    serve(args.host, args.port, args.socket, args.max_batch, args.max_wait_ms, args.directory)
+
+if __name__ == "__main__":
+    main()
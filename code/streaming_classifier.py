@@ -0,0 +1,159 @@
+"""
+streaming_classifier.py
+
+This module implements out-of-core training of the rating-based sentiment classifier.
+Review batches are streamed from the processed reviews, hashed into a fixed feature space
+(so there is no vocabulary to fit or hold) and fed to a linear model with partial_fit.
+A deterministic share of reviews, chosen by Id, is held out and scored as a second stream,
+so the evaluation does not depend on batch order or require a shuffled copy of the data.
+Hashing runs in worker processes while the main process trains; memory stays bounded by
+the number of batches in flight and time grows linearly with the corpus.
+
+The fitted model and vectorizer are drop-in replacements for the random forest and
+TF-IDF vectorizer of SentimentAnalyzer: both support predict and predict_proba.
+
+Dependencies:
+- numpy
+- pandas
+- scikit-learn
+"""
+
+import numpy as np
+import pandas as pd
+
+from sentiment_scoring import resolve_n_jobs
+
+# hashed_features (which loads scikit-learn) is imported where batches are streamed, so
+# modules that only need the label helpers stay fast to import.
+
+SENTIMENT_CLASSES = np.array(['negative', 'neutral', 'positive'], dtype=object)
+
+def rating_labels(ratings):
+    """Map star ratings to sentiment labels (1-2 negative, 3 neutral, 4-5 positive)."""
+    labels = pd.cut(pd.Series(ratings), bins=[-np.inf, 2, 3, np.inf], labels=list(SENTIMENT_CLASSES))
+    return labels.astype(object).to_numpy()
+
+def held_out_mask(ids, fraction):
+    """Stable held-out split by review Id (multiplicative hash), independent of batch order."""
+    ids = np.asarray(ids, dtype=np.uint64)
+    hashed = (ids * np.uint64(2654435761)) % np.uint64(2 ** 32)
+    return hashed < np.uint64(int(fraction * 2 ** 32))
+
+def make_streaming_vectorizer(n_features=2 ** 20):
+    """Stateless word and bigram hashing vectorizer with l2-normalized rows."""
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(n_features=n_features, ngram_range=(1, 2), alternate_sign=False, norm='l2')
+
+def _hash_batch(batch, vectorizer, held_out_fraction):
+    """Hash one review batch and split it; top-level so it can run in worker processes."""
+    texts = batch['Text'].fillna('').astype(str)
+    labels = rating_labels(batch['Score'])
+    held_out = held_out_mask(batch['Id'], held_out_fraction)
+    features = vectorizer.transform(texts)
+    return features[~held_out], labels[~held_out], features[held_out], labels[held_out]
+
+class StreamingSentimentTrainer:
+    """Train an SGD logistic regression on hashed review batches with a held-out stream."""
+
+    def __init__(self, n_features=2 ** 20, alpha=1e-6, held_out_fraction=0.2, epochs=1, n_jobs=1):
+        """
+        Args:
+            n_features: Size of the hashed feature space
+            alpha: L2 regularization strength of the SGD model
+            held_out_fraction: Share of reviews (by Id) kept out of training for evaluation
+            epochs: Passes over the training stream
+            n_jobs: Hashing worker processes (-1 for all cores)
+        """
+        from sklearn.linear_model import SGDClassifier
+        self.vectorizer = make_streaming_vectorizer(n_features)
+        self.model = SGDClassifier(loss='log_loss', alpha=alpha, random_state=42)
+        self.held_out_fraction = held_out_fraction
+        self.epochs = epochs
+        self.n_jobs = n_jobs
+
+    def _stream(self, batches, executor):
+        from hashed_features import _ordered_map
+        return _ordered_map(executor, _hash_batch, batches, self.vectorizer, self.held_out_fraction,
+                            max_pending=2 * resolve_n_jobs(self.n_jobs))
+
+    def fit(self, make_batches):
+        """
+        Train on the streamed batches.
+
+        Held-out batches of the last epoch are scored as they stream past, i.e. by the
+        model part-way through training (progressive validation). That is a cheap
+        running estimate, not the accuracy of the final model; use evaluate() for that.
+
+        Args:
+            make_batches: Callable returning a fresh iterator of DataFrames with Id, Text
+                and Score (called once per epoch)
+
+        Returns:
+            Dict of progressive-validation metrics: accuracy, per-class recall, confusion
+            matrix (rows true, columns predicted, in SENTIMENT_CLASSES order) and row counts
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        n_workers = resolve_n_jobs(self.n_jobs)
+        executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+        confusion = np.zeros((len(SENTIMENT_CLASSES), len(SENTIMENT_CLASSES)), dtype=np.int64)
+        train_rows = 0
+        try:
+            for epoch in range(self.epochs):
+                last_epoch = epoch == self.epochs - 1
+                for X_train, y_train, X_test, y_test in self._stream(make_batches(), executor):
+                    if len(y_train):
+                        self.model.partial_fit(X_train, y_train, classes=SENTIMENT_CLASSES)
+                    if epoch == 0:
+                        train_rows += len(y_train)
+                    # Held-out batches are scored as they stream past in the last epoch,
+                    # i.e. by the model as trained up to that point (progressive validation)
+                    if last_epoch and len(y_test) and hasattr(self.model, 'coef_'):
+                        confusion += self._confusion(y_test, self.model.predict(X_test))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return self._metrics(confusion, train_rows)
+
+    def evaluate(self, make_batches):
+        """
+        Score the final model on the held-out reviews of a fresh stream.
+
+        Returns:
+            Dict of metrics in the format of fit() (train_rows is None)
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        n_workers = resolve_n_jobs(self.n_jobs)
+        executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+        confusion = np.zeros((len(SENTIMENT_CLASSES), len(SENTIMENT_CLASSES)), dtype=np.int64)
+        try:
+            for _, _, X_test, y_test in self._stream(make_batches(), executor):
+                if len(y_test):
+                    confusion += self._confusion(y_test, self.model.predict(X_test))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return self._metrics(confusion, None)
+
+    @staticmethod
+    def _confusion(y_true, y_pred):
+        index = {label: i for i, label in enumerate(SENTIMENT_CLASSES)}
+        true = np.array([index[label] for label in y_true])
+        pred = np.array([index[label] for label in y_pred])
+        return np.bincount(true * len(SENTIMENT_CLASSES) + pred,
+                           minlength=len(SENTIMENT_CLASSES) ** 2).reshape(len(SENTIMENT_CLASSES), -1)
+
+    @staticmethod
+    def _metrics(confusion, train_rows):
+        test_rows = int(confusion.sum())
+        support = confusion.sum(axis=1)
+        return {
+            'accuracy': float(np.trace(confusion) / test_rows) if test_rows else float('nan'),
+            'recall': {label: float(confusion[i, i] / support[i]) if support[i] else float('nan')
+                       for i, label in enumerate(SENTIMENT_CLASSES)},
+            'confusion': confusion.tolist(),
+            'train_rows': train_rows,
+            'test_rows': test_rows
+        }
@@ -0,0 +1,68 @@
+"""
+test_polarity_engine.py
+
+Equivalence test of the lexicon polarity engine against TextBlob on fixed review
+strings that exercise each of pattern's assessment rules: intensifiers, negation,
+exclamation marks, emoticons, the "(!)" sarcasm mark and HTML line breaks. The engine
+reproduces TextBlob exactly on these, so any tokenizer or rule change that drifts
+fails here.
+
+Usage:
+    python -m pytest test_polarity_engine.py
+
+Dependencies:
+- pytest
+- textblob
+"""
+
+import pytest
+
+pytest.importorskip('textblob')
+
+from polarity_engine import check_equivalence, score_batch
+
+REVIEWS = [
+    # Plain and intensified opinions
+    "Great taste, my kids love it and the price is right.",
+    "This coffee is very good and really fresh.",
+    "Extremely bitter aftertaste, super disappointing.",
+    "The most amazing dog food I have ever bought.",
+    "It is okay, nothing special but not bad either.",
+    # Negation
+    "Not good at all.",
+    "I don't think this is a great product.",
+    "Never again, not worth the money.",
+    "Not very tasty, and not too sweet either.",
+    # Exclamation marks
+    "Love it!!!",
+    "Terrible!",
+    "Best chips ever! Highly recommended!!",
+    # Emoticons
+    "Arrived fast :) very happy",
+    "Box was crushed :( sad",
+    "Tastes like cardboard :-( but the kids ate it ;)",
+    "Just ok <3",
+    # Sarcasm mark
+    "Oh great, another stale bag (!)",
+    "Wonderful packaging (!) everything was broken",
+    # HTML line breaks and markup left in raw reviews
+    "Good flavor.<br /><br />Bad packaging, though.<br />Would buy again.",
+    "<a href=\"http://www.amazon.com/gp/product/B000\">this one</a> is awful",
+    # No opinion words, empty and whitespace
+    "I bought this for my office.",
+    "",
+    "   ",
+    # Mixed case, numbers and punctuation inside words
+    "GREAT value for $4.99 - well-made, five-star stuff...",
+    "The 2nd box wasn't as good as the 1st one; still, it's decent.",
+]
+
+def test_matches_textblob_on_fixed_reviews():
+    report = check_equivalence(REVIEWS, tolerance=1e-9, share=1.0)
+    assert report['texts'] == len(REVIEWS)
+
+def test_scores_shape_and_range():
+    scores = score_batch(REVIEWS)
+    assert scores.shape == (len(REVIEWS), 2)
+    assert ((scores[:, 0] >= -1) & (scores[:, 0] <= 1)).all()
+    assert ((scores[:, 1] >= 0) & (scores[:, 1] <= 1)).all()
@@ -0,0 +1,95 @@
+"""
+text_normalization.py
+
+This module implements batch text normalization for review columns. A normalizer is an
+ordered set of rules, each applied to a whole pandas Series at once, so the regular
+expressions are compiled once and ASCII text is handled by vectorized string ops.
+
+Dependencies:
+- scikit-learn
+"""
+
+import re
+
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+
+# ASCII characters matched by PUNCTUATION_PATTERN, found by testing each code point
+# against it so the two agree by construction. Spelled as explicit \xHH escapes, the
+# class means the same thing to Python's re and to the RE2 engine behind pandas'
+# pyarrow-backed string methods (whose \w and \s differ from Python's).
+_ASCII_PUNCTUATION_CLASS = '[' + ''.join(
+    '\\x%02x' % code for code in range(128) if PUNCTUATION_PATTERN.match(chr(code))
+) + ']'
+
+def lowercase(series):
+    """
+    Lowercase every value.
+
+    The vectorized lower() of pyarrow-backed strings maps each character on its own,
+    so rows holding non-ASCII text are redone with str.lower, which is context-aware
+    (e.g. a word-final capital sigma becomes 'ς', not 'σ').
+    """
+    lowered = series.str.lower()
+    non_ascii = ~series.str.isascii()
+    if non_ascii.any():
+        lowered[non_ascii] = series[non_ascii].map(str.lower)
+    return lowered
+
+def strip_punctuation(series):
+    """
+    Remove every character that is neither a word character nor whitespace.
+
+    All rows go through one vectorized replace with the ASCII class; rows holding
+    non-ASCII text are then redone with the Unicode-aware Python pattern.
+    """
+    stripped = series.str.replace(_ASCII_PUNCTUATION_CLASS, '', regex=True)
+    non_ascii = ~series.str.isascii()
+    if non_ascii.any():
+        stripped[non_ascii] = series[non_ascii].map(lambda text: PUNCTUATION_PATTERN.sub('', text))
+    return stripped
+
+def remove_stop_words(stop_words='english'):
+    """
+    Build a rule that drops stop words ('english' for scikit-learn's list). Note that the
+    remaining tokens are re-joined with single spaces, so whitespace is collapsed as a side effect.
+    """
+    if isinstance(stop_words, str) and stop_words == 'english':
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+        stop_words = ENGLISH_STOP_WORDS
+    stop_words = frozenset(stop_words)
+
+    def rule(series):
+        return series.map(lambda text: ' '.join(w for w in text.split() if w not in stop_words))
+
+    return rule
+
+DEFAULT_RULES = (lowercase, strip_punctuation)
+
+class TextNormalizer:
+    """Apply an ordered list of Series -> Series rules to text columns."""
+
+    def __init__(self, rules=DEFAULT_RULES, stop_words=None):
+        """
+        Args:
+            rules: Sequence of callables taking and returning a string Series
+            stop_words: Optional stop word collection; if given, stop word removal
+                is appended to the rules
+        """
+        self.rules = list(rules)
+        if stop_words is not None:
+            self.rules.append(remove_stop_words(stop_words))
+
+    def normalize(self, series):
+        """Normalize a string Series, returning a new Series with the same index."""
+        series = series.astype(str)
+        for rule in self.rules:
+            series = rule(series)
+        return series
+
+    def normalize_columns(self, df, columns):
+        """Normalize several columns, returning {column: normalized Series}."""
+        return {column: self.normalize(df[column]) for column in columns}
+
+def normalize_text(series):
+    """Normalize with the default rules (lowercase, strip punctuation)."""
+    return TextNormalizer().normalize(series)
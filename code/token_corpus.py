@@ -0,0 +1,259 @@
+"""
+token_corpus.py
+
+This module implements a tokenize-once corpus artifact shared by the gensim and scikit-learn
+consumers. clean_text is split into tokens a single time and stored as one flat int32 array
+of token ids plus int64 document offsets (both memory-mappable) and one shared vocabulary
+with term and document frequencies. Adapters stream it to gensim as a BoW corpus and to
+scikit-learn as CSR count or TF-IDF matrices without tokenizing again.
+
+Dependencies:
+- numpy
+- pandas
+- scipy
+- scikit-learn
+- gensim (optional, for the gensim adapters)
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from artifact_registry import get_registry
+
+# scipy and scikit-learn are only needed by the scikit-learn adapters and are imported there
+
+def build_token_corpus(chunks, timestamp, directory='processed_data'):
+    """
+    Tokenize text chunks once and write the corpus files.
+
+    Args:
+        chunks: Iterable of lists of clean_text strings; tokens are whitespace-separated
+        timestamp: Run timestamp used in the file names
+        directory: Output directory
+
+    Returns:
+        Path of the corpus descriptor (JSON) for TokenCorpus.load
+    """
+    base = f'{directory}/token_corpus_{timestamp}'
+    vocab = {}
+    term_freq = np.zeros(0, dtype=np.int64)
+    doc_freq = np.zeros(0, dtype=np.int64)
+    offsets = [np.zeros(1, dtype=np.int64)]
+    n_tokens = 0
+
+    with open(f'{base}.tokens.bin', 'wb') as token_file:
+        for chunk in chunks:
+            doc_ids = [[vocab.setdefault(token, len(vocab)) for token in text.split()] for text in chunk]
+            lengths = np.fromiter(map(len, doc_ids), dtype=np.int64, count=len(doc_ids))
+            ids = np.fromiter((i for doc in doc_ids for i in doc), dtype=np.int32, count=int(lengths.sum()))
+            token_file.write(ids.tobytes())
+            offsets.append(n_tokens + np.cumsum(lengths))
+            n_tokens += len(ids)
+
+            # Grow the frequency tables to the vocabulary size, then count this chunk
+            n_terms = len(vocab)
+            term_freq = np.concatenate([term_freq, np.zeros(n_terms - len(term_freq), dtype=np.int64)])
+            doc_freq = np.concatenate([doc_freq, np.zeros(n_terms - len(doc_freq), dtype=np.int64)])
+            term_freq += np.bincount(ids, minlength=n_terms)
+            doc_index = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+            doc_terms = np.unique(doc_index * n_terms + ids) % n_terms
+            doc_freq += np.bincount(doc_terms, minlength=n_terms)
+
+    offsets = np.concatenate(offsets)
+    np.save(f'{base}.offsets.npy', offsets)
+    pd.DataFrame({
+        'term': sorted(vocab, key=vocab.get),
+        'tf': term_freq,
+        'df': doc_freq
+    }).to_csv(f'{base}.vocab.csv', index=False)
+
+    descriptor = {
+        'tokens': f'{base}.tokens.bin',
+        'offsets': f'{base}.offsets.npy',
+        'vocab': f'{base}.vocab.csv',
+        'n_docs': len(offsets) - 1,
+        'n_tokens': int(n_tokens),
+        'n_terms': len(vocab)
+    }
+    with open(f'{base}.json', 'w') as f:
+        json.dump(descriptor, f, indent=2)
+    return f'{base}.json'
+
+class TokenCorpus:
+    """Memory-mapped token-id corpus with a shared vocabulary."""
+
+    def __init__(self, tokens, offsets, vocab):
+        """
+        Args:
+            tokens: Flat int32 array of token ids
+            offsets: int64 array of length n_docs + 1; document i is tokens[offsets[i]:offsets[i+1]]
+            vocab: DataFrame with term, tf and df, indexed by token id
+        """
+        self.tokens = tokens
+        self.offsets = offsets
+        self.vocab = vocab
+        self.terms = vocab['term'].tolist()
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open a corpus from its descriptor; token and offset arrays are memory-mapped."""
+        with open(path) as f:
+            descriptor = json.load(f)
+        mode = 'r' if mmap else None
+        if descriptor['n_tokens']:
+            tokens = np.memmap(descriptor['tokens'], dtype=np.int32, mode='r')
+            tokens = tokens if mmap else np.array(tokens)
+        else:
+            tokens = np.zeros(0, dtype=np.int32)
+        offsets = np.load(descriptor['offsets'], mmap_mode=mode)
+        # Terms such as 'nan' or 'null' must stay strings
+        vocab = pd.read_csv(descriptor['vocab'], keep_default_na=False, dtype={'term': str})
+        return cls(tokens, offsets, vocab)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def document(self, i):
+        """Token ids of document i."""
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def texts(self):
+        """Re-iterable view yielding each document as a list of token strings."""
+        return _TokenTexts(self)
+
+    # gensim adapters
+
+    def gensim_dictionary(self):
+        """gensim Dictionary whose ids are this corpus' token ids."""
+        from gensim.corpora import Dictionary
+        dictionary = Dictionary()
+        dictionary.token2id = {term: i for i, term in enumerate(self.terms)}
+        dictionary.dfs = dict(enumerate(self.vocab['df'].astype(int).tolist()))
+        dictionary.cfs = dict(enumerate(self.vocab['tf'].astype(int).tolist()))
+        dictionary.num_docs = len(self)
+        dictionary.num_pos = int(self.vocab['tf'].sum())
+        dictionary.num_nnz = int(self.vocab['df'].sum())
+        return dictionary
+
+    def gensim_corpus(self):
+        """Re-iterable, streamed BoW corpus of [(token_id, count), ...] per document."""
+        return _BowCorpus(self)
+
+    # scikit-learn adapters
+
+    def feature_columns(self, min_length=2, stop_words=None, max_features=None):
+        """
+        Select vocabulary terms the way CountVectorizer would on clean_text.
+
+        Whitespace tokens of clean_text contain only word characters, so sklearn's
+        default token pattern keeps exactly the tokens of at least two characters.
+
+        Returns:
+            (column per token id, -1 for dropped; feature names in column order)
+        """
+        terms = self.vocab['term']
+        keep = terms.str.len() >= min_length
+        if stop_words is not None:
+            keep &= ~terms.isin(frozenset(stop_words))
+        # CountVectorizer sorts the vocabulary, then keeps the most frequent terms with
+        # (-tfs).argsort(); its default, non-stable sort decides ties at the cutoff, so the
+        # same call over the same term-sorted int64 counts is needed to match it
+        candidates = self.vocab[keep].sort_values('term', kind='stable')
+        if max_features is not None:
+            order = np.argsort(-candidates['tf'].to_numpy(dtype=np.int64))[:max_features]
+            candidates = candidates.iloc[order].sort_values('term', kind='stable')
+        column = np.full(len(self.vocab), -1, dtype=np.int64)
+        column[candidates.index.to_numpy()] = np.arange(len(candidates))
+        return column, candidates['term'].to_numpy(dtype=object)
+
+    def to_csr(self, min_length=2, stop_words=None, max_features=None, block_docs=100000):
+        """
+        Document-term count matrix equivalent to CountVectorizer on clean_text.
+
+        Built in blocks of `block_docs` documents to bound memory.
+
+        Returns:
+            (CSR count matrix, feature names)
+        """
+        import scipy.sparse as sparse
+
+        column, feature_names = self.feature_columns(min_length, stop_words, max_features)
+        blocks = []
+        for start in range(0, len(self), block_docs):
+            stop = min(start + block_docs, len(self))
+            ids = np.asarray(self.tokens[self.offsets[start]:self.offsets[stop]])
+            doc_index = np.repeat(np.arange(stop - start), np.diff(np.asarray(self.offsets[start:stop + 1])))
+            cols = column[ids]
+            kept = cols >= 0
+            block = sparse.csr_matrix(
+                (np.ones(kept.sum(), dtype=np.int64), (doc_index[kept], cols[kept])),
+                shape=(stop - start, len(feature_names))
+            )
+            block.sum_duplicates()
+            blocks.append(block)
+        if not blocks:
+            return sparse.csr_matrix((0, len(feature_names)), dtype=np.int64), feature_names
+        return sparse.vstack(blocks, format='csr'), feature_names
+
+    def to_tfidf(self, stop_words='english', max_features=1000):
+        """
+        TF-IDF matrix equivalent to TfidfVectorizer on clean_text, with feature names.
+
+        `stop_words` is a collection of words or 'english' for scikit-learn's list.
+        """
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfTransformer
+
+        if stop_words == 'english':
+            stop_words = ENGLISH_STOP_WORDS
+        counts, feature_names = self.to_csr(stop_words=stop_words, max_features=max_features)
+        return TfidfTransformer().fit_transform(counts), feature_names
+
+class _TokenTexts:
+    def __init__(self, corpus):
+        self.corpus = corpus
+
+    def __len__(self):
+        return len(self.corpus)
+
+    def __iter__(self):
+        terms = self.corpus.terms
+        for i in range(len(self.corpus)):
+            yield [terms[t] for t in self.corpus.document(i)]
+
+class _BowCorpus:
+    def __init__(self, corpus):
+        self.corpus = corpus
+
+    def __len__(self):
+        return len(self.corpus)
+
+    def __iter__(self):
+        for i in range(len(self.corpus)):
+            ids, counts = np.unique(self.corpus.document(i), return_counts=True)
+            yield list(zip(ids.tolist(), counts.tolist()))
+
+def register_token_corpus(path, corpus, directory='processed_data'):
+    """Register a built corpus with the artifact registry, keeping the loaded handle."""
+    get_registry().register(f'{directory}/token_corpus', path, 'process', rows=len(corpus),
+                            inputs=[f'{directory}/processed_reviews'], handle=corpus)
+
+def load_token_corpus(directory='processed_data'):
+    """
+    The current token corpus (in-memory handle if built in this process), or None.
+
+    None is also returned when the corpus was built from other processed reviews than
+    the current ones (e.g. after an incremental run rewrote them), so callers fall back
+    to splitting clean_text instead of using stale tokens.
+    """
+    registry = get_registry()
+    if registry.find(f'{directory}/token_corpus', ('json',)) is None:
+        return None
+    record = registry.record(f'{directory}/token_corpus')
+    reviews = registry.record(f'{directory}/processed_reviews')
+    if record is not None and reviews is not None and \
+            record['inputs'].get(f'{directory}/processed_reviews') != reviews['fingerprint']:
+        print("Token corpus is older than the processed reviews; not using it")
+        return None
+    return registry.load(f'{directory}/token_corpus', TokenCorpus.load, ('json',))
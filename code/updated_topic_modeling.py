@@ -9,24 +9,22 @@ Dependencies:
 - pandas
 - sklearn
 - gensim
-- pyLDAvis
 """
 
 import numpy as np
 import pandas as pd
-from sklearn.decomposition import LatentDirichletAllocation
-import pyLDAvis
-from gensim.models import CoherenceModel
-from gensim.corpora import Dictionary
-from gensim.models.ldamodel import LdaModel
 import pickle
 import os
 from datetime import datetime
-import scipy.sparse as sparse
-import glob
-from sklearn.feature_extraction.text import CountVectorizer
+from review_store import artifact_name, load_processed_reviews
+from artifact_registry import get_registry
+from token_corpus import load_token_corpus
+from profiling import profile_stage, profile_step
 import warnings
 
+# gensim, scikit-learn and scipy are imported where they are used, so importing this
+# module (e.g. for the CLI) stays fast.
+
 # Suppress warnings
 warnings.filterwarnings('ignore', message=".*OpenSSL.*")
 warnings.filterwarnings('ignore', category=UserWarning)
@@ -38,33 +36,41 @@ class TopicModeler:
         self.max_topics = max_topics
         self.max_iter = max_iter
         self.random_state = random_state
-        self.vectorizer = CountVectorizer(max_features=1000)
+        self._vectorizer = None
         self.best_model = None
         self.optimal_topics = None
         self.coherence_scores = {}
         
+    @property
+    def vectorizer(self):
+        """Count vectorizer, created on first use (imports scikit-learn)."""
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import CountVectorizer
+            self._vectorizer = CountVectorizer(max_features=1000)
+        return self._vectorizer
+
     def load_processed_data(self):
-        """Load the most recently processed data files."""
-        processed_files = glob.glob('processed_data/processed_reviews_*.csv')
-        feature_files = glob.glob('processed_data/text_features_*.npz')
-        names_files = glob.glob('processed_data/feature_names_*.csv')
-        
-        if not (processed_files and feature_files and names_files):
+        """Load the current processed data files through the artifact registry."""
+        import scipy.sparse as sparse
+        registry = get_registry()
+        try:
+            text_features = registry.load('processed_data/text_features', sparse.load_npz, ('npz',))
+            feature_names = registry.load('processed_data/feature_names',
+                                          lambda path: pd.read_csv(path).iloc[:, 0].tolist())
+        except FileNotFoundError:
             raise FileNotFoundError("Processed data files not found. Run amazon_review_processor.py first.")
-            
-        latest_processed = max(processed_files)
-        latest_features = max(feature_files)
-        latest_names = max(names_files)
         
-        df = pd.read_csv(latest_processed)
-        text_features = sparse.load_npz(latest_features)
-        feature_names = pd.read_csv(latest_names).iloc[:, 0].tolist()
+        # Only the cleaned text and sentiment are needed from the review frame
+        df = load_processed_reviews(columns=['clean_text', 'sentiment_score'])
+        df['clean_text'] = df['clean_text'].fillna('')
         
-        print(f"Loaded processed data from: {latest_processed}")
         return df, text_features, feature_names
 
     def compute_coherence_values(self, texts, dictionary, corpus, step=5):
         """Compute coherence scores for different numbers of topics."""
+        from gensim.models import CoherenceModel
+        from gensim.models.ldamodel import LdaModel
+        
         for num_topics in range(self.min_topics, self.max_topics + 1, step):
             print(f"Computing coherence for {num_topics} topics...")
             lda_model = LdaModel(
@@ -85,14 +91,26 @@ class TopicModeler:
         
         return self.coherence_scores
 
-    def find_optimal_topics(self, df):
-        """Find the optimal number of topics using coherence scores."""
+    def find_optimal_topics(self, df, token_corpus=None):
+        """
+        Find the optimal number of topics using coherence scores.
+        
+        If the processor's token corpus is given, the dictionary, BoW corpus and
+        coherence texts are streamed from it instead of re-splitting clean_text.
+        """
         print("Finding optimal number of topics...")
         
-        # Prepare texts for coherence calculation
-        texts = [text.split() for text in df['clean_text']]
-        dictionary = Dictionary(texts)
-        corpus = [dictionary.doc2bow(text) for text in texts]
+        if token_corpus is not None and len(token_corpus) == len(df):
+            texts = token_corpus.texts()
+            dictionary = token_corpus.gensim_dictionary()
+            corpus = token_corpus.gensim_corpus()
+        else:
+            from gensim.corpora import Dictionary
+            
+            # Prepare texts for coherence calculation
+            texts = [text.split() for text in df['clean_text']]
+            dictionary = Dictionary(texts)
+            corpus = [dictionary.doc2bow(text) for text in texts]
         
         # Compute coherence scores
         self.coherence_scores = self.compute_coherence_values(texts, dictionary, corpus)
@@ -109,6 +127,8 @@ class TopicModeler:
             print("Warning: Using default number of topics. Run find_optimal_topics first for better results.")
             self.optimal_topics = 10
             
+        from sklearn.decomposition import LatentDirichletAllocation
+        
         print(f"Fitting LDA model with {self.optimal_topics} topics...")
         self.lda_model = LatentDirichletAllocation(
             n_components=self.optimal_topics,
@@ -162,18 +182,30 @@ class TopicModeler:
         )
         topic_distributions.to_csv(f'topic_models/topic_distributions_{timestamp}.csv', index=False)
         
+        registry = get_registry()
+        inputs = [artifact_name(), 'processed_data/text_features', 'processed_data/feature_names']
+        registry.register('topic_models/topic_distributions',
+                          f'topic_models/topic_distributions_{timestamp}.csv', 'topics',
+                          data=topic_distributions, inputs=inputs, handle=topic_distributions)
+        
         # Save top terms for each topic
         top_terms = self.get_top_terms_per_topic(feature_names)
         with open(f'topic_models/top_terms_{timestamp}.txt', 'w') as f:
             for topic, terms in top_terms.items():
                 f.write(f"{topic}:\n{', '.join(terms)}\n\n")
+        registry.register('topic_models/top_terms', f'topic_models/top_terms_{timestamp}.txt',
+                          'topics', inputs=inputs, rows=len(top_terms))
         
         # Save coherence scores
         if self.coherence_scores:
-            pd.DataFrame({
+            coherence_scores = pd.DataFrame({
                 'n_topics': list(self.coherence_scores.keys()),
                 'coherence_score': list(self.coherence_scores.values())
-            }).to_csv(f'topic_models/coherence_scores_{timestamp}.csv', index=False)
+            })
+            coherence_scores.to_csv(f'topic_models/coherence_scores_{timestamp}.csv', index=False)
+            registry.register('topic_models/coherence_scores',
+                              f'topic_models/coherence_scores_{timestamp}.csv', 'topics',
+                              data=coherence_scores, inputs=inputs, handle=coherence_scores)
         
         print(f"Results saved in topic_models directory with timestamp {timestamp}")
 
@@ -184,13 +216,17 @@ def main():
         modeler = TopicModeler(min_topics=5, max_topics=15)
         
         # Load processed data
-        df, text_features, feature_names = modeler.load_processed_data()
+        with profile_step('load') as step:
+            df, text_features, feature_names = modeler.load_processed_data()
+            step['rows'] = len(df)
         
-        # Find optimal number of topics
-        optimal_topics = modeler.find_optimal_topics(df)
+        # Find optimal number of topics from the shared token corpus if the processor built one
+        with profile_step('lda_sweep', rows=len(df)):
+            optimal_topics = modeler.find_optimal_topics(df, load_token_corpus())
         
         # Fit model
-        document_topics = modeler.fit(text_features)
+        with profile_step('lda_fit', rows=text_features.shape[0]):
+            document_topics = modeler.fit(text_features)
         
         # Print top terms
         top_terms = modeler.get_top_terms_per_topic(feature_names)
@@ -200,7 +236,8 @@ def main():
             print(", ".join(terms))
         
         # Save all results
-        modeler.save_results(df, text_features, feature_names)
+        with profile_step('save'):
+            modeler.save_results(df, text_features, feature_names)
         
         print("\nEnhanced topic modeling completed successfully!")
         
@@ -209,4 +246,5 @@ def main():
         raise e
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile_stage('topics'):
+        main()
\ No newline at end of file
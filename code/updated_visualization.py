@@ -16,18 +16,27 @@ Dependencies:
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import os
 from datetime import datetime
-import glob
-import scipy.sparse as sparse
+from review_store import load_compact_reviews
+from artifact_registry import get_registry
+from profiling import profile_stage, profile_step
+from rollup_cube import load_rollup_cube
 import warnings
 warnings.filterwarnings('ignore')
 
+# Plotting libraries, imported by _load_plotting when a ReviewVisualizer is created so
+# that importing this module (e.g. for the CLI) stays fast
+plt = sns = go = make_subplots = None
+
+def _load_plotting():
+    global plt, sns, go, make_subplots
+    if plt is None:
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+
 class ReviewVisualizer:
     def __init__(self, save_dir='visualizations'):
         """Initialize the visualization module."""
@@ -35,48 +44,34 @@ class ReviewVisualizer:
         if not os.path.exists(save_dir):
             os.makedirs(save_dir)
         
+        _load_plotting()
         plt.style.use('default')
         sns.set_theme()
         self.color_palette = sns.color_palette("husl", 8)
 
-    def load_processed_data(self):
-        """Load the most recent processed data."""
-        processed_files = glob.glob('processed_data/processed_reviews_*.csv')
-        
-        if not processed_files:
-            raise FileNotFoundError("Processed data files not found.")
-            
-        latest_processed = max(processed_files)
-        df = pd.read_csv(latest_processed)
-        df['Time'] = pd.to_datetime(df['Time'])
-        
-        print(f"Loaded processed data from: {latest_processed}")
-        return df
+    def load_processed_data(self, columns=('Score', 'Text', 'Time', 'sentiment_score',
+                                           'helpfulness_ratio', 'text_length')):
+        """Load the columns used for plotting from the most recent processed data, in compact dtypes."""
+        return load_compact_reviews(columns=list(columns) if columns else None)
 
     def load_analysis_results(self):
-        """Load results from all analysis modules."""
+        """Load results from all analysis modules through the artifact registry."""
+        registry = get_registry()
         results = {}
         
-        # Topic modeling results
-        topic_files = glob.glob('topic_models/topic_distributions_*.csv')
-        coherence_files = glob.glob('topic_models/coherence_scores_*.csv')
-        if topic_files:
-            results['topic_distributions'] = pd.read_csv(max(topic_files))
-        if coherence_files:
-            results['coherence_scores'] = pd.read_csv(max(coherence_files))
-        
-        # Sentiment analysis results
-        sentiment_files = glob.glob('sentiment_analysis/temporal_trends_*.csv')
-        if sentiment_files:
-            results['temporal_trends'] = pd.read_csv(max(sentiment_files))
-        
-        # Helpfulness analysis results
-        helpfulness_files = glob.glob('helpfulness_analysis/feature_importance_*.csv')
-        category_files = glob.glob('helpfulness_analysis/category_patterns_*.csv')
-        if helpfulness_files:
-            results['feature_importance'] = pd.read_csv(max(helpfulness_files))
-        if category_files:
-            results['category_patterns'] = pd.read_csv(max(category_files))
+        artifacts = {
+            # Topic modeling results
+            'topic_distributions': 'topic_models/topic_distributions',
+            'coherence_scores': 'topic_models/coherence_scores',
+            # Sentiment analysis results
+            'temporal_trends': 'sentiment_analysis/temporal_trends',
+            # Helpfulness analysis results
+            'feature_importance': 'helpfulness_analysis/feature_importance',
+            'category_patterns': 'helpfulness_analysis/category_patterns'
+        }
+        for key, name in artifacts.items():
+            if registry.find(name) is not None:
+                results[key] = registry.load(name, pd.read_csv)
         
         return results
 
@@ -99,10 +94,16 @@ class ReviewVisualizer:
         self.save_plot(fig, 'rating_distribution')
         return fig
 
-    def plot_sentiment_heatmap(self, df):
-        """Create heatmap of sentiment scores over time."""
-        df['month'] = df['Time'].dt.to_period('M')
-        df['year'] = df['Time'].dt.year
+    def plot_sentiment_heatmap(self, df, cube=None):
+        """Create heatmap of sentiment scores over time, from the rollup `cube` if given."""
+        if cube is not None:
+            monthly = cube.aggregate('month', {'sentiment_score': ['mean']})[('sentiment_score', 'mean')]
+            # Each month lies in one year, so the monthly means are the cell values
+            df = pd.DataFrame({'month': monthly.index, 'year': monthly.index.year,
+                               'sentiment_score': monthly.to_numpy()})
+        else:
+            df['month'] = df['Time'].dt.to_period('M')
+            df['year'] = df['Time'].dt.year
         
         pivot_table = df.pivot_table(
             values='sentiment_score',
@@ -243,38 +244,46 @@ class ReviewVisualizer:
         try:
             # Load all data
             print("Loading data and analysis results...")
-            df = self.load_processed_data()
-            results = self.load_analysis_results()
+            with profile_step('load') as step:
+                df = self.load_processed_data()
+                results = self.load_analysis_results()
+                step['rows'] = len(df)
             
             # Basic visualizations
             print("Creating basic review visualizations...")
-            self.plot_rating_distribution(df)
-            self.plot_word_cloud(df)
+            with profile_step('plot_reviews', rows=len(df)):
+                self.plot_rating_distribution(df)
+                self.plot_word_cloud(df)
             
             # Sentiment visualizations
             if 'sentiment_score' in df.columns:
                 print("Creating sentiment visualizations...")
-                self.plot_sentiment_heatmap(df)
-                self.create_interactive_timeline(df)
+                with profile_step('plot_sentiment', rows=len(df)):
+                    self.plot_sentiment_heatmap(df, load_rollup_cube())
+                    self.create_interactive_timeline(df)
             
             # Helpfulness visualizations
             if 'helpfulness_ratio' in df.columns:
                 print("Creating helpfulness analysis...")
-                self.plot_helpfulness_analysis(df)
+                with profile_step('plot_helpfulness', rows=len(df)):
+                    self.plot_helpfulness_analysis(df)
             
             # Topic modeling visualizations
             if 'coherence_scores' in results:
                 print("Creating topic modeling visualizations...")
-                self.plot_topic_coherence(results['coherence_scores'])
+                with profile_step('plot_topics'):
+                    self.plot_topic_coherence(results['coherence_scores'])
             
             if 'topic_distributions' in results:
                 print("Creating topic analysis visualization...")
-                self.create_topic_visualization(results['topic_distributions'], df)
+                with profile_step('plot_topics'):
+                    self.create_topic_visualization(results['topic_distributions'], df)
             
             # Helpfulness prediction visualizations
             if 'feature_importance' in results:
                 print("Creating helpfulness prediction visualizations...")
-                self.plot_feature_importance(results['feature_importance'])
+                with profile_step('plot_feature_importance'):
+                    self.plot_feature_importance(results['feature_importance'])
             
             print("\nVisualization process completed successfully!")
             
@@ -288,4 +297,5 @@ def main():
     visualizer.create_all_visualizations()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile_stage('visualize'):
+        main()
\ No newline at end of file